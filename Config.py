@@ -1,3 +1,165 @@
 FIG_DPI = 100
 MAX_AUDIO_LENGTH = 10
 MIN_AUDIO_LENGTH = 0.5
+
+# Streaming playback
+# Frames per block pulled from the root audio by the stream player
+STREAM_BLOCK_SIZE = 2048
+# Blocks the stream player decodes ahead at once
+STREAM_READ_AHEAD_BLOCKS = 8
+# Seconds decoded ahead of the play position, covering the time analysis
+# tasks hold the reader of the root audio
+STREAM_BUFFER_SECONDS = 4
+# Seconds before the window edge at which the next window is loaded
+PREFETCH_LEAD_TIME = 3
+
+# Spectrum
+# Keep the complex STFT of the window in single precision
+STFT_COMPLEX64 = True
+
+# Griffin-Lim reconstruction
+GRIFFIN_LIM_ITERATIONS = 32
+# Iterations between two progressive previews
+GRIFFIN_LIM_CHUNK_ITERATIONS = 4
+
+# Band-pass detail playback
+# Butterworth order of the band-pass filter
+BAND_PASS_ORDER = 8
+# Seconds of audio kept around the selected time span
+BAND_PASS_PADDING = 0.05
+
+# Region statistics
+# Size of the surrounding area used for the SNR, relative to the region
+REGION_STATS_SURROUND = 0.5
+# Sums carried over from scrolled out frames, relative to the sums of the
+# window, above which the shifted summed-area tables are built again
+REGION_STATS_REBUILD_OFFSET = 64
+
+# Spectrogram interaction
+# Max redraws per second of the blitted selection overlay
+BLIT_REFRESH_RATE = 60
+
+# Preprocessing cache
+# Directory of the preprocessed audio caches, relative to the directory
+# preprocessed, where the caches of the files below it are looked up
+CACHE_DIR = ".audio-cache"
+# STFT frames computed at once for whole files
+SPECTRUM_CHUNK_FRAMES = 8192
+# Memory the preprocessing workers may use together
+PIPELINE_MEMORY_BUDGET_MB = 4096
+
+# Analysis sample rate
+# Files recorded above this rate are resampled to it on load, None keeps
+# the native rate
+ANALYSIS_SAMPLE_RATE = None
+# Input frames resampled at once
+RESAMPLE_CHUNK_FRAMES = 1 << 20
+
+# Candidate detection
+# Frequency bands and STFT frames of a detection cell
+DETECTOR_BANDS = 32
+DETECTOR_CELL_FRAMES = 8
+# Seconds of audio each noise floor estimate covers
+DETECTOR_NOISE_WINDOW = 30
+# Percentile of the cell energies in a band taken as its noise floor
+DETECTOR_NOISE_PERCENTILE = 20
+# dB above the noise floor at which a cell is active
+DETECTOR_THRESHOLD_DB = 10
+# Smallest number of active cells kept as a proposal
+DETECTOR_MIN_CELLS = 4
+
+# Template matching
+# Frequency bins a match may be shifted by from the template
+MATCH_FREQ_TOLERANCE = 2
+# Smallest normalized correlation of a match
+MATCH_THRESHOLD = 0.6
+# Most matches proposed
+MATCH_MAX_RESULTS = 200
+# Threads correlating chunks of the spectrum, None for the executor default
+MATCH_WORKERS = None
+# Correlate the chunks in worker processes attached to the shared audio
+# buffers rather than in threads
+MATCH_PROCESSES = False
+
+# Fingerprint index
+# Directory of the fingerprint index of a corpus
+FINGERPRINT_INDEX_DIR = ".fingerprint-index"
+# Frequency bands up to FINGERPRINT_MAX_FREQ and seconds of a cell
+FINGERPRINT_BANDS = 16
+FINGERPRINT_MAX_FREQ = 8000
+FINGERPRINT_CELL_SECONDS = 0.25
+# Energy in dB above the noise floor a cell needs to count
+FINGERPRINT_THRESHOLD_DB = 3
+# Cells per fingerprint and cells between two fingerprints
+FINGERPRINT_WINDOW_CELLS = 4
+FINGERPRINT_HOP_CELLS = 2
+# Fingerprints compared at once by a query
+FINGERPRINT_QUERY_BLOCK = 1 << 20
+# Most hits returned by a query
+FINGERPRINT_MAX_HITS = 50
+
+# Overview navigator
+# Frequency bands and seconds of a cell of the whole file overview
+OVERVIEW_BANDS = 8
+OVERVIEW_CELL_SECONDS = 1.0
+# dB below the loudest cell shown, quieter cells are black
+OVERVIEW_DB_RANGE = 60
+# Most columns drawn, longer overviews are max pooled down to it
+OVERVIEW_MAX_COLUMNS = 1024
+
+# Profiling
+# Time the stages of the pipeline from the start, toggled in the Profile menu
+PROFILING_ENABLED = False
+# Latest durations of every stage the percentiles are computed over
+PROFILER_HISTORY = 1000
+# Latest events kept for the trace export
+PROFILER_MAX_EVENTS = 100000
+# Milliseconds between two updates of the stage timings in the status bar
+PROFILER_STATUS_INTERVAL = 500
+
+# Task scheduling
+# Background workers running the loads, slices and searches of the GUI,
+# one of them is kept for loading the windows
+TASK_WORKERS = 3
+# Milliseconds between two deliveries of task results to the GUI
+TASK_POLL_INTERVAL = 20
+
+# Memory budget
+# MB of the large buffers kept in memory, least valuable evictable buffers
+# (region statistics, rendered images) are dropped above it
+MEMORY_BUDGET_MB = 2048
+
+# Training set export
+# Directory the training sets are exported to
+TRAINING_SET_DIR = "training-set"
+# Frequency bins and frames the spectrogram patches are resized to
+TRAINING_PATCH_SHAPE = (64, 64)
+# Most labels in a shard
+TRAINING_SHARD_LABELS = 1024
+
+# Clip export
+# Directory the label clips are exported to
+CLIP_EXPORT_DIR = "clips"
+# Threads filtering and writing the clips
+CLIP_WRITE_WORKERS = 4
+# Most seconds read at once when the spans of close labels are merged
+CLIP_READ_BLOCK_SECONDS = 60
+
+# Feature extraction
+# File the label feature matrix is written to
+FEATURES_FILE = "label-features.npz"
+# Most seconds of spectrum summed at once when the spans of close labels
+# are merged
+FEATURE_BLOCK_SECONDS = 60
+
+# Review sheets
+# Directory the review images are rendered to
+REVIEW_SHEETS_DIR = "review-sheets"
+# Colormap of the review images, the default of the spectrum plot
+REVIEW_COLORMAP = "viridis"
+# Columns and rows of windows tiled into a review sheet, a sheet is
+# rendered by one worker task
+REVIEW_SHEET_COLUMNS = 2
+REVIEW_SHEET_ROWS = 8
+# zlib level of the review images, low levels encode several times faster
+REVIEW_PNG_COMPRESSION = 1
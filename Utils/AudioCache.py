@@ -0,0 +1,187 @@
+import hashlib
+import json
+import os
+import numpy as np
+
+from Config import CACHE_DIR, OVERVIEW_BANDS, OVERVIEW_CELL_SECONDS
+
+# Bump when the cache layout changes
+CACHE_VERSION = 1
+# File marking a complete cache entry
+META_FILE_NAME = "meta.json"
+# Manifest of all files processed into a cache directory
+MANIFEST_FILE_NAME = "manifest.json"
+# Subdirectory of the seek indexes of compressed files
+INDEX_DIR_NAME = "index"
+# Subdirectory of the whole file overviews
+OVERVIEW_DIR_NAME = "overview"
+
+
+def GetCacheKey(audioFilePath: str, *settings) -> str:
+    """
+    Get a key of an audio file and the settings it is processed with.
+    The key changes whenever the file is modified.
+    """
+    stat = os.stat(audioFilePath)
+    keySource = json.dumps([
+        CACHE_VERSION,
+        os.path.abspath(audioFilePath),
+        stat.st_size,
+        stat.st_mtime,
+        *settings,
+    ])
+    return hashlib.sha1(keySource.encode()).hexdigest()
+
+
+def FindCacheDir(audioFilePath: str) -> str:
+    """
+    Get the cache directory of an audio file: CACHE_DIR in the closest of
+    its directory and their parents that has one, where preprocess-audio
+    put it, or else CACHE_DIR of the working directory.
+    """
+    directory = os.path.dirname(os.path.abspath(audioFilePath))
+    while True:
+        cacheDir = os.path.join(directory, CACHE_DIR)
+        if os.path.isdir(cacheDir):
+            return cacheDir
+        parentDirectory = os.path.dirname(directory)
+        if parentDirectory == directory:
+            return CACHE_DIR
+        directory = parentDirectory
+
+
+def GetCachePath(
+    audioFilePath: str,
+    nFft: int,
+    sampleRate: int = None,
+    cacheDir: str = None
+) -> str:
+    """
+    Get the cache directory of an audio file loaded with the given settings,
+    in the cache directory found for the file unless cacheDir is given.
+    The path changes whenever the file is modified.
+    """
+    if cacheDir is None:
+        cacheDir = FindCacheDir(audioFilePath)
+    return os.path.join(cacheDir, GetCacheKey(audioFilePath, nFft, sampleRate))
+
+
+def GetIndexPath(audioFilePath: str, cacheDir: str = None) -> str:
+    """
+    Get the cache directory of the seek index of a compressed audio file.
+    """
+    if cacheDir is None:
+        cacheDir = FindCacheDir(audioFilePath)
+    return os.path.join(cacheDir, INDEX_DIR_NAME, GetCacheKey(audioFilePath, "index"))
+
+
+def GetOverviewPath(audioFilePath: str, sampleRate: int, cacheDir: str = None) -> str:
+    """
+    Get the cache directory of the overview of an audio file analysed at
+    sampleRate.
+    """
+    if cacheDir is None:
+        cacheDir = FindCacheDir(audioFilePath)
+    return os.path.join(
+        cacheDir, OVERVIEW_DIR_NAME,
+        GetCacheKey(audioFilePath, "overview", sampleRate, OVERVIEW_BANDS, OVERVIEW_CELL_SECONDS))
+
+
+def IsCached(cachePath: str) -> bool:
+    """
+    Check if a cache entry is complete.
+    """
+    return os.path.exists(os.path.join(cachePath, META_FILE_NAME))
+
+
+def SaveArray(cachePath: str, name: str, array: np.ndarray) -> str:
+    """
+    Save an array into a cache entry atomically. Returns the file name.
+    """
+    fileName = name + ".npy"
+    tempPath = os.path.join(cachePath, fileName + ".tmp")
+    with open(tempPath, "wb") as file:
+        np.save(file, array)
+    os.replace(tempPath, os.path.join(cachePath, fileName))
+    return fileName
+
+
+def WriteCache(cachePath: str, arrays: dict, metadata: dict) -> dict:
+    """
+    Write the arrays of an audio file into a cache entry.
+    arrays maps names to arrays or lists of arrays. The metadata is written
+    last, with the array file names under "files", and is returned.
+    """
+    os.makedirs(cachePath, exist_ok=True)
+
+    files = {}
+    for name, array in arrays.items():
+        if array is None:
+            continue
+        if isinstance(array, list):
+            files[name] = [
+                SaveArray(cachePath, f"{name}{i}", level)
+                for i, level in enumerate(array)
+            ]
+        else:
+            files[name] = SaveArray(cachePath, name, array)
+
+    metadata = dict(metadata, files=files, cacheVersion=CACHE_VERSION)
+    tempPath = os.path.join(cachePath, META_FILE_NAME + ".tmp")
+    with open(tempPath, "w") as file:
+        json.dump(metadata, file, indent=4)
+    os.replace(tempPath, os.path.join(cachePath, META_FILE_NAME))
+
+    return metadata
+
+
+def ReadMetadata(cachePath: str) -> dict:
+    """
+    Read the metadata of a cache entry.
+    """
+    with open(os.path.join(cachePath, META_FILE_NAME), "r") as file:
+        return json.load(file)
+
+
+def ReadCache(cachePath: str) -> tuple[dict, dict]:
+    """
+    Read a cache entry. Arrays are memory mapped, nothing is loaded.
+    Returns the metadata and the arrays by name.
+    """
+    metadata = ReadMetadata(cachePath)
+
+    arrays = {}
+    for name, fileName in metadata["files"].items():
+        if isinstance(fileName, list):
+            arrays[name] = [
+                np.load(os.path.join(cachePath, levelFileName), mmap_mode="r")
+                for levelFileName in fileName
+            ]
+        else:
+            arrays[name] = np.load(
+                os.path.join(cachePath, fileName), mmap_mode="r")
+
+    return metadata, arrays
+
+
+def ReadManifest(cacheDir: str = CACHE_DIR) -> list[dict]:
+    """
+    Read the manifest of a cache directory.
+    """
+    manifestPath = os.path.join(cacheDir, MANIFEST_FILE_NAME)
+    if not os.path.exists(manifestPath):
+        return []
+    with open(manifestPath, "r") as file:
+        return json.load(file)
+
+
+def WriteManifest(entries: list[dict], cacheDir: str = CACHE_DIR) -> None:
+    """
+    Write the manifest of a cache directory atomically.
+    """
+    os.makedirs(cacheDir, exist_ok=True)
+    manifestPath = os.path.join(cacheDir, MANIFEST_FILE_NAME)
+    tempPath = manifestPath + ".tmp"
+    with open(tempPath, "w") as file:
+        json.dump(entries, file, indent=4)
+    os.replace(tempPath, manifestPath)
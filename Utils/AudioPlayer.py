@@ -0,0 +1,366 @@
+import functools
+import queue
+import threading
+import time
+import numpy as np
+import sounddevice as sd
+
+from Utils.AudioProcess import Audio
+from Utils.Profiler import Span
+from Config import STREAM_BLOCK_SIZE, STREAM_BUFFER_SECONDS, STREAM_READ_AHEAD_BLOCKS
+
+
+class RingBuffer:
+    """
+    Ring of float32 frames between one writer and one reader thread. Each
+    side only advances its own count, so neither takes a lock, and the
+    reader takes whatever frames are there rather than waiting for more.
+    """
+
+    def __init__(self, capacity: int) -> None:
+        self.array: np.ndarray = np.zeros(capacity, dtype=np.float32)
+        self.capacity: int = capacity
+        # Frames written and read since the start
+        self.writeCount: int = 0
+        self.readCount: int = 0
+        # Set by the writer once no more frames follow
+        self.closed: bool = False
+        # Set by the reader's owner to stop the writer
+        self.stopped: bool = False
+        # Set once the first frames are written or the ring is closed
+        self.ready = threading.Event()
+
+    def AvailableFrames(self) -> int:
+        return self.writeCount - self.readCount
+
+    def FreeFrames(self) -> int:
+        return self.capacity - self.AvailableFrames()
+
+    def Write(self, frames: np.ndarray) -> int:
+        """
+        Copy as many frames as fit into the ring. Returns their number.
+        """
+        count = min(len(frames), self.FreeFrames())
+        start = self.writeCount % self.capacity
+        firstCount = min(count, self.capacity - start)
+        self.array[start:start + firstCount] = frames[:firstCount]
+        self.array[:count - firstCount] = frames[firstCount:count]
+        # Publish the frames once they are copied
+        self.writeCount += count
+        return count
+
+    def Read(self, out: np.ndarray) -> int:
+        """
+        Copy up to len(out) frames out of the ring. Returns their number.
+        """
+        count = min(len(out), self.AvailableFrames())
+        start = self.readCount % self.capacity
+        firstCount = min(count, self.capacity - start)
+        out[:firstCount] = self.array[start:start + firstCount]
+        out[firstCount:count] = self.array[:count - firstCount]
+        self.readCount += count
+        return count
+
+
+class AudioPlayer:
+    """
+    Audio player class
+    """
+
+    def __init__(
+        self,
+        audio: Audio,
+        responseRate: float,
+        callback: callable = None,
+    ) -> None:
+        self.audio: Audio = audio
+        self.responseRate: float = responseRate
+
+        self.audioBuffer: queue.Queue = queue.Queue()
+
+        # Play control
+        self.playThread = None
+        self.isPlaying: bool = False
+        # Incremented by every Play and Pause, a play thread of an older
+        # generation leaves the cursor and the player state alone
+        self.playGeneration: int = 0
+        self.lock = threading.Lock()
+
+        self.timeCallback: callable = callback
+
+    def SetAudioPosition(self, position: float) -> None:
+        # Set the audio position
+        position = position * self.audio.audioLength
+        self.audio.cursorPosition = position
+
+    def Play(self) -> None:
+        """
+        Play the audio from the cursor
+        """
+        with self.lock:
+            if self.isPlaying or self.audio.audioArray is None:
+                return
+            # Check if the audio array is empty
+            if self.audio.audioArray.size == 0:
+                return
+
+            self.isPlaying = True
+            self.playGeneration += 1
+            self.playThread = threading.Thread(target=self.PlayThread, args=(self.playGeneration,))
+            self.playThread.start()
+
+    def PlayThread(self, generation: int) -> None:
+        """
+        Thread target to play the audio, as long as generation is the
+        current play
+        """
+        # Get the sub array of the audio array
+        playAudioArray = self.audio.audioArray[int(
+            self.audio.cursorPosition * self.audio.sampleRate):]
+
+        # Start playing unless paused meanwhile
+        with self.lock:
+            if generation != self.playGeneration:
+                return
+            with Span("Player.Start"):
+                sd.play(playAudioArray, self.audio.sampleRate)
+
+        timeStamp = time.time()
+        while True:
+            with self.lock:
+                if generation != self.playGeneration:
+                    return
+                if self.audio.cursorPosition >= self.audio.audioLength:
+                    break
+                # Increase the cursor position by the delta time
+                deltaTime = time.time() - timeStamp
+                timeStamp = time.time()
+                self.audio.cursorPosition += deltaTime
+            # Update the time callback
+            if self.timeCallback is not None:
+                self.timeCallback(self.audio.cursorPosition)
+            time.sleep(self.responseRate)
+
+        # Reset the cursor position
+        with self.lock:
+            if generation != self.playGeneration:
+                return
+            self.audio.cursorPosition = 0
+            self.isPlaying = False
+        if self.timeCallback is not None:
+            self.timeCallback(self.audio.cursorPosition)
+
+    def Pause(self) -> None:
+        """
+        Pause the audio, ending the current play
+        """
+        with self.lock:
+            self.isPlaying = False
+            self.playGeneration += 1
+            sd.stop()
+
+    def Stop(self) -> None:
+        """
+        Pause the audio and rewind the cursor to the start
+        """
+        self.Pause()
+        # Rewind once no play thread moves the cursor anymore
+        self.audio.cursorPosition = 0
+
+    def Restart(self) -> None:
+        """
+        Play the audio from the start, ending the current play
+        """
+        self.Stop()
+        self.Play()
+
+
+class AudioStreamPlayer:
+    """
+    Audio player streaming blocks directly from the root audio.
+    """
+
+    def __init__(
+        self,
+        rootAudio: Audio,
+        responseRate: float,
+        callback: callable = None,
+        blockSize: int = STREAM_BLOCK_SIZE,
+    ) -> None:
+        self.rootAudio: Audio = rootAudio
+        self.responseRate: float = responseRate
+        self.blockSize: int = blockSize
+
+        # Play position in root audio frames
+        self.positionFrame: int = 0
+        # Blocks played as silence because the feeder fell behind
+        self.underruns: int = 0
+
+        # Play control
+        self.playThread = None
+        self.stream: sd.OutputStream = None
+        self.isPlaying: bool = False
+        # Incremented by every Play and Pause, a play thread of an older
+        # generation leaves the player state alone
+        self.playGeneration: int = 0
+        self.lock = threading.Lock()
+
+        self.timeCallback: callable = callback
+
+    def SetPosition(self, position: float) -> None:
+        """
+        Set the play position in seconds from the start of the root audio.
+        """
+        if self.rootAudio.GetFrameCount() == 0:
+            return
+
+        positionFrame = int(position * self.rootAudio.sampleRate)
+        # Clamp the position into the root audio
+        positionFrame = max(positionFrame, 0)
+        positionFrame = min(positionFrame, self.rootAudio.GetFrameCount())
+        self.positionFrame = positionFrame
+
+    def GetPosition(self) -> float:
+        """
+        Get the play position in seconds from the start of the root audio.
+        """
+        if self.rootAudio.sampleRate is None:
+            return 0
+        return self.positionFrame / self.rootAudio.sampleRate
+
+    def Play(self) -> None:
+        """
+        Play the audio
+        """
+        with self.lock:
+            if self.isPlaying or self.rootAudio.GetFrameCount() == 0:
+                return
+            # Check if there is anything left to play
+            if self.positionFrame >= self.rootAudio.GetFrameCount():
+                return
+
+            self.isPlaying = True
+            self.playGeneration += 1
+            self.playThread = threading.Thread(target=self.PlayThread, args=(self.playGeneration,))
+            self.playThread.start()
+
+    def PlayThread(self, generation: int) -> None:
+        """
+        Thread target to stream the audio from the play position, as long
+        as generation is the current play
+        """
+        # Decode ahead on a feeder thread, the stream callback only copies
+        # from the ring and never waits for the decoder or its lock
+        sampleRate = self.rootAudio.sampleRate
+        chunkFrames = self.blockSize * STREAM_READ_AHEAD_BLOCKS
+        ring = RingBuffer(max(int(STREAM_BUFFER_SECONDS * sampleRate), 2 * chunkFrames))
+        feedThread = threading.Thread(
+            target=self.FeedThread, args=(ring, self.positionFrame, chunkFrames), daemon=True)
+        feedThread.start()
+        # Start the stream with frames to play
+        ring.ready.wait()
+
+        finishedEvent = threading.Event()
+        try:
+            stream = sd.OutputStream(
+                samplerate=sampleRate,
+                channels=1,
+                blocksize=self.blockSize,
+                callback=functools.partial(self.StreamCallback, ring),
+                finished_callback=finishedEvent.set,
+            )
+        except Exception:
+            # No output device, the play ends here
+            ring.stopped = True
+            with self.lock:
+                if generation == self.playGeneration:
+                    self.isPlaying = False
+            raise
+        # Start the stream unless paused meanwhile, Pause aborts it after
+        with self.lock:
+            if generation != self.playGeneration:
+                ring.stopped = True
+                stream.close()
+                return
+            self.stream = stream
+            stream.start()
+
+        try:
+            while not finishedEvent.is_set():
+                if generation != self.playGeneration:
+                    return
+                # Update the time callback
+                if self.timeCallback is not None:
+                    self.timeCallback(self.GetPosition())
+                time.sleep(self.responseRate)
+        finally:
+            ring.stopped = True
+            with self.lock:
+                if self.stream is stream:
+                    self.stream = None
+                stream.close()
+
+        # Reached the end of the root audio
+        with self.lock:
+            if generation != self.playGeneration:
+                return
+            self.isPlaying = False
+        if self.timeCallback is not None:
+            self.timeCallback(self.GetPosition())
+
+    def FeedThread(self, ring: RingBuffer, feedFrame: int, chunkFrames: int) -> None:
+        """
+        Thread target decoding the root audio from feedFrame into the ring,
+        chunkFrames at a time, until the end of the audio or until stopped.
+        """
+        # Check for free space a few times per chunk played
+        pollInterval = chunkFrames / self.rootAudio.sampleRate / 4
+        try:
+            while not ring.stopped:
+                if ring.FreeFrames() < chunkFrames:
+                    time.sleep(pollInterval)
+                    continue
+
+                # Decoding compressed files block by block is slow
+                with Span("Player.ReadAhead"):
+                    frames = self.rootAudio.ReadFrames(feedFrame, chunkFrames)
+                ring.Write(frames)
+                feedFrame += len(frames)
+                ring.ready.set()
+
+                # Reached the end of the root audio
+                if len(frames) < chunkFrames:
+                    return
+        finally:
+            # Let the stream drain the ring and stop, even if reading failed
+            ring.closed = True
+            ring.ready.set()
+
+    def StreamCallback(self, ring: RingBuffer, outdata: np.ndarray, frames: int, timeInfo, status) -> None:
+        """
+        Output stream callback copying the next block out of the ring of
+        its play.
+        """
+        readCount = ring.Read(outdata[:, 0])
+        self.positionFrame += readCount
+        if readCount == frames:
+            return
+
+        # Pad with silence, and stop the stream once the audio is played
+        outdata[readCount:, 0] = 0
+        if ring.closed and ring.AvailableFrames() == 0:
+            raise sd.CallbackStop
+        # The feeder fell behind, the position waits for it
+        self.underruns += 1
+
+    def Pause(self) -> None:
+        """
+        Pause the audio, ending the current play
+        """
+        with self.lock:
+            self.isPlaying = False
+            self.playGeneration += 1
+            # Abort under the lock, so the play thread closes it after
+            if self.stream is not None:
+                self.stream.abort()
+                self.stream = None
@@ -1,17 +1,57 @@
 
+import time
 import librosa
 import librosa.display
 from turtle import pos
 import numpy as np
-from Config import MIN_AUDIO_LENGTH
+from Config import BLIT_REFRESH_RATE, OVERVIEW_MAX_COLUMNS
 from Utils.AudioProcess import Audio
+from Utils.MemoryBudget import memoryBudget
+from Utils.Profiler import Span
+from Utils.SpectrumStats import ShiftColumns
 from matplotlib import patches, pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-from matplotlib.widgets import Cursor
 
 from Utils.DataSetLabel import DataSetLabel
 
 
+def ToneMapSpectrum(
+    audioSpectrum: np.ndarray,
+    maxVal: float,
+    contrastEnhancement: float,
+    brightnessEnhancement: float
+) -> np.ndarray:
+    """
+    Map a magnitude spectrum to the displayed intensity.
+    """
+    audioSpectrum = audioSpectrum / maxVal
+
+    # Enhance the contrast of the audio spectrum
+    audioSpectrum = 1 - (1-audioSpectrum)**contrastEnhancement
+
+    # Enhance the brightness of the spectrum
+    return audioSpectrum + brightnessEnhancement
+
+
+def LabelBox(
+    label: DataSetLabel,
+    audioLength: float,
+    frameWidth: int,
+    freqArr: np.ndarray
+) -> tuple[float, float, float, float]:
+    """
+    Get the box of a label on a spectrum of frameWidth frames covering
+    audioLength seconds, as its start and end frame and bin.
+    """
+    # Get the start and end of x
+    xStart = label.startTime / audioLength * frameWidth
+    xEnd = label.endTime / audioLength * frameWidth
+    # Get the first frequency index in freqArr >= label.startFreq
+    yStart = np.argmax(freqArr >= label.startFreq)
+    yEnd = np.argmax(freqArr >= label.endFreq)
+    return xStart, xEnd, yStart, yEnd
+
+
 class AudioPlot:
     """
     Base class for all audio plots.
@@ -35,6 +75,7 @@ class AudioPlot:
         self.canvas: FigureCanvasTkAgg = canvas
         self.canvas.mpl_connect("button_press_event", self.OnCanvasClick)
         self.canvas.mpl_connect("button_release_event", self.OnCanvasRelease)
+        self.canvas.mpl_connect("motion_notify_event", self.OnCanvasMotion)
 
         # The time position of the cursor.
         self.cursorPosition: float = 0
@@ -78,6 +119,12 @@ class AudioPlot:
 
         self.OnRelease(self.pressCoord, self.releaseCoord)
 
+    def OnCanvasMotion(self, event) -> None:
+        """
+        Method to handle the mouse motion event on the canvas.
+        """
+        pass
+
     def OnRelease(self, startCoord: tuple[float, float], endCoord: tuple[float, float]) -> None:
         """
         Method to handle the release event on the canvas.
@@ -102,24 +149,16 @@ class AudioMagnitudePlot(AudioPlot):
         """
         Method to plot the audio.
         """
-        # Get the audio array
-        audioArray = self.audio.audioArray
-        # Average the audio array into length of 8192
-        groupSize = len(audioArray) // (int(MIN_AUDIO_LENGTH *
-                                        self.audio.sampleRate))
-        # Get the average of each group and combine into a single array
-        compressedAudioArray = []
-        for i in range(0, len(audioArray), groupSize):
-            # Get the actual length of the group
-            groupSize = min(groupSize, len(audioArray) - i)
-            compressedAudioArray.append(sum(
-                [abs(mag) for mag in audioArray[i:i + groupSize]]
-            )/groupSize)
+        # Get the magnitude envelope of the audio
+        compressedAudioArray = self.audio.envelope
+        if compressedAudioArray is None:
+            return
 
         # Clear the axes
         self.ax.cla()
         # Plot the audio array
-        self.ax.plot(compressedAudioArray)
+        with Span("MagnitudePlot.Plot"):
+            self.ax.plot(compressedAudioArray)
         # Set ticks of the x axis to be the corresponding time position
         sampleIndeces = np.arange(0, len(compressedAudioArray), len(
             compressedAudioArray) // self.X_TICK_NUMBER)
@@ -140,7 +179,8 @@ class AudioMagnitudePlot(AudioPlot):
                         len(compressedAudioArray), color='r')
 
         # Update the canvas
-        self.canvas.draw()
+        with Span("MagnitudePlot.Draw"):
+            self.canvas.draw()
 
 
 class AudioSpectrumPlot(AudioPlot):
@@ -153,19 +193,33 @@ class AudioSpectrumPlot(AudioPlot):
         audio: Audio,
         ax: plt.Axes,
         canvas: FigureCanvasTkAgg,
-        onRelease: callable = None
+        onRelease: callable = None,
+        onDrag: callable = None
     ) -> None:
         super().__init__(audio, ax, canvas, onRelease)
 
         # Label highlighting
         self.highlightedLabels: list[DataSetLabel] = []
 
+        # Tone mapped image of the last plot
+        self.renderedImage: np.ndarray = None
+        self.renderedAudio: Audio = None
+        self.renderedVersion: int = None
+        self.renderedKey: tuple = None
+        # Seconds the last full tone mapping took
+        self.renderCost: float = 0
+
         # Settings for the audio spectrum plot
         self.brightnessEnhancement = 0
         self.contrastEnhancement = 1.0
 
-        # Plot cursor
-        self.cursor = Cursor(self.ax, useblit=True, color='white', linewidth=1)
+        # Rubber band selection drawn with blitting
+        self.onDrag = onDrag
+        self.isDragging: bool = False
+        self.background = None
+        self.lastBlitTime: float = 0
+        self.CreateOverlay()
+        self.canvas.mpl_connect("draw_event", self.OnCanvasDraw)
 
     def Plot(self, keepLim: bool = True) -> None:
         # Get the audio spectrum
@@ -175,14 +229,9 @@ class AudioSpectrumPlot(AudioPlot):
             return
 
         # Get max value in the audio spectrum
-        maxVal = np.amax(audioSpectrum)
-        audioSpectrum = audioSpectrum / maxVal
-
-        # Enhance the contrast of the audio spectrum
-        audioSpectrum = 1 - (1-audioSpectrum)**self.contrastEnhancement
-
-        # Enhance the brightness of the spectrum
-        audioSpectrum = audioSpectrum + self.brightnessEnhancement
+        with Span("SpectrumPlot.ToneMap"):
+            maxVal = np.amax(audioSpectrum)
+            audioSpectrum = self.RenderImage(audioSpectrum, maxVal)
 
         # Store the x and y limits of the plot
         xLim = self.ax.get_xlim()
@@ -191,8 +240,9 @@ class AudioSpectrumPlot(AudioPlot):
         # Clear the axes
         self.ax.cla()
         # Plot the audio spectrum
-        self.ax.imshow(audioSpectrum, aspect='auto',
-                       origin='lower', vmin=0, vmax=1)
+        with Span("SpectrumPlot.Imshow"):
+            self.ax.imshow(audioSpectrum, aspect='auto',
+                           origin='lower', vmin=0, vmax=1)
 
         # Set x axis ticks to be the corresponding time
         self.ax.set_xticks(np.arange(
@@ -227,14 +277,8 @@ class AudioSpectrumPlot(AudioPlot):
 
         # Plot the highlighted labels
         for label in self.highlightedLabels:
-            # Get the start and end of x
-            xStart = label.startTime / \
-                self.audio.audioLength * audioSpectrum.shape[1]
-            xEnd = label.endTime / self.audio.audioLength * \
-                audioSpectrum.shape[1]
-            # Get the first frequency index in freqArr >= label.startFreq
-            yStart = np.argmax(freqArr >= label.startFreq)
-            yEnd = np.argmax(freqArr >= label.endFreq)
+            xStart, xEnd, yStart, yEnd = LabelBox(
+                label, self.audio.audioLength, audioSpectrum.shape[1], freqArr)
             # Plot the rectangle
             self.ax.add_patch(
                 patches.Rectangle(
@@ -252,8 +296,158 @@ class AudioSpectrumPlot(AudioPlot):
             self.ax.set_xlim(xLim)
             self.ax.set_ylim(yLim)
 
+        # Clearing the axes removed the overlay
+        self.CreateOverlay()
+
         # Update the canvas
-        self.canvas.draw()
+        with Span("SpectrumPlot.Draw"):
+            self.canvas.draw()
+
+    def RenderImage(self, audioSpectrum: np.ndarray, maxVal: float) -> np.ndarray:
+        """
+        Tone map the audio spectrum, reusing the image of the last plot for
+        the frames the spectrum shares with it.
+        """
+        renderKey = (maxVal, self.contrastEnhancement, self.brightnessEnhancement)
+        # The image may be evicted by another thread meanwhile
+        renderedImage = self.renderedImage
+        canReuse = renderedImage is not None \
+            and self.renderedAudio is self.audio \
+            and self.renderedKey == renderKey
+
+        if canReuse and self.renderedVersion == self.audio.spectrumVersion:
+            # Nothing changed since the last plot
+            image = renderedImage
+            memoryBudget.Touch(self, "image")
+        elif canReuse and self.renderedVersion == self.audio.spectrumVersion - 1 \
+                and self.audio.spectrumShift is not None:
+            # Move the shared frames and tone map the new ones
+            width = audioSpectrum.shape[1]
+            reusedFrames = self.audio.reusedFrames
+            image = ShiftColumns(
+                renderedImage, width, self.audio.spectrumShift, reusedFrames)
+            for frameSpan in [(0, reusedFrames[0]), (reusedFrames[1], width)]:
+                image[:, frameSpan[0]:frameSpan[1]] = ToneMapSpectrum(
+                    audioSpectrum[:, frameSpan[0]:frameSpan[1]],
+                    *renderKey
+                )
+        else:
+            startTime = time.perf_counter()
+            image = ToneMapSpectrum(audioSpectrum, *renderKey)
+            self.renderCost = time.perf_counter() - startTime
+
+        self.renderedImage = image
+        self.renderedAudio = self.audio
+        self.renderedVersion = self.audio.spectrumVersion
+        self.renderedKey = renderKey
+        if image is not renderedImage:
+            memoryBudget.Register(
+                self, "image", "image", image, self.renderCost,
+                AudioSpectrumPlot.DropRenderedImage)
+        return image
+
+    def DropRenderedImage(self) -> None:
+        """
+        Evict the tone mapped image, the next plot maps the spectrum again.
+        """
+        self.renderedImage = None
+
+    def CreateOverlay(self) -> None:
+        """
+        Create the animated selection rectangle, crosshair and readout.
+        """
+        self.selectionRect = patches.Rectangle(
+            (0, 0), 0, 0,
+            fill=False,
+            edgecolor='white',
+            linestyle='--',
+            linewidth=1,
+            animated=True,
+            visible=False
+        )
+        self.ax.add_patch(self.selectionRect)
+        self.crosshairX = self.ax.axvline(
+            0, color='white', linewidth=1, animated=True, visible=False)
+        self.crosshairY = self.ax.axhline(
+            0, color='white', linewidth=1, animated=True, visible=False)
+        self.readoutText = self.ax.text(
+            0.01, 0.99, "",
+            transform=self.ax.transAxes,
+            verticalalignment='top',
+            color='white',
+            animated=True
+        )
+
+    def OnCanvasDraw(self, event) -> None:
+        """
+        Store the rendered plot as the background of the overlay.
+        """
+        self.background = self.canvas.copy_from_bbox(self.ax.bbox)
+
+    def OnCanvasClick(self, event) -> None:
+        """
+        Start dragging a selection when the press is inside the plot.
+        """
+        super().OnCanvasClick(event)
+        self.isDragging = event.inaxes == self.ax
+
+    def OnCanvasRelease(self, event) -> None:
+        """
+        Stop dragging the selection.
+        """
+        self.isDragging = False
+        super().OnCanvasRelease(event)
+
+    def OnCanvasMotion(self, event) -> None:
+        """
+        Draw the crosshair and the selection rectangle with blitting.
+        """
+        if self.background is None or self.audio.fftSpectrum is None:
+            return
+        # Leave the mouse to the toolbar while zooming or panning
+        if self.ax.get_navigate_mode() is not None:
+            return
+        if event.inaxes != self.ax or event.xdata is None or event.ydata is None:
+            return
+
+        # Redraw at most at the refresh rate
+        currTime = time.perf_counter()
+        if currTime - self.lastBlitTime < 1 / BLIT_REFRESH_RATE:
+            return
+        self.lastBlitTime = currTime
+
+        # Crosshair and time/frequency readout
+        self.crosshairX.set_xdata([event.xdata, event.xdata])
+        self.crosshairY.set_ydata([event.ydata, event.ydata])
+        self.crosshairX.set_visible(True)
+        self.crosshairY.set_visible(True)
+        cursorTime = event.xdata / self.audio.fftSpectrum.shape[1] * \
+            self.audio.audioLength + self.startTimeOffset
+        cursorFreq = event.ydata * self.audio.sampleRate / self.audio.nFft
+        self.readoutText.set_text(
+            "{:.2f}s {:.2f}Hz".format(cursorTime, cursorFreq))
+
+        # Selection rectangle
+        if self.isDragging and self.pressCoord is not None \
+                and self.pressCoord[0] is not None:
+            self.selectionRect.set_bounds(
+                self.pressCoord[0],
+                self.pressCoord[1],
+                event.xdata - self.pressCoord[0],
+                event.ydata - self.pressCoord[1]
+            )
+            self.selectionRect.set_visible(True)
+            if self.onDrag is not None:
+                self.onDrag(self.pressCoord, (event.xdata, event.ydata))
+
+        # Blit the overlay onto the stored background
+        with Span("SpectrumPlot.Blit"):
+            self.canvas.restore_region(self.background)
+            self.ax.draw_artist(self.selectionRect)
+            self.ax.draw_artist(self.crosshairX)
+            self.ax.draw_artist(self.crosshairY)
+            self.ax.draw_artist(self.readoutText)
+            self.canvas.blit(self.ax.bbox)
 
     def SetBrightnessEnhancement(self, value: float) -> None:
         self.brightnessEnhancement = value
@@ -269,3 +463,123 @@ class AudioSpectrumPlot(AudioPlot):
         self.highlightedLabels = labels
 
         self.Plot()
+
+
+class AudioOverviewPlot(AudioPlot):
+    """
+    Band energy overview of the whole audio with the shown window marked.
+    Clicking or dragging on it seeks to that time.
+    """
+
+    def __init__(
+        self,
+        audio: Audio,
+        ax: plt.Axes,
+        canvas: FigureCanvasTkAgg,
+        onSeek: callable = None
+    ) -> None:
+        super().__init__(audio, ax, canvas)
+
+        # Overview max pooled to at most OVERVIEW_MAX_COLUMNS columns, so
+        # drawing it costs the same for any audio length
+        self.overviewImage: np.ndarray = None
+        # Seconds of a column of the overview image
+        self.columnSeconds: float = None
+
+        # Time span of the shown window
+        self.windowStart: float = 0
+        self.windowLength: float = 0
+
+        # Called with the time to seek to when the mouse is released
+        self.onSeek = onSeek
+        self.isDragging: bool = False
+        self.windowRect: patches.Rectangle = None
+
+    def SetOverview(self, overview: np.ndarray, cellSeconds: float) -> None:
+        """
+        Set the overview of the audio and plot it.
+        """
+        factor = max(-(-overview.shape[1] // OVERVIEW_MAX_COLUMNS), 1)
+        columns = -(-overview.shape[1] // factor)
+        # Pad with silence to whole columns and keep the loudest cell
+        pooled = np.zeros((overview.shape[0], columns * factor), dtype=np.uint8)
+        pooled[:, :overview.shape[1]] = overview
+        self.overviewImage = pooled.reshape(overview.shape[0], columns, factor).max(axis=2)
+        self.columnSeconds = cellSeconds * factor
+
+        self.Plot()
+
+    def SetWindow(self, windowStart: float, windowLength: float) -> None:
+        """
+        Mark the time span of the shown window.
+        """
+        self.windowStart = windowStart
+        self.windowLength = windowLength
+        if self.windowRect is None:
+            return
+
+        self.windowRect.set_x(windowStart)
+        self.windowRect.set_width(windowLength)
+        self.canvas.draw_idle()
+
+    def Plot(self) -> None:
+        """
+        Method to plot the overview.
+        """
+        if self.overviewImage is None:
+            return
+
+        # Clear the axes
+        self.ax.cla()
+        # Plot the overview with time on the x axis
+        self.ax.imshow(
+            self.overviewImage,
+            aspect='auto',
+            origin='lower',
+            vmin=0,
+            vmax=255,
+            extent=(0, self.overviewImage.shape[1] * self.columnSeconds,
+                    0, self.overviewImage.shape[0])
+        )
+        self.ax.set_xlim(0, self.audio.audioLength)
+        self.ax.set_yticks([])
+
+        # Window span across the whole height
+        self.windowRect = patches.Rectangle(
+            (self.windowStart, 0), self.windowLength, 1,
+            transform=self.ax.get_xaxis_transform(),
+            fill=False,
+            edgecolor='r',
+            linewidth=2
+        )
+        self.ax.add_patch(self.windowRect)
+
+        # Update the canvas
+        with Span("OverviewPlot.Draw"):
+            self.canvas.draw()
+
+    def OnCanvasClick(self, event) -> None:
+        """
+        Start dragging the window when the press is inside the overview.
+        """
+        self.isDragging = event.inaxes == self.ax and self.overviewImage is not None
+        self.OnCanvasMotion(event)
+
+    def OnCanvasMotion(self, event) -> None:
+        """
+        Move the window mark along while dragging.
+        """
+        if not self.isDragging or event.inaxes != self.ax or event.xdata is None:
+            return
+        self.SetWindow(event.xdata - self.windowLength / 2, self.windowLength)
+
+    def OnCanvasRelease(self, event) -> None:
+        """
+        Seek to the center of the window mark.
+        """
+        if not self.isDragging:
+            return
+        self.isDragging = False
+
+        if self.onSeek is not None:
+            self.onSeek(self.windowStart + self.windowLength / 2)
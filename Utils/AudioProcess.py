@@ -1,13 +1,103 @@
 from curses import window
-import queue
-import threading
+import functools
+import math
 import time
+import weakref
 import librosa
+import librosa.core.spectrum
 import scipy
-import soundfile as sf
+import scipy.signal
 import numpy as np
-import sounddevice as sd
-from tkinter import messagebox
+
+from Utils import AudioCache
+from Utils.AudioReader import AudioReader, OpenAudioReader
+from Utils.MemoryBudget import memoryBudget
+from Utils.SharedBuffer import GetArrayDescriptor, OpenArrayDescriptor, ShareArray, SharedArray
+from Utils.Profiler import Span, Timed
+from Utils.SpectrumStats import ShiftColumns, SpectrumStatistics
+from Config import ANALYSIS_SAMPLE_RATE, MIN_AUDIO_LENGTH, RESAMPLE_CHUNK_FRAMES, SPECTRUM_CHUNK_FRAMES
+from Config import BAND_PASS_ORDER, BAND_PASS_PADDING, GRIFFIN_LIM_CHUNK_ITERATIONS, GRIFFIN_LIM_ITERATIONS, STFT_COMPLEX64
+
+
+# Attributes of the Audio buffers other processes can attach to, by name
+SHARED_BUFFERS = {"audio": "audioArray", "spectrum": "fftSpectrum"}
+
+
+def ReleaseSharedArrays(sharedArrays: dict[str, SharedArray]) -> None:
+    """
+    Release and forget the shared arrays of an audio.
+    """
+    for sharedArray in sharedArrays.values():
+        sharedArray.Release()
+    sharedArrays.clear()
+
+
+@functools.lru_cache(maxsize=256)
+def DesignBandPassFilter(
+    lowFreq: float,
+    highFreq: float,
+    sampleRate: int,
+    order: int = BAND_PASS_ORDER,
+) -> np.ndarray:
+    """
+    Design a Butterworth band-pass filter as second-order sections.
+    Filters are cached per band and sample rate.
+    Returns None if the band covers the whole spectrum.
+    """
+    nyquist = sampleRate / 2
+    if lowFreq >= highFreq:
+        raise ValueError("Invalid frequency band")
+
+    if lowFreq <= 0 and highFreq >= nyquist:
+        return None
+    if lowFreq <= 0:
+        return scipy.signal.butter(
+            order, highFreq, btype="lowpass", fs=sampleRate, output="sos")
+    if highFreq >= nyquist:
+        return scipy.signal.butter(
+            order, lowFreq, btype="highpass", fs=sampleRate, output="sos")
+    return scipy.signal.butter(
+        order, [lowFreq, highFreq], btype="bandpass", fs=sampleRate, output="sos")
+
+
+@Timed("Audio.Resample")
+def ResampleAudio(
+    ReadFrames: callable,
+    frameCount: int,
+    originalSampleRate: int,
+    targetSampleRate: int,
+    chunkFrames: int = RESAMPLE_CHUNK_FRAMES,
+) -> np.ndarray:
+    """
+    Resample frameCount frames returned by ReadFrames(start, end) with a
+    polyphase filter, chunkFrames input frames at a time. The chunks overlap
+    by the filter length, so the result matches resampling in one go.
+    """
+    gcd = math.gcd(originalSampleRate, targetSampleRate)
+    up = targetSampleRate // gcd
+    down = originalSampleRate // gcd
+
+    # Input frames covered by half the default resample_poly filter,
+    # rounded up to whole multiples of down to keep the output aligned
+    contextFrames = down * math.ceil((10 * max(up, down) / up + 1) / down)
+    chunkFrames = down * math.ceil(chunkFrames / down)
+
+    resampledArray = np.empty(math.ceil(frameCount * up / down), dtype=np.float32)
+    for startFrame in range(0, frameCount, chunkFrames):
+        endFrame = min(startFrame + chunkFrames, frameCount)
+        readStart = max(startFrame - contextFrames, 0)
+        readEnd = min(endFrame + contextFrames, frameCount)
+        resampledChunk = scipy.signal.resample_poly(
+            ReadFrames(readStart, readEnd), up, down)
+
+        # Keep the output of the chunk without its context
+        outputStart = startFrame * up // down
+        outputEnd = math.ceil(endFrame * up / down)
+        contextOffset = (startFrame - readStart) * up // down
+        resampledArray[outputStart:outputEnd] = resampledChunk[
+            contextOffset:contextOffset + outputEnd - outputStart]
+
+    return resampledArray
 
 
 class Audio:
@@ -28,62 +118,650 @@ class Audio:
         # Original audio array
         self.audioArray: np.ndarray = None
         self.sampleRate: int = None
+        # Channels and sample rate of the audio file
+        self.channels: int = None
+        self.originalSampleRate: int = None
+        # Position of the audio array in the audio it was sliced from
+        self.startFrame: int = None
+        # Reader of the audio file when it is opened without loading
+        self.reader: AudioReader = None
+        # Audio and whole-file spectrum a window was sliced from
+        self.sourceAudio: Audio = None
+        self.sourceSpectrum: np.ndarray = None
+
+        # Magnitude envelope
+        self.envelope: np.ndarray = None
+        self.envelopeGroupSize: int = None
 
         # FFT array
+        self.fftComplex: np.ndarray = None
         self.fftSpectrum: np.ndarray = None
         self.nFft: int = nFft
+        self.hopLength: int = nFft // 4
+        # Incremented every time the spectrum changes
+        self.spectrumVersion: int = 0
+        # Frames the spectrum moved by in its last update and the span of
+        # frames reused from the previous spectrum, None if fully generated
+        self.spectrumShift: int = None
+        self.reusedFrames: tuple[int, int] = None
+
+        # Cache entry the audio was loaded from
+        self.cachePath: str = None
+
+        # Shared arrays backing the buffers handed to other processes, by name
+        self.sharedArrays: dict[str, SharedArray] = {}
+        weakref.finalize(self, ReleaseSharedArrays, self.sharedArrays)
+
+        # Summed-area tables of the spectrum, rebuilt when evicted
+        self.spectrumStats: SpectrumStatistics = None
+        # Seconds the last tables took to build
+        self.spectrumStatsCost: float = 0
 
         # Load the audio if audio file path is provided
         if audioFilePath is not None:
             self.LoadAudio(audioFilePath)
 
-    def LoadAudio(self, audioFilePath: str) -> None:
+    def LoadAudio(
+        self,
+        audioFilePath: str,
+        downmix: bool = False,
+        targetSampleRate: int = ANALYSIS_SAMPLE_RATE,
+        useCache: bool = True,
+        lazy: bool = False,
+    ) -> None:
         """
         Method to load a audio file.
+        Audio above targetSampleRate is resampled to it while reading.
+        If the file was preprocessed with the same settings, the cached
+        audio and spectrum are memory mapped instead.
+        If lazy, the file is only opened and frames are decoded by ReadFrames,
+        unless it has to be resampled, and the spectrum frames are computed
+        on demand rather than held for the whole file.
         """
-        # Load audio file
-        self.audioArray, self.sampleRate = sf.read(
-            audioFilePath, always_2d=True)
+        self.cachePath = None
+        # Load the preprocessed audio
+        if useCache:
+            cachePath = AudioCache.GetCachePath(
+                audioFilePath, self.nFft, targetSampleRate)
+            if AudioCache.IsCached(cachePath):
+                self.LoadCache(cachePath)
+                return
 
-        # Check if the audio has multiple channels
-        if self.audioArray.shape[1] > 1:
-            # Display error message
-            messagebox.showerror(
-                "Error", "Audio has multiple channels. Please select a mono audio file.")
-            # Exit the program
-            exit()
+        # Open audio file
+        self.OpenAudio(audioFilePath, downmix)
+        resample = targetSampleRate is not None and targetSampleRate < self.sampleRate
+        if lazy and not resample:
+            return
 
-        # Get first channel
-        self.audioArray = self.audioArray[:, 0]
+        # Resample to the target sample rate
+        frameCount = self.GetFrameCount()
+        if resample:
+            self.audioArray = ResampleAudio(
+                lambda startFrame, endFrame: self.ReadFrames(
+                    startFrame, endFrame - startFrame),
+                frameCount, self.sampleRate, targetSampleRate)
+            self.sampleRate = targetSampleRate
+        else:
+            self.audioArray = self.ReadFrames(0, frameCount)
+        self.CloseAudio()
 
         # get the length of the audio file
         self.audioLength = len(self.audioArray) / self.sampleRate
 
         # Generate FFT Spectrum
-        self.fftSpectrum = np.abs(librosa.core.spectrum.stft(
-            self.audioArray, n_fft=self.nFft))
+        if not lazy:
+            self.GenerateMagnitudeSpectrum()
+        self.AccountBuffers()
+
+    def OpenAudio(self, audioFilePath: str, downmix: bool = False) -> None:
+        """
+        Open a audio file without decoding it.
+        """
+        self.CloseAudio()
+        self.audioArray = None
+        self.fftComplex = None
+        self.fftSpectrum = None
+        self.envelope = None
+        self.spectrumStats = None
+        ReleaseSharedArrays(self.sharedArrays)
+        self.AccountBuffers()
+
+        self.reader = OpenAudioReader(audioFilePath)
+        self.channels = self.reader.channels
+        self.originalSampleRate = self.reader.sampleRate
+        self.sampleRate = self.reader.sampleRate
+        self.audioLength = self.reader.frames / self.sampleRate
+
+        # Check if the audio has multiple channels
+        if self.channels > 1 and not downmix:
+            self.CloseAudio()
+            raise ValueError("Audio has multiple channels. Please select a mono audio file.")
+
+    def CloseAudio(self) -> None:
+        """
+        Close the audio file opened by OpenAudio.
+        """
+        if self.reader is not None:
+            self.reader.Close()
+            self.reader = None
+
+    def ReadFrames(self, startFrame: int, frameCount: int) -> np.ndarray:
+        """
+        Read frameCount mono frames from startFrame, from the audio array if
+        it is loaded or else from the audio file. Fewer frames are returned
+        at the end of the audio.
+        """
+        if self.audioArray is not None:
+            return self.audioArray[startFrame:startFrame + frameCount]
+        if self.reader is None:
+            return np.zeros(0, dtype=np.float32)
 
-    def LoadAudioArray(self, audioArray: np.ndarray, sampleRate: int):
+        with Span("Audio.Decode"):
+            frames = self.reader.Read(startFrame, frameCount)
+        # Average all channels
+        return frames.mean(axis=1) if frames.shape[1] > 1 else frames[:, 0]
+
+    def GetFrameCount(self) -> int:
+        """
+        Get the number of frames of the audio, 0 if nothing is loaded.
+        """
+        if self.audioArray is not None:
+            return len(self.audioArray)
+        if self.reader is not None:
+            return self.reader.frames
+        return 0
+
+    def LoadCache(self, cachePath: str) -> None:
+        """
+        Load preprocessed audio from a cache entry.
+        """
+        metadata, arrays = AudioCache.ReadCache(cachePath)
+
+        self.CloseAudio()
+        # Mapped arrays are shared through their files
+        ReleaseSharedArrays(self.sharedArrays)
+        self.audioArray = arrays["audio"]
+        self.sampleRate = metadata["sampleRate"]
+        self.channels = metadata["channels"]
+        self.originalSampleRate = metadata["originalSampleRate"]
+        self.audioLength = len(self.audioArray) / self.sampleRate
+
+        self.fftComplex = None
+        self.fftSpectrum = arrays["spectrum"]
+        self.spectrumVersion += 1
+        self.spectrumShift = None
+        self.reusedFrames = None
+
+        self.envelope = arrays.get("envelope")
+        self.envelopeGroupSize = metadata.get("envelopeGroupSize")
+
+        self.cachePath = cachePath
+        self.AccountBuffers()
+
+    def SetSharedArray(self, name: str, sharedArray: SharedArray) -> None:
+        """
+        Back the buffer name with a shared array, releasing the previous one.
+        """
+        previous = self.sharedArrays.pop(name, None)
+        if previous is not None:
+            previous.Release()
+        self.sharedArrays[name] = sharedArray
+        setattr(self, SHARED_BUFFERS[name], sharedArray.array)
+
+    def ShareBuffer(self, name: str) -> None:
+        """
+        Move the buffer name to shared memory.
+        """
+        self.SetSharedArray(name, ShareArray(getattr(self, SHARED_BUFFERS[name])))
+
+    def ShareBuffers(self) -> dict:
+        """
+        Get a picklable handle other processes open the audio with by
+        LoadShared, without copying the audio array and the spectrum.
+        Buffers that are neither shared nor mapped from a cache are moved
+        to shared memory first, audio opened lazily is opened again.
+        The handle is valid as long as this audio keeps its buffers.
+        """
+        arrays = {}
+        for name, attribute in SHARED_BUFFERS.items():
+            array = getattr(self, attribute)
+            if array is None:
+                continue
+            descriptor = GetArrayDescriptor(array, self.sharedArrays.get(name))
+            if descriptor is None:
+                self.ShareBuffer(name)
+                descriptor = self.sharedArrays[name].GetDescriptor()
+            arrays[name] = descriptor
+
+        self.AccountBuffers()
+        return dict(
+            arrays=arrays,
+            audioFilePath=None if self.reader is None else self.reader.audioFilePath,
+            sampleRate=self.sampleRate,
+            channels=self.channels,
+            originalSampleRate=self.originalSampleRate,
+            audioLength=self.audioLength,
+            startFrame=self.startFrame,
+            nFft=self.nFft,
+        )
+
+    def LoadShared(self, handle: dict) -> None:
+        """
+        Open audio shared by another process with ShareBuffers, attaching
+        to its buffers without copying them.
+        """
+        self.CloseAudio()
+        ReleaseSharedArrays(self.sharedArrays)
+        self.audioArray = None
+        self.fftComplex = None
+        self.fftSpectrum = None
+        self.envelope = None
+        self.spectrumStats = None
+
+        for name, descriptor in handle["arrays"].items():
+            array, sharedArray = OpenArrayDescriptor(descriptor)
+            setattr(self, SHARED_BUFFERS[name], array)
+            if sharedArray is not None:
+                self.sharedArrays[name] = sharedArray
+        # Frames of lazily opened audio are read from its file
+        if self.audioArray is None and handle["audioFilePath"] is not None:
+            self.reader = OpenAudioReader(handle["audioFilePath"])
+
+        self.sampleRate = handle["sampleRate"]
+        self.channels = handle["channels"]
+        self.originalSampleRate = handle["originalSampleRate"]
+        self.audioLength = handle["audioLength"]
+        self.startFrame = handle["startFrame"]
+        self.nFft = handle["nFft"]
+        self.hopLength = self.nFft // 4
+        self.spectrumVersion += 1
+        self.spectrumShift = None
+        self.reusedFrames = None
+        self.cachePath = None
+        self.AccountBuffers()
+
+    def SaveCache(self, cachePath: str, metadata: dict = None) -> dict:
+        """
+        Save the audio, spectrum and envelope into a cache entry.
+        Returns the metadata of the entry.
+        """
+        metadata = dict(
+            metadata or {},
+            sampleRate=self.sampleRate,
+            channels=self.channels,
+            originalSampleRate=self.originalSampleRate,
+            audioLength=self.audioLength,
+            frames=len(self.audioArray),
+            nFft=self.nFft,
+            envelopeGroupSize=self.envelopeGroupSize,
+        )
+        return AudioCache.WriteCache(
+            cachePath,
+            {
+                "audio": np.ascontiguousarray(self.audioArray),
+                "spectrum": self.fftSpectrum,
+                "envelope": self.envelope,
+            },
+            metadata
+        )
+
+    @Timed("Audio.LoadWindow")
+    def LoadWindow(self, rootAudio: "Audio", audioArray: np.ndarray, startFrame: int) -> None:
+        """
+        Load the window audioArray starting at startFrame of rootAudio, whose
+        whole spectrum was cached or generated. The magnitude frames are a
+        view of the spectrum of rootAudio, the complex STFT and the
+        summed-area tables are only computed when asked for.
+        """
+        ReleaseSharedArrays(self.sharedArrays)
+        self.sourceAudio = rootAudio
+        self.sourceSpectrum = rootAudio.fftSpectrum
+
+        self.audioArray = audioArray
+        self.sampleRate = rootAudio.sampleRate
+        self.startFrame = startFrame
+        self.audioLength = len(self.audioArray) / self.sampleRate
+
+        # Frames of the centered STFT of the window, startFrame is a hop
+        # multiple so they are frames of the whole-file STFT
+        firstFrame = startFrame // self.hopLength
+        self.fftComplex = None
+        self.fftSpectrum = rootAudio.fftSpectrum[
+            :, firstFrame:firstFrame + 1 + len(self.audioArray) // self.hopLength]
+        self.spectrumVersion += 1
+        self.spectrumShift = None
+        self.reusedFrames = None
+        self.spectrumStats = None
+
+        # The cached envelope is grouped for the whole file, too coarse
+        # for a window
+        self.GenerateEnvelope()
+        self.AccountBuffers()
+
+    def GetComplexSpectrum(self) -> np.ndarray:
+        """
+        Get the complex STFT, generating the frames of a window sliced from
+        a whole-file spectrum when first asked for.
+        """
+        if self.fftComplex is not None:
+            return self.fftComplex
+
+        # Frames of the source while it still holds the spectrum sliced
+        # from, otherwise of the audio itself
+        source = self.sourceAudio
+        if source is not None and source.fftSpectrum is self.sourceSpectrum:
+            firstFrame = self.startFrame // self.hopLength
+        else:
+            source = self
+            firstFrame = 0
+        with Span("Audio.ComplexFrames"):
+            self.fftComplex = source.GenerateFrames(firstFrame, firstFrame + self.fftSpectrum.shape[1])
+        self.AccountBuffers()
+        return self.fftComplex
+
+    @Timed("Audio.LoadAudioArray")
+    def LoadAudioArray(self, audioArray: np.ndarray, sampleRate: int, startFrame: int = None):
         """
         Load audio array.
+        startFrame is the position of the array in the audio it was sliced
+        from. When it overlaps the previous array by a shift of whole hops,
+        only the STFT frames that are not shared are computed.
         """
+        prevArray = self.audioArray
+        prevStartFrame = self.startFrame
+        prevSampleRate = self.sampleRate
+        ReleaseSharedArrays(self.sharedArrays)
+        self.sourceAudio = None
+        self.sourceSpectrum = None
+
         self.audioArray = audioArray
         self.sampleRate = sampleRate
+        self.startFrame = startFrame
         self.audioLength = len(self.audioArray) / self.sampleRate
 
+        # Shift from the previous array in samples
+        sampleShift = None
+        if prevSampleRate == sampleRate:
+            sampleShift = self.OverlapShift(prevArray, prevStartFrame)
+
         # Generate FFT Spectrum
-        self.fftSpectrum = np.abs(librosa.core.spectrum.stft(
-            self.audioArray, n_fft=self.nFft))
+        if sampleShift is not None and sampleShift % self.hopLength == 0:
+            self.UpdateSpectrum(sampleShift // self.hopLength, len(prevArray))
+        else:
+            self.GenerateSpectrum()
+
+        # Generate the magnitude envelope
+        self.GenerateEnvelope(sampleShift, prevArray)
+
+        # Build the summed-area tables for region statistics
+        spectrumStats = self.spectrumStats
+        if self.spectrumShift is not None and spectrumStats is not None:
+            spectrumStats.Shift(
+                self.fftSpectrum, self.spectrumShift, self.reusedFrames)
+        else:
+            self.BuildSpectrumStats()
+
+        self.AccountBuffers()
+
+    def BuildSpectrumStats(self) -> SpectrumStatistics:
+        """
+        Build the summed-area tables of the spectrum.
+        """
+        startTime = time.perf_counter()
+        with Span("Audio.SpectrumStats"):
+            spectrumStats = SpectrumStatistics(
+                self.fftSpectrum,
+                librosa.fft_frequencies(sr=self.sampleRate, n_fft=self.nFft)
+            )
+        self.spectrumStatsCost = time.perf_counter() - startTime
+        self.spectrumStats = spectrumStats
+        return spectrumStats
+
+    def GetSpectrumStats(self) -> SpectrumStatistics:
+        """
+        Get the summed-area tables of the spectrum, building them again if
+        they were evicted.
+        """
+        spectrumStats = self.spectrumStats
+        if spectrumStats is None:
+            spectrumStats = self.BuildSpectrumStats()
+            self.AccountBuffers()
+        else:
+            memoryBudget.Touch(self, "statistics")
+        return spectrumStats
+
+    def AccountBuffers(self) -> None:
+        """
+        Account the buffers of the audio in the memory budget. The
+        summed-area tables are built again when needed, so they may be
+        evicted.
+        """
+        spectrumStats = self.spectrumStats
+        memoryBudget.Register(self, "audio", "audio", self.audioArray)
+        memoryBudget.Register(self, "spectrum", "spectrum", [self.fftComplex, self.fftSpectrum])
+        memoryBudget.Register(self, "envelope", "envelope", self.envelope)
+        memoryBudget.Register(
+            self, "statistics", "statistics",
+            None if spectrumStats is None else spectrumStats.GetTables(),
+            self.spectrumStatsCost, Audio.DropSpectrumStats)
+
+    def DropSpectrumStats(self) -> None:
+        """
+        Evict the summed-area tables, GetSpectrumStats builds them again.
+        """
+        self.spectrumStats = None
 
+    def OverlapShift(self, prevArray: np.ndarray, prevStartFrame: int) -> int:
+        """
+        Get the shift in samples from the previous audio array to the
+        current one if they overlap with the same samples, otherwise None.
+        """
+        if prevArray is None or prevStartFrame is None or self.startFrame is None:
+            return None
+        if self.fftComplex is None:
+            return None
+
+        # Overlapping region in the source audio
+        overlapStart = max(prevStartFrame, self.startFrame)
+        overlapEnd = min(prevStartFrame + len(prevArray),
+                         self.startFrame + len(self.audioArray))
+        if overlapEnd - overlapStart <= self.nFft:
+            return None
+
+        # Make sure both arrays come from the same audio
+        if not np.array_equal(
+            prevArray[overlapStart - prevStartFrame:overlapEnd - prevStartFrame],
+            self.audioArray[overlapStart - self.startFrame:overlapEnd - self.startFrame]
+        ):
+            return None
+
+        return self.startFrame - prevStartFrame
+
+    @Timed("Audio.STFT")
+    def GenerateSpectrum(self) -> None:
+        """
+        Generate the complex STFT and the magnitude spectrum of the audio.
+        """
+        self.fftComplex = librosa.core.spectrum.stft(
+            self.audioArray,
+            n_fft=self.nFft,
+            hop_length=self.hopLength,
+            pad_mode="constant",
+            dtype=np.complex64 if STFT_COMPLEX64 else None
+        )
+        self.fftSpectrum = np.abs(self.fftComplex)
+
+        self.spectrumVersion += 1
+        self.spectrumShift = None
+        self.reusedFrames = None
+
+    @Timed("Audio.STFT")
+    def GenerateMagnitudeSpectrum(self, chunkFrames: int = SPECTRUM_CHUNK_FRAMES) -> None:
+        """
+        Generate only the magnitude spectrum of the audio, chunkFrames
+        frames at a time, so long files never hold the complex STFT.
+        """
+        frameCount = self.GetSpectrumFrameCount()
+        shape = (self.nFft // 2 + 1, frameCount)
+        dtype = np.float32 if STFT_COMPLEX64 else np.float64
+        self.fftComplex = None
+        self.fftSpectrum = np.empty(shape, dtype=dtype)
+        for firstFrame in range(0, frameCount, chunkFrames):
+            lastFrame = min(firstFrame + chunkFrames, frameCount)
+            self.fftSpectrum[:, firstFrame:lastFrame] = np.abs(
+                self.GenerateFrames(firstFrame, lastFrame))
+
+        self.spectrumVersion += 1
+        self.spectrumShift = None
+        self.reusedFrames = None
+        self.AccountBuffers()
+
+    def GenerateFrames(self, firstFrame: int, lastFrame: int) -> np.ndarray:
+        """
+        Generate STFT frames firstFrame to lastFrame (exclusive), identical
+        to the same frames of the centered STFT of the whole audio.
+        """
+        halfFft = self.nFft // 2
+        frameCount = self.GetFrameCount()
+        # Samples covered by the frames, zero padded outside the audio
+        startSample = firstFrame * self.hopLength - halfFft
+        endSample = (lastFrame - 1) * self.hopLength + halfFft
+        segment = self.ReadFrames(
+            max(startSample, 0), min(endSample, frameCount) - max(startSample, 0))
+        segment = np.pad(segment, (
+            max(-startSample, 0),
+            max(endSample - frameCount, 0)
+        ))
+
+        return librosa.core.spectrum.stft(
+            segment,
+            n_fft=self.nFft,
+            hop_length=self.hopLength,
+            center=False,
+            dtype=np.complex64 if STFT_COMPLEX64 else None
+        )
+
+    def GetSpectrumFrameCount(self) -> int:
+        """
+        Get the number of STFT frames of the audio.
+        """
+        return 1 + self.GetFrameCount() // self.hopLength
+
+    def GetMagnitudeFrames(self, firstFrame: int, lastFrame: int) -> np.ndarray:
+        """
+        Get magnitude frames firstFrame to lastFrame (exclusive), from the
+        spectrum if it was generated or else from the audio.
+        """
+        if self.fftSpectrum is not None:
+            return self.fftSpectrum[:, firstFrame:lastFrame]
+        return np.abs(self.GenerateFrames(firstFrame, lastFrame))
+
+    @Timed("Audio.UpdateSpectrum")
+    def UpdateSpectrum(self, frameShift: int, prevLength: int) -> None:
+        """
+        Update the spectrum of an audio array shifted by frameShift frames
+        from the previous one of prevLength samples. Frames shared by both
+        arrays are moved, only the remaining frames are computed.
+        """
+        halfFft = self.nFft // 2
+        frameCount = 1 + len(self.audioArray) // self.hopLength
+
+        # Frames not touching the padding of either array
+        firstFrame = max(
+            -(-halfFft // self.hopLength),
+            -(-halfFft // self.hopLength) - frameShift
+        )
+        lastFrame = min(
+            (len(self.audioArray) - halfFft) // self.hopLength,
+            (prevLength - halfFft) // self.hopLength - frameShift
+        ) + 1
+        if lastFrame <= firstFrame:
+            self.GenerateSpectrum()
+            return
+
+        # Move the shared frames
+        reusedFrames = (firstFrame, lastFrame)
+        self.fftComplex = ShiftColumns(
+            self.fftComplex, frameCount, frameShift, reusedFrames)
+        self.fftSpectrum = ShiftColumns(
+            self.fftSpectrum, frameCount, frameShift, reusedFrames)
+
+        # Compute the new frames on both sides
+        for frameSpan in [(0, firstFrame), (lastFrame, frameCount)]:
+            if frameSpan[1] <= frameSpan[0]:
+                continue
+            frames = self.GenerateFrames(frameSpan[0], frameSpan[1])
+            self.fftComplex[:, frameSpan[0]:frameSpan[1]] = frames
+            self.fftSpectrum[:, frameSpan[0]:frameSpan[1]] = np.abs(frames)
+
+        self.spectrumVersion += 1
+        self.spectrumShift = frameShift
+        self.reusedFrames = reusedFrames
+
+    @Timed("Audio.Envelope")
+    def GenerateEnvelope(self, sampleShift: int = None, prevArray: np.ndarray = None) -> None:
+        """
+        Generate the mean absolute magnitude of every group of samples.
+        Groups shared with the previous audio array are reused when the
+        arrays are shifted by whole groups.
+        """
+        groupSize = max(len(self.audioArray) //
+                        int(MIN_AUDIO_LENGTH * self.sampleRate), 1)
+        groupCount = -(-len(self.audioArray) // groupSize)
+
+        # Complete groups shared with the previous envelope
+        reusedGroups = None
+        if sampleShift is not None and groupSize == self.envelopeGroupSize \
+                and sampleShift % groupSize == 0:
+            groupShift = sampleShift // groupSize
+            reusedGroups = (
+                max(0, -groupShift),
+                min(len(self.audioArray) // groupSize,
+                    len(prevArray) // groupSize - groupShift)
+            )
+            if reusedGroups[1] <= reusedGroups[0]:
+                reusedGroups = None
+
+        if reusedGroups is None:
+            self.envelope = np.empty(groupCount)
+            newGroupSpans = [(0, groupCount)]
+        else:
+            self.envelope = ShiftColumns(
+                self.envelope, groupCount, groupShift, reusedGroups)
+            newGroupSpans = [(0, reusedGroups[0]), (reusedGroups[1], groupCount)]
+
+        for groupSpan in newGroupSpans:
+            if groupSpan[1] <= groupSpan[0]:
+                continue
+            samples = np.abs(self.audioArray[
+                groupSpan[0] * groupSize:groupSpan[1] * groupSize])
+            # Average complete groups, then the last partial group
+            completeCount = len(samples) // groupSize
+            self.envelope[groupSpan[0]:groupSpan[0] + completeCount] = \
+                samples[:completeCount * groupSize].reshape(-1, groupSize).mean(axis=1)
+            if completeCount * groupSize < len(samples):
+                self.envelope[groupSpan[0] + completeCount] = \
+                    samples[completeCount * groupSize:].mean()
+
+        self.envelopeGroupSize = groupSize
+
+    @Timed("Audio.GriffinLim")
     def ReconstructAudio(
         self,
         sampleRate: int,
         fftSpectrum: np.ndarray,
         freqHeight: int,
         freqSpan: tuple[int, int],
+        nIter: int = GRIFFIN_LIM_ITERATIONS,
+        chunkIter: int = GRIFFIN_LIM_CHUNK_ITERATIONS,
+        onPreview: callable = None,
+        isCancelled: callable = None,
     ) -> np.ndarray:
         """
-        Reconstruct the audio from the FFT spectrum.
+        Reconstruct the audio from the FFT spectrum with Griffin-Lim.
+        After the first and every chunkIter iterations the estimate is stored in
+        audioArray and passed to onPreview(audioArray, iteration).
+        Returns None if isCancelled() turns true before the last iteration.
         """
         # Check 0 <= freqSpan[0] <= freqSpan[1] <= freqHeight
         if freqSpan[0] < 0 or freqSpan[1] > freqHeight or freqSpan[0] > freqSpan[1]:
@@ -97,85 +775,113 @@ class Audio:
         # Store the FFT spectrum
         self.fftSpectrum[freqSpan[0]:freqSpan[1], :] = fftSpectrum[:, :]
 
-        # Reconstruct the audio from the FFT spectrum
-        self.audioArray = librosa.core.spectrum.griffinlim(self.fftSpectrum)
+        # Fast Griffin-Lim, see librosa.griffinlim
+        nFft = 2 * (freqHeight - 1)
+        hopLength = nFft // 4
+        momentum = 0.99
+        angles = np.exp(2j * np.pi * np.random.rand(*self.fftSpectrum.shape))
+        rebuilt = 0
+        for iteration in range(1, nIter + 1):
+            if isCancelled is not None and isCancelled():
+                return None
+
+            # Project onto the set of consistent spectrograms
+            prevRebuilt = rebuilt
+            inverse = librosa.core.spectrum.istft(
+                self.fftSpectrum * angles, hop_length=hopLength, n_fft=nFft)
+            rebuilt = librosa.core.spectrum.stft(
+                inverse, n_fft=nFft, hop_length=hopLength)
+            # Update the phase estimate with momentum
+            angles = rebuilt - (momentum / (1 + momentum)) * prevRebuilt
+            angles /= np.abs(angles) + 1e-16
+
+            # Publish a coarse estimate right away, then every chunk
+            if iteration == 1 or iteration % chunkIter == 0 or iteration == nIter:
+                self.audioArray = librosa.core.spectrum.istft(
+                    self.fftSpectrum * angles, hop_length=hopLength, n_fft=nFft)
+                if onPreview is not None:
+                    onPreview(self.audioArray, iteration)
 
         return self.audioArray
 
-
-class AudioPlayer:
-    """
-    Audio player class
-    """
-
-    def __init__(
+    @Timed("Audio.InverseSTFT")
+    def ReconstructAudioPhase(
         self,
-        audio: Audio,
-        responseRate: float,
-        callback: callable = None,
-    ) -> None:
-        self.audio: Audio = audio
-        self.responseRate: float = responseRate
-
-        self.audioBuffer: queue.Queue = queue.Queue()
+        sampleRate: int,
+        fftComplex: np.ndarray,
+        nFft: int,
+        timeSpan: tuple[int, int],
+        freqSpan: tuple[int, int],
+    ) -> np.ndarray:
+        """
+        Reconstruct the audio of a spectrum region from the complex STFT.
+        Only the selected frames are inverted, keeping their original phase.
+        """
+        # Check 0 <= span[0] <= span[1] <= size for both axes
+        if freqSpan[0] < 0 or freqSpan[1] > fftComplex.shape[0] or freqSpan[0] > freqSpan[1]:
+            raise ValueError("Invalid frequency span")
+        if timeSpan[0] < 0 or timeSpan[1] > fftComplex.shape[1] or timeSpan[0] > timeSpan[1]:
+            raise ValueError("Invalid time span")
 
-        # Play control
-        self.playThread = None
-        self.isPlaying: bool = False
+        self.sampleRate = sampleRate
 
-        self.timeCallback: callable = callback
+        hopLength = nFft // 4
+        frameCount = timeSpan[1] - timeSpan[0]
+        # Silent frames on both sides so the overlap-add of the edge frames
+        # is not trimmed by the centered inverse STFT
+        padFrames = int(np.ceil(nFft / hopLength))
+
+        # Mask everything outside the selected region
+        self.fftComplex = np.zeros(
+            (fftComplex.shape[0], frameCount + 2 * padFrames),
+            dtype=fftComplex.dtype
+        )
+        self.fftComplex[freqSpan[0]:freqSpan[1], padFrames:padFrames + frameCount] = \
+            fftComplex[freqSpan[0]:freqSpan[1], timeSpan[0]:timeSpan[1]]
+        self.fftSpectrum = np.abs(self.fftComplex)
+
+        # Inverse STFT of the masked frames
+        audioArray = librosa.core.spectrum.istft(
+            self.fftComplex, hop_length=hopLength, n_fft=nFft)
+
+        # Trim the silence produced by the padding frames
+        startSample = max(padFrames * hopLength - nFft // 2, 0)
+        endSample = (padFrames + frameCount - 1) * hopLength + nFft // 2
+        self.audioArray = audioArray[startSample:endSample]
 
-    def SetAudioPosition(self, position: float) -> None:
-        # Set the audio position
-        position = position * self.audio.audioLength
-        self.audio.cursorPosition = position
+        return self.audioArray
 
-    def Play(self) -> None:
+    @Timed("Audio.BandPass")
+    def BandPassAudio(
+        self,
+        sampleRate: int,
+        audioArray: np.ndarray,
+        timeSpan: tuple[float, float],
+        freqSpan: tuple[float, float],
+        padding: float = BAND_PASS_PADDING,
+    ) -> np.ndarray:
         """
-        Play the audio
+        Cut a time span in seconds out of the audio array and keep only the
+        frequency span in Hz with a zero-phase band-pass filter.
         """
-        self.playThread = threading.Thread(target=self.PlayThread)
-        self.playThread.start()
+        if timeSpan[0] > timeSpan[1]:
+            raise ValueError("Invalid time span")
 
-    def PlayThread(self) -> None:
-        """
-        Thread target to play the audio
-        """
-        if self.isPlaying or self.audio.audioArray is None:
-            return
+        self.sampleRate = sampleRate
 
-        # Check if the audio array is empty
-        if self.audio.audioArray.size == 0:
-            return
+        # Cut the time span with padding on both sides
+        startSample = max(int((timeSpan[0] - padding) * sampleRate), 0)
+        endSample = min(int((timeSpan[1] + padding) * sampleRate), len(audioArray))
+        segment = audioArray[startSample:endSample]
 
-        self.isPlaying = True
-
-        # Get the sub array of the audio array
-        playAudioArray = self.audio.audioArray[int(
-            self.audio.cursorPosition * self.audio.sampleRate):]
-
-        # Update the time callback
-        timeStamp = time.time()
-        sd.play(playAudioArray, self.audio.sampleRate)
-        while self.audio.cursorPosition < self.audio.audioLength:
-            # Update the time callback
-            if self.timeCallback is not None:
-                self.timeCallback(self.audio.cursorPosition)
-            # Get delta time
-            deltaTime = time.time() - timeStamp
-            timeStamp = time.time()
-            # Increase the cursor position
-            self.audio.cursorPosition += deltaTime
-            time.sleep(self.responseRate)
-            if not self.isPlaying:
-                return
+        sos = DesignBandPassFilter(freqSpan[0], freqSpan[1], sampleRate)
+        if sos is None or len(segment) < 2:
+            self.audioArray = np.array(segment)
+            return self.audioArray
 
-        # Reset the cursor position
-        self.audio.cursorPosition = 0
-        if self.timeCallback is not None:
-            self.timeCallback(self.audio.cursorPosition)
-        self.isPlaying = False
+        # Shorten the edge padding of sosfiltfilt for very short spans
+        padLength = min(3 * (2 * len(sos) + 1), len(segment) - 1)
+        self.audioArray = scipy.signal.sosfiltfilt(
+            sos, segment, padlen=padLength)
 
-    def Pause(self) -> None:
-        self.isPlaying = False
-        sd.stop()
+        return self.audioArray
@@ -0,0 +1,283 @@
+import io
+import mmap
+import os
+import threading
+from abc import ABC, abstractmethod
+import numpy as np
+import soundfile as sf
+
+from Utils import AudioCache
+
+# Extensions of the audio files the scripts search directories for
+AUDIO_EXTENSIONS = (".wav", ".flac", ".ogg", ".mp3", ".aif", ".aiff", ".w64", ".rf64")
+# Bit rates in kbps of MPEG-1 and MPEG-2/2.5 Layer III by header index
+MP3_BIT_RATES = {
+    3: (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    2: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    0: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+# Sample rates of MPEG-1, MPEG-2 and MPEG-2.5 by header index
+MP3_SAMPLE_RATES = {
+    3: (44100, 48000, 32000),
+    2: (22050, 24000, 16000),
+    0: (11025, 12000, 8000),
+}
+# Delay of the Layer III decoder, removed with the encoder delay
+MP3_DECODER_DELAY = 529
+# Frames decoded and dropped before a seek target, the decoder output is
+# not reliable at the start of a stream
+MP3_PRIMING_FRAMES = 10
+
+
+class AudioReader(ABC):
+    """
+    Reader returning frames of an audio file without loading all of it.
+    """
+
+    def __init__(self, audioFilePath: str) -> None:
+        self.audioFilePath: str = audioFilePath
+        self.sampleRate: int = None
+        self.channels: int = None
+        # Number of frames in the file
+        self.frames: int = 0
+        # Readers are shared by the player and the loading threads
+        self.lock = threading.Lock()
+
+    @abstractmethod
+    def Read(self, startFrame: int, frameCount: int) -> np.ndarray:
+        """
+        Read frameCount frames from startFrame as a float32 array of shape
+        (frames, channels). Fewer frames are returned at the end of the file.
+        """
+
+    def Close(self) -> None:
+        pass
+
+
+class SoundFileReader(AudioReader):
+    """
+    Reader seeking natively in any format supported by soundfile.
+    """
+
+    def __init__(self, audioFilePath: str) -> None:
+        super().__init__(audioFilePath)
+        self.soundFile = sf.SoundFile(audioFilePath)
+        self.sampleRate = self.soundFile.samplerate
+        self.channels = self.soundFile.channels
+        self.frames = self.soundFile.frames
+
+    def Read(self, startFrame: int, frameCount: int) -> np.ndarray:
+        startFrame = max(startFrame, 0)
+        frameCount = max(min(frameCount, self.frames - startFrame), 0)
+        with self.lock:
+            self.soundFile.seek(startFrame)
+            return self.soundFile.read(frameCount, dtype="float32", always_2d=True)
+
+    def Close(self) -> None:
+        self.soundFile.close()
+
+
+class Mp3Reader(AudioReader):
+    """
+    Reader of MP3 files seeking with an index of the MPEG frame offsets.
+    A read decodes only the MPEG frames covering the requested frames.
+    """
+
+    def __init__(self, audioFilePath: str, cacheDir: str = None) -> None:
+        super().__init__(audioFilePath)
+        # Reads at the start of the file are decoded natively
+        self.soundFile = sf.SoundFile(audioFilePath)
+        self.sampleRate = self.soundFile.samplerate
+        self.channels = self.soundFile.channels
+        self.frames = self.soundFile.frames
+
+        # Load or build the index of the file
+        indexPath = AudioCache.GetIndexPath(audioFilePath, cacheDir)
+        if AudioCache.IsCached(indexPath):
+            metadata, arrays = AudioCache.ReadCache(indexPath)
+        else:
+            arrays, metadata = IndexMp3File(audioFilePath)
+            try:
+                AudioCache.WriteCache(indexPath, arrays, metadata)
+            except OSError as e:
+                print(f"Failed to cache the index of {audioFilePath}: {e}")
+
+        # Byte offsets of the audio MPEG frames and the end of the last one
+        self.offsets: np.ndarray = arrays["offsets"]
+        self.samplesPerFrame: int = metadata["samplesPerFrame"]
+        # Decoded samples removed from the start of the stream
+        self.skipFrames: int = metadata["skipFrames"]
+
+        self.file = open(audioFilePath, "rb")
+
+    def Read(self, startFrame: int, frameCount: int) -> np.ndarray:
+        startFrame = max(startFrame, 0)
+        endFrame = min(startFrame + frameCount, self.frames)
+        if endFrame <= startFrame:
+            return np.zeros((0, self.channels), dtype=np.float32)
+
+        # MPEG frames covering the requested frames, with priming frames
+        # before and one extra frame after
+        firstMpegFrame = (startFrame + self.skipFrames - MP3_DECODER_DELAY) // \
+            self.samplesPerFrame - MP3_PRIMING_FRAMES
+        lastMpegFrame = min(
+            -(-(endFrame + self.skipFrames) // self.samplesPerFrame) + 1,
+            len(self.offsets) - 1
+        )
+        # Decode natively at the start of the file and past the indexed
+        # frames, native seeks are not exact so the start is decoded too
+        if firstMpegFrame <= 0 or firstMpegFrame + MP3_PRIMING_FRAMES >= lastMpegFrame:
+            readStart = 0 if firstMpegFrame <= 0 else startFrame
+            with self.lock:
+                self.soundFile.seek(readStart)
+                decoded = self.soundFile.read(
+                    endFrame - readStart, dtype="float32", always_2d=True)
+            return decoded[startFrame - readStart:]
+
+        with self.lock:
+            self.file.seek(self.offsets[firstMpegFrame])
+            data = self.file.read(
+                self.offsets[lastMpegFrame] - self.offsets[firstMpegFrame])
+
+        # Decode the MPEG frames behind an info frame giving their count,
+        # the decoder removes its delay from the start
+        infoFrame = MakeInfoFrame(data[:4], lastMpegFrame - firstMpegFrame)
+        decoded, _ = sf.read(
+            io.BytesIO(infoFrame + data), dtype="float32", always_2d=True)
+        outputOffset = startFrame + self.skipFrames - MP3_DECODER_DELAY - \
+            firstMpegFrame * self.samplesPerFrame
+        return decoded[outputOffset:outputOffset + endFrame - startFrame]
+
+    def Close(self) -> None:
+        self.file.close()
+        self.soundFile.close()
+
+
+def MakeInfoFrame(header: bytes, frameCount: int) -> bytes:
+    """
+    Make a Xing info frame announcing frameCount MPEG frames, matching the
+    MPEG frame header header. Without it the decoder estimates the length
+    of a variable bit rate stream from its first frame.
+    """
+    header = int.from_bytes(header, "big")
+    version = (header >> 19) & 3
+    # Large enough bit rate index, no padding and no CRC
+    header = (header & ~(0xf << 12) & ~(1 << 9)) | (9 << 12) | (1 << 16)
+    bitRate = MP3_BIT_RATES[version][9] * 1000
+    sampleRate = MP3_SAMPLE_RATES[version][(header >> 10) & 3]
+
+    frame = bytearray((144 if version == 3 else 72) * bitRate // sampleRate)
+    frame[:4] = header.to_bytes(4, "big")
+    xingOffset = GetXingOffset(header)
+    frame[xingOffset:xingOffset + 4] = b"Xing"
+    # Only the frame count field is present
+    frame[xingOffset + 4:xingOffset + 8] = (1).to_bytes(4, "big")
+    frame[xingOffset + 8:xingOffset + 12] = frameCount.to_bytes(4, "big")
+    return bytes(frame)
+
+
+def GetXingOffset(header: int) -> int:
+    """
+    Get the offset of the Xing tag in an MPEG frame with the given header.
+    """
+    version = (header >> 19) & 3
+    mono = (header >> 6) & 3 == 3
+    if version == 3:
+        return 21 if mono else 36
+    return 13 if mono else 21
+
+
+def IndexMp3File(audioFilePath: str) -> tuple[dict, dict]:
+    """
+    Index the MPEG frames of an MP3 file by parsing their headers.
+    Returns the arrays and the metadata of the index.
+    """
+    with open(audioFilePath, "rb") as file:
+        data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        # Skip the ID3v2 tag
+        position = 0
+        if data[:3] == b"ID3":
+            tagSize = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+            position = 10 + tagSize + (10 if data[5] & 0x10 else 0)
+
+        offsets = []
+        samplesPerFrame = None
+        while position + 4 <= len(data):
+            header = int.from_bytes(data[position:position + 4], "big")
+            version = (header >> 19) & 3
+            layer = (header >> 17) & 3
+            bitRateIndex = (header >> 12) & 15
+            sampleRateIndex = (header >> 10) & 3
+            # Stop at the first thing that is not a Layer III frame
+            if (header >> 21) != 0x7ff or version == 1 or layer != 1 or \
+                    bitRateIndex in (0, 15) or sampleRateIndex == 3:
+                break
+            bitRate = MP3_BIT_RATES[version][bitRateIndex] * 1000
+            sampleRate = MP3_SAMPLE_RATES[version][sampleRateIndex]
+            padding = (header >> 9) & 1
+            if version == 3:
+                samplesPerFrame = 1152
+                frameLength = 144 * bitRate // sampleRate + padding
+            else:
+                samplesPerFrame = 576
+                frameLength = 72 * bitRate // sampleRate + padding
+            # Drop a truncated last frame
+            if position + frameLength > len(data):
+                break
+            offsets.append(position)
+            position += frameLength
+        offsets.append(position)
+
+        if samplesPerFrame is None:
+            raise ValueError(f"No MPEG Layer III frames in {audioFilePath}")
+
+        # The Xing or Info frame carries no audio and the LAME tag after it
+        # gives the encoder delay removed by the decoder
+        skipFrames = 0
+        xingOffset = offsets[0] + GetXingOffset(
+            int.from_bytes(data[offsets[0]:offsets[0] + 4], "big"))
+        if data[xingOffset:xingOffset + 4] in (b"Xing", b"Info"):
+            flags = int.from_bytes(data[xingOffset + 4:xingOffset + 8], "big")
+            lameOffset = xingOffset + 8 + \
+                4 * bool(flags & 1) + 4 * bool(flags & 2) + \
+                100 * bool(flags & 4) + 4 * bool(flags & 8)
+            if data[lameOffset:lameOffset + 4] in (b"LAME", b"Lavf", b"Lavc"):
+                encoderDelay = (data[lameOffset + 21] << 4) | (data[lameOffset + 22] >> 4)
+                skipFrames = encoderDelay + MP3_DECODER_DELAY
+            offsets = offsets[1:]
+    finally:
+        data.close()
+
+    arrays = {"offsets": np.array(offsets, dtype=np.int64)}
+    metadata = {
+        "samplesPerFrame": samplesPerFrame,
+        "skipFrames": skipFrames,
+    }
+    return arrays, metadata
+
+
+def FindAudioFiles(targetDir: str, extensions: tuple[str, ...] = AUDIO_EXTENSIONS) -> list[str]:
+    """
+    Find all audio files with one of extensions under the target directory,
+    in a stable order.
+    """
+    audioFiles = []
+    for dirPath, dirNames, fileNames in os.walk(targetDir):
+        dirNames.sort()
+        for fileName in sorted(fileNames):
+            if fileName.lower().endswith(extensions):
+                audioFiles.append(os.path.join(dirPath, fileName))
+    return audioFiles
+
+
+def OpenAudioReader(audioFilePath: str, cacheDir: str = None) -> AudioReader:
+    """
+    Open the reader matching the format of an audio file.
+    """
+    if os.path.splitext(audioFilePath)[1].lower() == ".mp3":
+        try:
+            return Mp3Reader(audioFilePath, cacheDir)
+        except ValueError as e:
+            print(f"Falling back to native MP3 seeking: {e}")
+    return SoundFileReader(audioFilePath)
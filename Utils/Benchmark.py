@@ -0,0 +1,141 @@
+import os
+import sys
+import time
+import numpy as np
+import soundfile as sf
+
+from Utils.DataSetLabel import DataSetLabel
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, peak memory is not reported there
+    resource = None
+
+# Frames of synthetic audio generated and written at once
+SYNTHETIC_CHUNK_FRAMES = 1 << 20
+
+
+def PeakRssMb() -> float:
+    """
+    Get the peak resident memory of the process in MB, None if unknown.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, KB elsewhere
+    if sys.platform == "darwin":
+        return peak / (1024 * 1024)
+    return peak / 1024
+
+
+def TimeRepeats(function: callable, repeats: int, warmups: int = 1) -> list[float]:
+    """
+    Call function repeats times and return the wall time of every call.
+    The first warmups calls are not timed, they include one time costs
+    such as compiling the librosa kernels.
+    """
+    for _ in range(warmups):
+        function()
+    wallTimes = []
+    for _ in range(repeats):
+        startTime = time.perf_counter()
+        function()
+        wallTimes.append(time.perf_counter() - startTime)
+    return wallTimes
+
+
+def SyntheticSignal(startFrame: int, frameCount: int, sampleRate: int, seed: int) -> np.ndarray:
+    """
+    Frames of a deterministic test signal: noise, a slow chirp and a burst
+    of tone every second, so the spectrum is neither empty nor flat.
+    """
+    rng = np.random.default_rng((seed, startFrame))
+    t = (startFrame + np.arange(frameCount)) / sampleRate
+    signal = rng.normal(0, 0.02, frameCount)
+    # Chirp sweeping a quarter of the band every 10 seconds
+    sweep = (t % 10) / 10
+    signal += 0.1 * np.sin(2 * np.pi * sampleRate / 8 * (1 + sweep) * (t % 10))
+    # Tone burst in the first fifth of every second
+    signal += 0.3 * (t % 1 < 0.2) * np.sin(2 * np.pi * sampleRate / 16 * t)
+    return signal.astype(np.float32)
+
+
+def WriteSyntheticAudio(
+    audioFilePath: str,
+    seconds: float,
+    sampleRate: int,
+    channels: int = 1,
+    seed: int = 0,
+) -> str:
+    """
+    Write a synthetic WAV file chunk by chunk, so files of hours never sit
+    in memory. Channels are shifted copies of the signal. Files that
+    already exist are kept.
+    """
+    if os.path.exists(audioFilePath):
+        return audioFilePath
+    os.makedirs(os.path.dirname(audioFilePath) or ".", exist_ok=True)
+
+    frameCount = int(seconds * sampleRate)
+    tempPath = audioFilePath + ".tmp"
+    # RF64 once the file no longer fits in a WAV header
+    fileFormat = "RF64" if frameCount * channels * 4 >= 1 << 32 else "WAV"
+    with sf.SoundFile(tempPath, "w", sampleRate, channels, "FLOAT", format=fileFormat) as file:
+        for startFrame in range(0, frameCount, SYNTHETIC_CHUNK_FRAMES):
+            chunkFrames = min(SYNTHETIC_CHUNK_FRAMES, frameCount - startFrame)
+            signal = SyntheticSignal(startFrame, chunkFrames, sampleRate, seed)
+            file.write(np.stack([
+                np.roll(signal, channel * 7) for channel in range(channels)
+            ], axis=1))
+    os.replace(tempPath, audioFilePath)
+    return audioFilePath
+
+
+def SyntheticLabels(
+    labelCount: int,
+    audioLength: float,
+    groupCount: int = 10,
+    maxFreq: float = 8000,
+    seed: int = 0,
+) -> dict[str, list[DataSetLabel]]:
+    """
+    Generate labelCount random labels over audioLength seconds and maxFreq
+    Hz, spread over groupCount groups. Returns the labels by group name.
+    """
+    rng = np.random.default_rng(seed)
+    startTimes = rng.uniform(0, audioLength, labelCount)
+    lengths = rng.uniform(0.05, 2, labelCount)
+    startFreqs = rng.uniform(0, maxFreq, labelCount)
+    bandwidths = rng.uniform(50, 2000, labelCount)
+    groupIds = rng.integers(0, groupCount, labelCount)
+
+    labelGroups = {f"Group {i}": [] for i in range(groupCount)}
+    for i in range(labelCount):
+        groupName = f"Group {groupIds[i]}"
+        labelGroups[groupName].append(DataSetLabel(
+            groupName,
+            float(startTimes[i]),
+            float(min(startTimes[i] + lengths[i], audioLength)),
+            float(startFreqs[i]),
+            float(min(startFreqs[i] + bandwidths[i], maxFreq)),
+        ))
+    return labelGroups
+
+
+def CompareResults(results: list[dict], baseline: list[dict], tolerance: float) -> list[dict]:
+    """
+    Compare the wall times of results with the baseline results of the
+    same name. Returns a row per result with the ratio to the baseline and
+    whether it is more than tolerance slower.
+    """
+    baselineByName = {result["name"]: result for result in baseline}
+    rows = []
+    for result in results:
+        baselineResult = baselineByName.get(result["name"])
+        if baselineResult is None or "wallTime" not in result or "wallTime" not in baselineResult:
+            rows.append(dict(name=result["name"], ratio=None, regressed=False))
+            continue
+        ratio = result["wallTime"] / baselineResult["wallTime"]
+        rows.append(dict(name=result["name"], ratio=ratio, regressed=ratio > 1 + tolerance))
+    return rows
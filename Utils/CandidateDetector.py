@@ -0,0 +1,115 @@
+import numpy as np
+import scipy.ndimage
+
+from Utils.AudioProcess import Audio
+from Utils.DataSetLabel import DataSetLabel
+from Config import DETECTOR_BANDS, DETECTOR_CELL_FRAMES, DETECTOR_MIN_CELLS, DETECTOR_NOISE_PERCENTILE
+from Config import DETECTOR_NOISE_WINDOW, DETECTOR_THRESHOLD_DB, SPECTRUM_CHUNK_FRAMES
+
+# Group of the labels proposed by the detector
+PROPOSALS_GROUP_NAME = "Proposals"
+
+
+def CellEnergies(
+    audio: Audio,
+    bandEdges: np.ndarray,
+    cellFrames: int = DETECTOR_CELL_FRAMES,
+    chunkFrames: int = SPECTRUM_CHUNK_FRAMES,
+) -> np.ndarray:
+    """
+    Mean power in dB of every cell of cellFrames frames and the bins
+    between two band edges, reading the spectrum chunkFrames at a time.
+    Returns an array of shape (bands, cells).
+    """
+    frameCount = audio.GetSpectrumFrameCount()
+    cellCount = -(-frameCount // cellFrames)
+    bandSizes = np.diff(bandEdges)[:, np.newaxis]
+
+    # Whole cells per chunk
+    chunkFrames = max(chunkFrames // cellFrames, 1) * cellFrames
+    cellPower = np.empty((len(bandSizes), cellCount), dtype=np.float32)
+    for firstFrame in range(0, frameCount, chunkFrames):
+        lastFrame = min(firstFrame + chunkFrames, frameCount)
+        power = np.square(audio.GetMagnitudeFrames(firstFrame, lastFrame), dtype=np.float32)
+
+        # Sum the bins of each band, then the frames of each cell
+        bandPower = np.add.reduceat(power, bandEdges[:-1], axis=0)
+        cellStarts = np.arange(0, lastFrame - firstFrame, cellFrames)
+        cellSizes = np.diff(np.append(cellStarts, lastFrame - firstFrame))
+        firstCell = firstFrame // cellFrames
+        cellPower[:, firstCell:firstCell + len(cellStarts)] = \
+            np.add.reduceat(bandPower, cellStarts, axis=1) / (bandSizes * cellSizes)
+
+    return 10 * np.log10(cellPower + 1e-12)
+
+
+def NoiseFloor(
+    cellDb: np.ndarray,
+    windowCells: int,
+    percentile: float = DETECTOR_NOISE_PERCENTILE
+) -> np.ndarray:
+    """
+    Noise floor of every cell, the percentile of its band over blocks of
+    windowCells cells, interpolated between the block centers.
+    """
+    bandCount, cellCount = cellDb.shape
+    windowCells = max(min(windowCells, cellCount), 1)
+    blockCount = -(-cellCount // windowCells)
+
+    # Pad the last block with NaN so it only counts its own cells
+    blocks = np.full((bandCount, blockCount * windowCells), np.nan, dtype=np.float32)
+    blocks[:, :cellCount] = cellDb
+    blockFloor = np.nanpercentile(
+        blocks.reshape(bandCount, blockCount, windowCells), percentile, axis=2)
+
+    blockCenters = np.minimum(
+        np.arange(blockCount) * windowCells + windowCells / 2, cellCount) - 0.5
+    cells = np.arange(cellCount)
+    return np.stack([
+        np.interp(cells, blockCenters, bandFloor) for bandFloor in blockFloor
+    ])
+
+
+def DetectCandidates(
+    audio: Audio,
+    groupName: str = PROPOSALS_GROUP_NAME,
+    bands: int = DETECTOR_BANDS,
+    cellFrames: int = DETECTOR_CELL_FRAMES,
+    noiseWindow: float = DETECTOR_NOISE_WINDOW,
+    thresholdDb: float = DETECTOR_THRESHOLD_DB,
+    minCells: int = DETECTOR_MIN_CELLS,
+) -> list[DataSetLabel]:
+    """
+    Propose labels for the regions of the audio rising thresholdDb above
+    the noise floor of their band. Active cells are grouped into connected
+    regions and every region larger than minCells cells becomes a label.
+    """
+    freqHeight = audio.nFft // 2 + 1
+    bandEdges = np.unique(np.linspace(0, freqHeight, bands + 1).astype(int))
+
+    # Active cells
+    cellDb = CellEnergies(audio, bandEdges, cellFrames)
+    cellSeconds = cellFrames * audio.hopLength / audio.sampleRate
+    noiseFloor = NoiseFloor(cellDb, int(noiseWindow / cellSeconds))
+    activeCells = cellDb > noiseFloor + thresholdDb
+
+    # Group the active cells touching each other, diagonals included
+    regions, regionCount = scipy.ndimage.label(
+        activeCells, structure=np.ones((3, 3), dtype=bool))
+    regionSizes = np.bincount(regions.ravel(), minlength=regionCount + 1)
+
+    binFreq = audio.sampleRate / audio.nFft
+    labels = []
+    for i, (bandSlice, cellSlice) in enumerate(scipy.ndimage.find_objects(regions)):
+        if regionSizes[i + 1] < minCells:
+            continue
+        labels.append(DataSetLabel(
+            groupName,
+            cellSlice.start * cellSeconds,
+            min(cellSlice.stop * cellSeconds, audio.audioLength),
+            bandEdges[bandSlice.start] * binFreq,
+            min(bandEdges[bandSlice.stop], freqHeight - 1) * binFreq,
+        ))
+
+    labels.sort(key=lambda label: label.startTime)
+    return labels
@@ -0,0 +1,135 @@
+import os
+import re
+from concurrent.futures import FIRST_COMPLETED, Executor, wait
+import numpy as np
+import scipy.signal
+import soundfile as sf
+
+from Utils.AudioProcess import DesignBandPassFilter
+from Utils.AudioReader import OpenAudioReader
+from Utils.TrainingSetExporter import SelectLabels
+from Config import CLIP_READ_BLOCK_SECONDS, CLIP_WRITE_WORKERS
+
+
+def ClipFileName(groupName: str, sourceFile: str, labelId: int, startTime: float) -> str:
+    """
+    Get the path of the clip of a label relative to the export directory,
+    in a directory per group.
+    """
+    groupDir = re.sub(r"[^\w\-. ]", "_", groupName).strip() or "_"
+    stem = os.path.splitext(os.path.basename(sourceFile))[0]
+    return os.path.join(groupDir, f"{stem}_{labelId:06d}_{startTime:.3f}s.wav")
+
+
+def MergeSpans(
+    startFrames: np.ndarray,
+    endFrames: np.ndarray,
+    maxBlockFrames: int,
+) -> list[tuple[int, int, list[int]]]:
+    """
+    Merge spans sorted by start into blocks read at once: overlapping or
+    touching spans share a block as long as it stays within maxBlockFrames.
+    Returns the first and last (exclusive) frame of every block with the
+    indices of its spans.
+    """
+    blocks = []
+    for i in range(len(startFrames)):
+        if len(blocks) > 0:
+            blockStart, blockEnd, members = blocks[-1]
+            if startFrames[i] <= blockEnd and max(endFrames[i], blockEnd) - blockStart <= maxBlockFrames:
+                members.append(i)
+                blocks[-1] = (blockStart, max(endFrames[i], blockEnd), members)
+                continue
+        blocks.append((int(startFrames[i]), int(endFrames[i]), [i]))
+    return blocks
+
+
+def WriteClip(
+    clipPath: str,
+    clip: np.ndarray,
+    sampleRate: int,
+    freqSpan: tuple[float, float] = None,
+) -> str:
+    """
+    Write a clip as a float WAV file, keeping only freqSpan in Hz with a
+    zero-phase band-pass filter if it is given. Returns the path.
+    """
+    if freqSpan is not None:
+        sos = DesignBandPassFilter(freqSpan[0], freqSpan[1], sampleRate)
+        if sos is not None and len(clip) >= 2:
+            # Shorten the edge padding of sosfiltfilt for very short clips
+            padLength = min(3 * (2 * len(sos) + 1), len(clip) - 1)
+            clip = scipy.signal.sosfiltfilt(sos, clip, axis=0, padlen=padLength)
+
+    os.makedirs(os.path.dirname(clipPath) or ".", exist_ok=True)
+    sf.write(clipPath, np.asarray(clip, dtype=np.float32), sampleRate, subtype="FLOAT")
+    return clipPath
+
+
+def ExportFileClips(
+    sourceFile: str,
+    labels: dict[str, np.ndarray],
+    groupNames: list[str],
+    outputDir: str,
+    executor: Executor,
+    padding: float = 0,
+    bandPass: bool = False,
+    maxPending: int = CLIP_WRITE_WORKERS * 4,
+) -> tuple[int, int]:
+    """
+    Cut the clips of the labels of a source file at its own sample rate
+    and channels, padded by padding seconds, and write them on executor.
+    The file is read once, front to back: the spans of close labels are
+    read together and at most maxPending clips wait for a writer.
+    Returns the number of clips written and failed.
+    """
+    reader = OpenAudioReader(sourceFile)
+    try:
+        sampleRate = reader.sampleRate
+        # Read the file in time order
+        labels = SelectLabels(labels, np.lexsort((labels["labelId"], labels["startTime"])))
+        startFrames = np.clip(
+            np.floor((labels["startTime"] - padding) * sampleRate), 0, reader.frames).astype(np.int64)
+        endFrames = np.clip(
+            np.ceil((labels["endTime"] + padding) * sampleRate), startFrames, reader.frames).astype(np.int64)
+
+        pending = set()
+        writtenCount = 0
+        failedCount = 0
+
+        def Collect(futures) -> None:
+            nonlocal writtenCount, failedCount
+            for future in futures:
+                try:
+                    future.result()
+                    writtenCount += 1
+                except Exception as e:
+                    print(f"Failed to write a clip of {sourceFile}: {e}")
+                    failedCount += 1
+
+        for blockStart, blockEnd, rows in MergeSpans(
+                startFrames, endFrames, int(CLIP_READ_BLOCK_SECONDS * sampleRate)):
+            block = reader.Read(blockStart, blockEnd - blockStart)
+            for row in rows:
+                # Keep the memory of the clips waiting for a writer bounded
+                if len(pending) >= maxPending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    Collect(done)
+
+                clipPath = os.path.join(outputDir, ClipFileName(
+                    groupNames[labels["groupId"][row]], sourceFile,
+                    labels["labelId"][row], labels["startTime"][row]))
+                freqSpan = (labels["startFreq"][row], labels["endFreq"][row]) if bandPass else None
+                pending.add(executor.submit(
+                    WriteClip,
+                    clipPath,
+                    block[startFrames[row] - blockStart:endFrames[row] - blockStart],
+                    sampleRate,
+                    freqSpan
+                ))
+
+        Collect(wait(pending).done)
+    finally:
+        reader.Close()
+
+    return writtenCount, failedCount
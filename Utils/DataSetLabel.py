@@ -1,4 +1,5 @@
 from __future__ import annotations
+import json
 
 class DataSetLabel:
     """
@@ -12,6 +13,7 @@ class DataSetLabel:
         endTime: float,
         startFreq: float,
         endFreq: float,
+        sourceFile: str = None,
     ) -> None:
         self.groupName = groupName
         
@@ -19,6 +21,8 @@ class DataSetLabel:
         self.endTime: float = endTime
         self.startFreq: float = startFreq
         self.endFreq: float = endFreq
+        # Audio file the label was made on, None if unknown
+        self.sourceFile: str = sourceFile
     
     def OffsetCopy(self, offset: float) -> DataSetLabel:
         return DataSetLabel(
@@ -27,6 +31,7 @@ class DataSetLabel:
             self.endTime + offset,
             self.startFreq,
             self.endFreq,
+            self.sourceFile,
         )
     
     def __str__(self) -> str:
@@ -44,4 +49,54 @@ class DataSetLabel:
             "endTime": self.endTime,
             "startFreq": self.startFreq,
             "endFreq": self.endFreq,
-        }
\ No newline at end of file
+            "sourceFile": self.sourceFile,
+        }
+
+
+def WriteLabelFile(fileName: str, labelGroups: dict[str, list[DataSetLabel]]) -> None:
+    """
+    Write labels by group name to a json label file.
+    """
+    with open(fileName, "w") as file:
+        json.dump([
+            {
+                "groupName": groupName,
+                "dataSetLabels": [label.ToDict() for label in labels]
+            }
+            for groupName, labels in labelGroups.items()
+        ], file, indent=4)
+
+
+def ReadLabelFile(fileName: str) -> dict[str, list[DataSetLabel]]:
+    """
+    Read a json label file written by WriteLabelFile into labels by group
+    name.
+    """
+    with open(fileName, "r") as file:
+        groups = json.load(file)
+    return {
+        group["groupName"]: [
+            DataSetLabel(
+                labelDict["groupName"],
+                labelDict["startTime"],
+                labelDict["endTime"],
+                labelDict["startFreq"],
+                labelDict["endFreq"],
+                # Labels saved before the source file was recorded
+                labelDict.get("sourceFile"),
+            )
+            for labelDict in group["dataSetLabels"]
+        ]
+        for group in groups
+    }
+
+
+def ReadLabelFiles(fileNames: list[str]) -> dict[str, list[DataSetLabel]]:
+    """
+    Read label files into one set of labels by group name, in file order.
+    """
+    labelGroups = {}
+    for fileName in fileNames:
+        for groupName, labels in ReadLabelFile(fileName).items():
+            labelGroups.setdefault(groupName, []).extend(labels)
+    return labelGroups
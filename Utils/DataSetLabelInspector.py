@@ -1,12 +1,12 @@
-import json
 import os
 from tkinter import *
 import tkinter as tk
 from tkinter import ttk, messagebox
 from tkinter import filedialog
 
-from Utils.DataSetLabel import DataSetLabel
+from Utils.DataSetLabel import DataSetLabel, WriteLabelFile
 from Utils.AudioPlot import AudioSpectrumPlot
+from Utils.CandidateDetector import PROPOSALS_GROUP_NAME
 
 class DataSetLabelGroup:
     """
@@ -81,6 +81,20 @@ class DataSetLabelsInspector(tk.Frame):
         removeSelectedLabelButton = ttk.Button(master, text="Remove Selected Label", command=self.RemoveSelectedLabel)
         removeSelectedLabelButton.pack(side=tk.BOTTOM, fill=tk.X)
         
+        # Review of the proposed labels
+        proposalFrame = tk.Frame(master)
+        proposalFrame.pack(side=tk.BOTTOM, fill=tk.X)
+        proposalLabel = ttk.Label(proposalFrame, text="Accept proposals into")
+        proposalLabel.pack(side=tk.TOP, fill=tk.X)
+        self.acceptGroupName = tk.StringVar()
+        self.acceptGroupName.set("Accepted")
+        acceptGroupEntry = ttk.Entry(proposalFrame, textvariable=self.acceptGroupName)
+        acceptGroupEntry.pack(side=tk.TOP, fill=tk.X)
+        acceptProposalsButton = ttk.Button(proposalFrame, text="Accept Proposals", command=self.AcceptProposals)
+        acceptProposalsButton.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        rejectProposalsButton = ttk.Button(proposalFrame, text="Reject Proposals", command=self.RejectProposals)
+        rejectProposalsButton.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        
         # Add a scrollbar to the canvas
         labelListScrollbar = ttk.Scrollbar(master, orient=tk.VERTICAL)
         labelListScrollbar.pack(side=tk.RIGHT, fill=tk.Y)
@@ -241,6 +255,107 @@ class DataSetLabelsInspector(tk.Frame):
         
         print("Label removed.")
     
+    def GetGroup(self, groupName: str) -> DataSetLabelGroup:
+        """
+        Get a group by name, None if there is no such group.
+        """
+        for group in self.dataSetLabelGroups:
+            if group.groupName == groupName:
+                return group
+        return None
+    
+    def SetProposals(self, labels: list[DataSetLabel]) -> None:
+        """
+        Replace the proposed labels and show them.
+        """
+        proposalGroup = self.GetGroup(PROPOSALS_GROUP_NAME)
+        if proposalGroup is None:
+            proposalGroup = DataSetLabelGroup(PROPOSALS_GROUP_NAME)
+            self.dataSetLabelGroups.append(proposalGroup)
+        proposalGroup.dataSetLabels = labels
+        
+        self.UpdateGroupOptions()
+        self.OnSelectGroup(PROPOSALS_GROUP_NAME)
+    
+    def GetReviewedProposals(self, action: str) -> list[DataSetLabel]:
+        """
+        Get the proposals to accept or reject, the selected proposals or
+        else all of them once confirmed.
+        """
+        proposalGroup = self.GetGroup(PROPOSALS_GROUP_NAME)
+        if proposalGroup is None or len(proposalGroup.dataSetLabels) == 0:
+            messagebox.showerror("Error", "No proposals.")
+            return []
+        
+        if self.selectedGroup is proposalGroup and len(self.selectedLabels) > 0:
+            return list(self.selectedLabels)
+        
+        if not messagebox.askyesno(f"{action} Proposals", f"No proposal selected. {action} all {len(proposalGroup.dataSetLabels)} proposals?"):
+            return []
+        return list(proposalGroup.dataSetLabels)
+    
+    def AcceptProposals(self) -> None:
+        """
+        Move the reviewed proposals into the accept group.
+        """
+        # Check if the accept group name is valid
+        acceptGroupName = self.acceptGroupName.get()
+        if acceptGroupName == "" or acceptGroupName == PROPOSALS_GROUP_NAME:
+            messagebox.showerror("Error", "Invalid group to accept proposals into.")
+            return
+        
+        proposals = self.GetReviewedProposals("Accept")
+        if len(proposals) == 0:
+            return
+        
+        # Create the accept group if needed
+        acceptGroup = self.GetGroup(acceptGroupName)
+        if acceptGroup is None:
+            acceptGroup = DataSetLabelGroup(acceptGroupName)
+            self.dataSetLabelGroups.append(acceptGroup)
+            self.UpdateGroupOptions()
+        
+        for proposal in proposals:
+            acceptGroup.AddDataSetLabel(DataSetLabel(
+                acceptGroupName,
+                proposal.startTime,
+                proposal.endTime,
+                proposal.startFreq,
+                proposal.endFreq,
+                proposal.sourceFile,
+            ))
+        self.RemoveProposals(proposals)
+        
+        print(f"{len(proposals)} proposals accepted into {acceptGroupName}.")
+    
+    def RejectProposals(self) -> None:
+        """
+        Remove the reviewed proposals.
+        """
+        proposals = self.GetReviewedProposals("Reject")
+        if len(proposals) == 0:
+            return
+        
+        self.RemoveProposals(proposals)
+        
+        print(f"{len(proposals)} proposals rejected.")
+    
+    def RemoveProposals(self, proposals: list[DataSetLabel]) -> None:
+        """
+        Remove proposals from the proposal group.
+        """
+        proposalGroup = self.GetGroup(PROPOSALS_GROUP_NAME)
+        removedIds = set(id(proposal) for proposal in proposals)
+        proposalGroup.dataSetLabels = [
+            label for label in proposalGroup.dataSetLabels
+            if id(label) not in removedIds
+        ]
+        
+        # Update the label list
+        self.UpdateGroupLabels()
+        self.selectedLabels = []
+        self.UpdateLabelHighlight()
+    
     def UpdateLabelHighlight(self) -> None:
         """
         Update the label highlight.
@@ -263,16 +378,11 @@ class DataSetLabelsInspector(tk.Frame):
         if fileName == "":
             return
         
-        labelGroups = []
-        
-        for group in self.dataSetLabelGroups:
-            labelGroups.append({
-                "groupName": group.groupName,
-                "dataSetLabels": [label.ToDict() for label in group.dataSetLabels]
-            })
-        
-        # Save the labels to the file
-        with open(fileName, "w") as file:
-            json.dump(labelGroups, file, indent=4)
+        # Proposals are not labels until they are accepted
+        WriteLabelFile(fileName, {
+            group.groupName: group.dataSetLabels
+            for group in self.dataSetLabelGroups
+            if group.groupName != PROPOSALS_GROUP_NAME
+        })
         
         print("Labels saved.")
\ No newline at end of file
@@ -1,13 +1,26 @@
 from tkinter import *
 import tkinter as tk
 from tkinter import ttk, messagebox
+import librosa
 from matplotlib import pyplot as plt
 
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from Config import FIG_DPI
 
-from Utils.AudioProcess import Audio, AudioPlayer
+from Utils.AudioPlayer import AudioPlayer
+from Utils.AudioProcess import Audio
 from Utils.DataSetLabelInspector import DataSetLabel, DataSetLabelsInspector
+from Utils.JobExecutor import JobExecutor, JobToken
+
+# Reconstruction modes for the detail audio
+PHASE_RECONSTRUCTION_MODE = "Exact Phase (iSTFT)"
+GRIFFIN_LIM_RECONSTRUCTION_MODE = "Griffin-Lim"
+BAND_PASS_RECONSTRUCTION_MODE = "Band-Pass (Time Domain)"
+RECONSTRUCTION_MODES = [
+    PHASE_RECONSTRUCTION_MODE,
+    GRIFFIN_LIM_RECONSTRUCTION_MODE,
+    BAND_PASS_RECONSTRUCTION_MODE,
+]
 
 class LabeledEntry:
     """
@@ -34,10 +47,11 @@ class FFTDetailInspector(tk.Frame):
     """
     Inspector to browse FFT Detials.
     """
-    def __init__(self, onAddToCurrLabelGroup: callable, master = None) -> None:
+    def __init__(self, onAddToCurrLabelGroup: callable, onFindSimilar: callable = None, master = None) -> None:
         super().__init__(master)
         
         self.onAddToCurrLabelGroup = onAddToCurrLabelGroup
+        self.onFindSimilar = onFindSimilar
         
         # FFT detail view
         self.fftDetailViewFig, self.fftDetailViewAx = plt.subplots()
@@ -47,6 +61,8 @@ class FFTDetailInspector(tk.Frame):
         # FFT detail audio
         self.fftDetailAudio: Audio = Audio()
         self.fftDetailAudioPlayer: AudioPlayer = AudioPlayer(self.fftDetailAudio, 1)
+        # Background executor for the detail reconstruction
+        self.reconstructionExecutor: JobExecutor = JobExecutor()
         
         # Pack the fft detail canvas
         self.fftDetailCanvas = FigureCanvasTkAgg(self.fftDetailViewFig, master)
@@ -109,7 +125,50 @@ class FFTDetailInspector(tk.Frame):
             "End Freq",
             initVal = "0.0"
         )
+
+        # Statistics of the selected region
+        self.energyLabeledEntry = LabeledEntry(
+            basicInfoFrame,
+            4,
+            "Energy (dB)",
+            initVal = "-"
+        )
+        self.peakLabeledEntry = LabeledEntry(
+            basicInfoFrame,
+            5,
+            "Peak (dB)",
+            initVal = "-"
+        )
+        self.meanDbLabeledEntry = LabeledEntry(
+            basicInfoFrame,
+            6,
+            "Mean (dB)",
+            initVal = "-"
+        )
+        self.centroidLabeledEntry = LabeledEntry(
+            basicInfoFrame,
+            7,
+            "Centroid (Hz)",
+            initVal = "-"
+        )
+        self.snrLabeledEntry = LabeledEntry(
+            basicInfoFrame,
+            8,
+            "SNR (dB)",
+            initVal = "-"
+        )
         
+        # Reconstruction mode of the detail audio
+        self.reconstructionMode = tk.StringVar()
+        self.reconstructionMode.set(RECONSTRUCTION_MODES[0])
+        reconstructionModeOptions = ttk.OptionMenu(
+            rightFrameScrollable,
+            self.reconstructionMode,
+            RECONSTRUCTION_MODES[0],
+            *RECONSTRUCTION_MODES
+        )
+        reconstructionModeOptions.pack(side=tk.TOP, fill=X)
+
         playFFTDetailButton = ttk.Button(
             rightFrameScrollable, text="Play Detail", command=self.PlayFFTDetail)
         playFFTDetailButton.pack(side=tk.TOP, fill=X)
@@ -118,6 +177,11 @@ class FFTDetailInspector(tk.Frame):
         addToCurrentLabelGroupButton = ttk.Button(
             rightFrameScrollable, text="Add to Current Label Group", command=self.onAddToCurrLabelGroup)
         addToCurrentLabelGroupButton.pack(side=tk.TOP, fill=X)
+        
+        # Find the repeats of the detail in the whole file
+        findSimilarButton = ttk.Button(
+            rightFrameScrollable, text="Find Similar", command=self.onFindSimilar)
+        findSimilarButton.pack(side=tk.TOP, fill=X)
     
     def SetFFTDetail(self, startTime, endTime, startFreq, endFreq):
         """
@@ -132,6 +196,101 @@ class FFTDetailInspector(tk.Frame):
         self.endFreq = endFreq
         self.endFreqLabeledEntry.SetText(str(endFreq))
     
+    def SetRegionStatistics(self, stats: dict) -> None:
+        """
+        Set the statistics of the selected region.
+        """
+        if stats is None:
+            stats = {}
+
+        def Format(value):
+            return "-" if value is None else "{:.2f}".format(value)
+
+        self.energyLabeledEntry.SetText(Format(stats.get("energy")))
+        self.peakLabeledEntry.SetText(Format(stats.get("peak")))
+        self.meanDbLabeledEntry.SetText(Format(stats.get("meanDb")))
+        self.centroidLabeledEntry.SetText(Format(stats.get("centroid")))
+        self.snrLabeledEntry.SetText(Format(stats.get("snr")))
+
+    def ReconstructDetail(
+        self,
+        audio: Audio,
+        timeSpan: tuple[int, int],
+        freqSpan: tuple[int, int]
+    ) -> None:
+        """
+        Reconstruct the detail audio of a spectrum region of audio in the
+        background and play it. Cancels any reconstruction still running.
+        """
+        # Every selection plays from its start
+        self.fftDetailAudioPlayer.Stop()
+        self.reconstructionExecutor.Submit(
+            self.ReconstructDetailJob,
+            audio,
+            timeSpan,
+            freqSpan,
+            self.reconstructionMode.get()
+        )
+
+    def ReconstructDetailJob(
+        self,
+        token: JobToken,
+        audio: Audio,
+        timeSpan: tuple[int, int],
+        freqSpan: tuple[int, int],
+        mode: str
+    ) -> None:
+        """
+        Job target to reconstruct and play the detail audio.
+        """
+        if mode == GRIFFIN_LIM_RECONSTRUCTION_MODE:
+            def OnPreview(audioArray, iteration):
+                # Start playing the first coarse estimate
+                if iteration == 1 and not token.IsCancelled():
+                    self.PlayFFTDetail()
+
+            audioArray = self.fftDetailAudio.ReconstructAudio(
+                audio.sampleRate,
+                audio.fftSpectrum[freqSpan[0]:freqSpan[1],
+                                  timeSpan[0]:timeSpan[1]],
+                audio.fftSpectrum.shape[0],
+                freqSpan,
+                onPreview=OnPreview,
+                isCancelled=token.IsCancelled
+            )
+            if audioArray is None or token.IsCancelled():
+                return
+
+            # Replace the preview with the refined audio, from its start
+            self.fftDetailAudioPlayer.Restart()
+        elif mode == BAND_PASS_RECONSTRUCTION_MODE:
+            # Convert the spans to seconds and Hz
+            frameLength = audio.audioLength / audio.fftSpectrum.shape[1]
+            freqArr = librosa.fft_frequencies(
+                sr=audio.sampleRate, n_fft=audio.nFft)
+            self.fftDetailAudio.BandPassAudio(
+                audio.sampleRate,
+                audio.audioArray,
+                (timeSpan[0] * frameLength, timeSpan[1] * frameLength),
+                (freqArr[freqSpan[0]], freqArr[min(freqSpan[1], len(freqArr) - 1)])
+            )
+            if token.IsCancelled():
+                return
+
+            self.PlayFFTDetail()
+        else:
+            self.fftDetailAudio.ReconstructAudioPhase(
+                audio.sampleRate,
+                audio.GetComplexSpectrum(),
+                audio.nFft,
+                timeSpan,
+                freqSpan
+            )
+            if token.IsCancelled():
+                return
+
+            self.PlayFFTDetail()
+
     def PlayFFTDetail(self):
         """
         Play the fft detail
@@ -0,0 +1,128 @@
+import numpy as np
+
+from Utils.AudioProcess import Audio
+from Utils.ClipExporter import MergeSpans
+from Utils.SpectrumStats import SummedAreaTable
+from Utils.TrainingSetExporter import SelectLabels
+from Config import ANALYSIS_SAMPLE_RATE, FEATURE_BLOCK_SECONDS
+
+# Columns of the feature matrix
+FEATURE_NAMES = [
+    # Seconds and Hz of the label box
+    "duration",
+    "bandwidth",
+    # Hz of the bin with the most power over the label
+    "peakFreq",
+    # Power of the label in dB
+    "energyDb",
+    # Magnitude weighted mean frequency in Hz
+    "centroid",
+    # Geometric over arithmetic mean of the power, 1 for white noise
+    "flatness",
+]
+
+
+def LabelIndices(
+    labels: dict[str, np.ndarray],
+    frameCount: int,
+    sampleRate: int,
+    nFft: int,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Convert the boxes of the labels to the centered STFT frames and the
+    bins they cover, all of at least one element within the spectrum.
+    Returns arrays of shape (labels, 2) of the first and last (exclusive)
+    frame and bin of every label.
+    """
+    frameTimes = np.arange(frameCount) * (nFft // 4) / sampleRate
+    binFreqs = np.arange(nFft // 2 + 1) * sampleRate / nFft
+
+    firstFrames = np.minimum(np.searchsorted(frameTimes, labels["startTime"], "left"), frameCount - 1)
+    lastFrames = np.maximum(np.searchsorted(frameTimes, labels["endTime"], "right"), firstFrames + 1)
+    firstBins = np.minimum(np.searchsorted(binFreqs, labels["startFreq"], "left"), len(binFreqs) - 1)
+    lastBins = np.maximum(np.searchsorted(binFreqs, labels["endFreq"], "right"), firstBins + 1)
+
+    return (
+        np.stack((firstFrames, lastFrames), axis=1),
+        np.stack((firstBins, lastBins), axis=1),
+    )
+
+
+def BlockFeatures(
+    magnitude: np.ndarray,
+    binFreqs: np.ndarray,
+    frameSpans: np.ndarray,
+    binSpans: np.ndarray,
+) -> np.ndarray:
+    """
+    Compute the spectral features of labels within a block of magnitude
+    frames, from summed-area tables of the block looked up for all labels
+    at once. frameSpans are relative to the block.
+    Returns an array of shape (labels, 4) of the peak frequency, energy,
+    centroid and flatness.
+    """
+    power = np.square(magnitude, dtype=np.float64)
+    powerTable = SummedAreaTable(power)
+    magnitudeTable = SummedAreaTable(magnitude)
+    freqMagnitudeTable = SummedAreaTable(magnitude * binFreqs[:, np.newaxis])
+    logPowerTable = SummedAreaTable(np.log(power + 1e-12))
+
+    binSpan = (binSpans[:, 0], binSpans[:, 1])
+    frameSpan = (frameSpans[:, 0], frameSpans[:, 1])
+    area = (binSpans[:, 1] - binSpans[:, 0]) * (frameSpans[:, 1] - frameSpans[:, 0])
+    energy = powerTable.Sum(binSpan, frameSpan)
+    magnitudeSum = magnitudeTable.Sum(binSpan, frameSpan)
+    freqMagnitude = freqMagnitudeTable.Sum(binSpan, frameSpan)
+    logPower = logPowerTable.Sum(binSpan, frameSpan)
+
+    # Power of every bin over the frames of every label, from the columns
+    # of the table at the first and last frame, outside bins excluded
+    binPower = np.diff(
+        powerTable.table[:, frameSpans[:, 1]] - powerTable.table[:, frameSpans[:, 0]], axis=0)
+    bins = np.arange(len(binFreqs))[:, np.newaxis]
+    binPower[(bins < binSpans[:, 0]) | (bins >= binSpans[:, 1])] = -np.inf
+    peakFreq = binFreqs[np.argmax(binPower, axis=0)]
+
+    meanPower = energy / area
+    return np.stack((
+        peakFreq,
+        10 * np.log10(energy + 1e-12),
+        np.divide(freqMagnitude, magnitudeSum, out=np.zeros_like(magnitudeSum), where=magnitudeSum > 0),
+        np.divide(np.exp(logPower / area), meanPower, out=np.zeros_like(meanPower), where=meanPower > 0),
+    ), axis=1)
+
+
+def ExtractFileFeatures(
+    sourceFile: str,
+    labels: dict[str, np.ndarray],
+    nFft: int = 512,
+    sampleRate: int = ANALYSIS_SAMPLE_RATE,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Compute the features of the labels of a source file. The spectrum is
+    taken from the cache of the file if it was preprocessed, otherwise
+    computed for the spans of the labels only. Close labels share a block
+    of spectrum and its summed-area tables.
+    Returns the label ids and the float32 features in FEATURE_NAMES order.
+    """
+    audio = Audio(nFft=nFft)
+    audio.LoadAudio(sourceFile, downmix=True, targetSampleRate=sampleRate, lazy=True)
+
+    # Sweep the spectrum in time order
+    labels = SelectLabels(labels, np.lexsort((labels["labelId"], labels["startTime"])))
+    frameSpans, binSpans = LabelIndices(
+        labels, audio.GetSpectrumFrameCount(), audio.sampleRate, nFft)
+    binFreqs = np.arange(nFft // 2 + 1) * audio.sampleRate / nFft
+
+    features = np.zeros((len(frameSpans), len(FEATURE_NAMES)), dtype=np.float32)
+    features[:, 0] = labels["endTime"] - labels["startTime"]
+    features[:, 1] = labels["endFreq"] - labels["startFreq"]
+
+    maxBlockFrames = int(FEATURE_BLOCK_SECONDS * audio.sampleRate / audio.hopLength)
+    for firstFrame, lastFrame, rows in MergeSpans(frameSpans[:, 0], frameSpans[:, 1], maxBlockFrames):
+        magnitude = np.asarray(audio.GetMagnitudeFrames(firstFrame, lastFrame), dtype=np.float32)
+        features[rows, 2:] = BlockFeatures(
+            magnitude, binFreqs, frameSpans[rows] - firstFrame, binSpans[rows])
+
+    audio.CloseAudio()
+    return labels["labelId"], features
@@ -0,0 +1,276 @@
+import os
+import numpy as np
+
+from Utils import AudioCache
+from Utils.AudioProcess import Audio
+from Utils.CandidateDetector import CellEnergies, NoiseFloor
+from Config import DETECTOR_NOISE_WINDOW, FINGERPRINT_BANDS, FINGERPRINT_CELL_SECONDS, FINGERPRINT_HOP_CELLS
+from Config import FINGERPRINT_INDEX_DIR, FINGERPRINT_MAX_FREQ, FINGERPRINT_MAX_HITS, FINGERPRINT_QUERY_BLOCK, FINGERPRINT_THRESHOLD_DB
+from Config import FINGERPRINT_WINDOW_CELLS
+
+# Subdirectories of the fingerprints of each file and of the whole corpus
+FILES_DIR_NAME = "files"
+CORPUS_DIR_NAME = "corpus"
+# Settings the fingerprints depend on, part of their cache keys
+FINGERPRINT_SETTINGS = [
+    FINGERPRINT_BANDS,
+    FINGERPRINT_MAX_FREQ,
+    FINGERPRINT_CELL_SECONDS,
+    FINGERPRINT_WINDOW_CELLS,
+    FINGERPRINT_HOP_CELLS,
+    FINGERPRINT_THRESHOLD_DB,
+    DETECTOR_NOISE_WINDOW,
+]
+# Decibels of a step of the fingerprints, stored as bytes
+FINGERPRINT_DB_STEP = 0.5
+
+
+def BandFrequencies(bands: int = FINGERPRINT_BANDS, maxFreq: float = FINGERPRINT_MAX_FREQ) -> np.ndarray:
+    """
+    Edges in Hz of the fingerprint bands.
+    """
+    return np.linspace(0, maxFreq, bands + 1)
+
+
+def FingerprintCells(audio: Audio) -> tuple[np.ndarray, float]:
+    """
+    Energy in dB above the noise floor plus FINGERPRINT_THRESHOLD_DB of
+    every fingerprint band and cell, so noise alone is zero.
+    Cells and bands are in seconds and Hz so files of any sample rate can
+    be compared. Bands above the Nyquist frequency are zero.
+    Returns an array of shape (bands, cells) and the seconds of a cell.
+    """
+    freqHeight = audio.nFft // 2 + 1
+    binFreq = audio.sampleRate / audio.nFft
+    cellFrames = max(int(round(
+        FINGERPRINT_CELL_SECONDS * audio.sampleRate / audio.hopLength)), 1)
+
+    # Bin edges of the bands below the Nyquist frequency
+    bandEdges = np.minimum(
+        np.ceil(BandFrequencies() / binFreq).astype(int), freqHeight)
+    validBands = int(np.sum(bandEdges[1:] > bandEdges[:-1]))
+    cellDb = CellEnergies(audio, bandEdges[:validBands + 1], cellFrames)
+
+    cellSeconds = cellFrames * audio.hopLength / audio.sampleRate
+    noiseFloor = NoiseFloor(cellDb, int(DETECTOR_NOISE_WINDOW / cellSeconds))
+    cells = np.zeros((FINGERPRINT_BANDS, cellDb.shape[1]), dtype=np.float32)
+    cells[:validBands] = np.maximum(cellDb - noiseFloor - FINGERPRINT_THRESHOLD_DB, 0)
+    return cells, cellSeconds
+
+
+def WindowVectors(cells: np.ndarray, hopCells: int = FINGERPRINT_HOP_CELLS) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Fingerprints of the windows of FINGERPRINT_WINDOW_CELLS cells, every
+    hopCells cells, in steps of FINGERPRINT_DB_STEP. Returns the vectors of
+    the windows, band by band so the cells of a band range are contiguous,
+    and the squared norm of every band of them.
+    """
+    bandCount, cellCount = cells.shape
+    if cellCount < FINGERPRINT_WINDOW_CELLS:
+        return (
+            np.zeros((0, FINGERPRINT_WINDOW_CELLS * bandCount), dtype=np.uint8),
+            np.zeros((0, bandCount), dtype=np.float32)
+        )
+
+    # Bytes are four times smaller than float32 and faster to convert than
+    # float16 when queried
+    steps = np.clip(np.round(cells / FINGERPRINT_DB_STEP), 0, 255).astype(np.uint8)
+
+    # Windows of shape (windows, bands, cells)
+    windows = np.lib.stride_tricks.sliding_window_view(
+        steps, FINGERPRINT_WINDOW_CELLS, axis=1)[:, ::hopCells].transpose(1, 0, 2)
+    vectors = windows.reshape(len(windows), -1)
+    bandSquares = np.sum(np.square(windows, dtype=np.float32), axis=2)
+    return vectors, bandSquares
+
+
+def IndexFile(audioFilePath: str, indexDir: str = FINGERPRINT_INDEX_DIR) -> dict:
+    """
+    Fingerprint an audio file into the index directory, unless it already
+    is. Returns the metadata of its entry.
+    """
+    entryPath = os.path.join(
+        indexDir, FILES_DIR_NAME,
+        AudioCache.GetCacheKey(audioFilePath, "fingerprint", *FINGERPRINT_SETTINGS))
+    if AudioCache.IsCached(entryPath):
+        return AudioCache.ReadMetadata(entryPath)
+
+    audio = Audio()
+    audio.LoadAudio(audioFilePath, downmix=True, lazy=True)
+    cells, cellSeconds = FingerprintCells(audio)
+    audio.CloseAudio()
+    vectors, bandSquares = WindowVectors(cells)
+
+    return AudioCache.WriteCache(
+        entryPath,
+        {"cells": cells, "vectors": vectors, "bandSquares": bandSquares},
+        {
+            "audioFilePath": os.path.abspath(audioFilePath),
+            "entryPath": os.path.abspath(entryPath),
+            "audioLength": audio.audioLength,
+            "cellSeconds": cellSeconds,
+            "windows": len(vectors),
+        }
+    )
+
+
+def WriteCorpus(entries: list[dict], indexDir: str = FINGERPRINT_INDEX_DIR) -> dict:
+    """
+    Gather the fingerprints of the file entries into the corpus arrays
+    queries run on. Returns the metadata of the corpus.
+    """
+    windowCount = sum(entry["windows"] for entry in entries)
+    vectorSize = FINGERPRINT_WINDOW_CELLS * FINGERPRINT_BANDS
+    vectors = np.empty((windowCount, vectorSize), dtype=np.uint8)
+    bandSquares = np.empty((windowCount, FINGERPRINT_BANDS), dtype=np.float32)
+    fileIds = np.empty(windowCount, dtype=np.int32)
+    windowIds = np.empty(windowCount, dtype=np.int32)
+
+    position = 0
+    for fileId, entry in enumerate(entries):
+        _, arrays = AudioCache.ReadCache(entry["entryPath"])
+        count = entry["windows"]
+        if count > 0:
+            vectors[position:position + count] = arrays["vectors"]
+            bandSquares[position:position + count] = arrays["bandSquares"]
+        fileIds[position:position + count] = fileId
+        windowIds[position:position + count] = np.arange(count)
+        position += count
+
+    return AudioCache.WriteCache(
+        os.path.join(indexDir, CORPUS_DIR_NAME),
+        {"vectors": vectors, "bandSquares": bandSquares, "fileIds": fileIds, "windowIds": windowIds},
+        {"entries": entries, "settings": FINGERPRINT_SETTINGS}
+    )
+
+
+class FingerprintIndex:
+    """
+    Fingerprints of a corpus, searched by masked cosine similarity.
+    """
+
+    def __init__(self, indexDir: str = FINGERPRINT_INDEX_DIR) -> None:
+        self.indexDir: str = indexDir
+        metadata, arrays = AudioCache.ReadCache(
+            os.path.join(indexDir, CORPUS_DIR_NAME))
+        if metadata["settings"] != FINGERPRINT_SETTINGS:
+            raise ValueError("Fingerprint index was built with other settings, rebuild it.")
+
+        self.entries: list[dict] = metadata["entries"]
+        # Memory mapped arrays, one row per window
+        self.vectors: np.ndarray = arrays["vectors"]
+        self.bandSquares: np.ndarray = arrays["bandSquares"]
+        self.fileIds: np.ndarray = arrays["fileIds"]
+        self.windowIds: np.ndarray = arrays["windowIds"]
+        # Files by path
+        self.fileIdsByPath: dict = {
+            entry["audioFilePath"]: fileId for fileId, entry in enumerate(self.entries)
+        }
+
+    def QueryVector(
+        self,
+        audioFilePath: str,
+        startTime: float,
+        endTime: float,
+    ) -> tuple[np.ndarray, float]:
+        """
+        Fingerprint of the window centered on a time span of an audio file,
+        from its entry if the file is indexed. Returns the vector and the
+        length in seconds of a cell.
+        """
+        fileId = self.fileIdsByPath.get(os.path.abspath(audioFilePath))
+        if fileId is not None:
+            entry = self.entries[fileId]
+            _, arrays = AudioCache.ReadCache(entry["entryPath"])
+            cells = arrays["cells"]
+            cellSeconds = entry["cellSeconds"]
+        else:
+            audio = Audio()
+            audio.LoadAudio(audioFilePath, downmix=True, lazy=True)
+            cells, cellSeconds = FingerprintCells(audio)
+            audio.CloseAudio()
+
+        # Window of cells centered on the span, kept inside the file
+        centerCell = (startTime + endTime) / 2 / cellSeconds
+        startCell = int(round(centerCell - FINGERPRINT_WINDOW_CELLS / 2))
+        startCell = max(min(startCell, cells.shape[1] - FINGERPRINT_WINDOW_CELLS), 0)
+        vectors, _ = WindowVectors(
+            cells[:, startCell:startCell + FINGERPRINT_WINDOW_CELLS])
+        if len(vectors) == 0:
+            raise ValueError("Audio file is too short to be queried.")
+        return vectors[0].astype(np.float32), cellSeconds
+
+    def Query(
+        self,
+        vector: np.ndarray,
+        freqSpan: tuple[float, float] = None,
+        maxHits: int = FINGERPRINT_MAX_HITS,
+        exclude: tuple[str, float, float] = None,
+    ) -> list[dict]:
+        """
+        Rank the windows of the corpus by cosine similarity with a query
+        vector, over the bands overlapping freqSpan in Hz only. Windows with
+        no energy in these bands never match. Hits of the same file
+        overlapping a better hit are dropped, and so are the hits
+        overlapping exclude, a file path and time span.
+        Returns the hits with their file, time span and score.
+        """
+        # Bands the query is compared on, a range of columns of the vectors
+        bandEdges = BandFrequencies()
+        firstBand, lastBand = 0, FINGERPRINT_BANDS
+        if freqSpan is not None:
+            overlapping = np.flatnonzero(
+                (bandEdges[1:] > freqSpan[0]) & (bandEdges[:-1] < freqSpan[1]))
+            if len(overlapping) == 0:
+                return []
+            firstBand, lastBand = overlapping[0], overlapping[-1] + 1
+        columns = slice(firstBand * FINGERPRINT_WINDOW_CELLS, lastBand * FINGERPRINT_WINDOW_CELLS)
+        maskedQuery = np.asarray(vector[columns], dtype=np.float32)
+        queryNorm = np.sqrt(np.sum(np.square(maskedQuery)))
+        if queryNorm == 0:
+            return []
+
+        # Score the windows block by block on the columns of the bands only
+        scores = np.empty(len(self.vectors), dtype=np.float32)
+        for start in range(0, len(self.vectors), FINGERPRINT_QUERY_BLOCK):
+            end = min(start + FINGERPRINT_QUERY_BLOCK, len(self.vectors))
+            dot = self.vectors[start:end, columns].astype(np.float32) @ maskedQuery
+            norms = np.sqrt(np.sum(self.bandSquares[start:end, firstBand:lastBand], axis=1))
+            scores[start:end] = dot / (norms * queryNorm + 1e-12)
+
+        # Best windows, with room for the overlapping ones dropped
+        candidateCount = min(maxHits * FINGERPRINT_WINDOW_CELLS * 4, len(scores))
+        if candidateCount == 0:
+            return []
+        candidates = np.argpartition(scores, -candidateCount)[-candidateCount:]
+        candidates = candidates[np.argsort(scores[candidates])[::-1]]
+
+        hits = []
+        for candidate in candidates:
+            if scores[candidate] <= 0:
+                break
+            entry = self.entries[self.fileIds[candidate]]
+            startTime = self.windowIds[candidate] * FINGERPRINT_HOP_CELLS * entry["cellSeconds"]
+            endTime = startTime + FINGERPRINT_WINDOW_CELLS * entry["cellSeconds"]
+            hit = {
+                "audioFilePath": entry["audioFilePath"],
+                "startTime": float(startTime),
+                "endTime": float(endTime),
+                "score": float(scores[candidate]),
+            }
+            if exclude is not None and OverlapsHit(hit, *exclude):
+                continue
+            if any(OverlapsHit(hit, other["audioFilePath"], other["startTime"], other["endTime"]) for other in hits):
+                continue
+            hits.append(hit)
+            if len(hits) >= maxHits:
+                break
+        return hits
+
+
+def OverlapsHit(hit: dict, audioFilePath: str, startTime: float, endTime: float) -> bool:
+    """
+    Check if a hit overlaps a time span of an audio file.
+    """
+    return hit["audioFilePath"] == os.path.abspath(audioFilePath) and \
+        hit["startTime"] < endTime and hit["endTime"] > startTime
@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+import queue
+import threading
+
+
+class JobToken:
+    """
+    Token handed to a running job to check whether it has been superseded.
+    """
+
+    def __init__(self, executor: JobExecutor, generation: int) -> None:
+        self.executor: JobExecutor = executor
+        self.generation: int = generation
+
+    def IsCancelled(self) -> bool:
+        """
+        Check if a newer job has been submitted to the executor.
+        """
+        return self.generation != self.executor.generation
+
+
+class JobExecutor:
+    """
+    Executor running jobs one at a time on a background worker.
+    Submitting a job cancels every job submitted before it.
+    """
+
+    def __init__(self) -> None:
+        self.jobQueue: queue.Queue = queue.Queue()
+
+        # Generation of the latest submitted job
+        self.generation: int = 0
+        self.generationLock = threading.Lock()
+
+        self.workerThread = threading.Thread(
+            target=self.WorkerThread, daemon=True)
+        self.workerThread.start()
+
+    def Submit(self, job: callable, *args) -> JobToken:
+        """
+        Submit a job. The job is called with its token followed by args.
+        """
+        with self.generationLock:
+            self.generation += 1
+            token = JobToken(self, self.generation)
+
+        self.jobQueue.put((token, job, args))
+        return token
+
+    def Cancel(self) -> None:
+        """
+        Cancel all submitted jobs.
+        """
+        with self.generationLock:
+            self.generation += 1
+
+    def WorkerThread(self) -> None:
+        """
+        Thread target running the submitted jobs.
+        """
+        while True:
+            token, job, args = self.jobQueue.get()
+
+            # Skip jobs superseded while waiting in the queue
+            if token.IsCancelled():
+                continue
+
+            try:
+                job(token, *args)
+            except Exception as e:
+                print(f"Job failed: {e}")
@@ -0,0 +1,201 @@
+import collections
+import mmap
+import threading
+import weakref
+import numpy as np
+
+from Config import MEMORY_BUDGET_MB
+
+
+def ResidentBytes(arrays) -> int:
+    """
+    Get the bytes an array or a list of arrays holds in memory. Arrays
+    mapped from a file are paged in and out by the system and count as 0.
+    """
+    if arrays is None:
+        return 0
+    if isinstance(arrays, (list, tuple)):
+        return sum(ResidentBytes(array) for array in arrays)
+
+    base = arrays
+    while base is not None:
+        if isinstance(base, (np.memmap, mmap.mmap)):
+            return 0
+        base = getattr(base, "base", None)
+    return arrays.nbytes
+
+
+class BudgetEntry:
+    """
+    Buffer accounted in the memory budget.
+    """
+
+    def __init__(
+        self,
+        owner,
+        category: str,
+        byteCount: int,
+        cost: float,
+        onEvict: callable,
+    ) -> None:
+        # The registry must not keep the owner alive
+        self.ownerRef: weakref.ref = weakref.ref(owner)
+        self.category: str = category
+        self.byteCount: int = byteCount
+        # Seconds it takes to compute the buffer again
+        self.cost: float = cost
+        # Called with the owner to drop the buffer, None if it can not be dropped
+        self.onEvict: callable = onEvict
+        # Value of keeping the buffer, the lowest is evicted first
+        self.credit: float = 0
+
+
+class MemoryBudget:
+    """
+    Registry of the large buffers of the program by owner and name. Above
+    the budget, evictable buffers are dropped by GreedyDual-Size: the
+    buffer with the lowest cost per byte, aged by the credit of the last
+    eviction, goes first, so cheap and stale buffers go before expensive
+    and recently used ones.
+    """
+
+    def __init__(self, budgetMb: float = MEMORY_BUDGET_MB) -> None:
+        self.budgetBytes: int = int(budgetMb * 1024 * 1024)
+        self.lock = threading.Lock()
+        self.entries: dict[tuple[int, str], BudgetEntry] = {}
+        # Credit of the last evicted buffer, added to the credit of new ones
+        self.inflation: float = 0
+        # Buffers evicted of every category
+        self.evictions: dict[str, int] = {}
+        # Finalizers noting the owners collected, whose buffers are released
+        # on the next call, as collection may happen while the lock is held
+        self.finalizers: dict[int, weakref.finalize] = {}
+        self.collectedOwners: collections.deque = collections.deque()
+
+    def Register(
+        self,
+        owner,
+        name: str,
+        category: str,
+        arrays,
+        cost: float = 0,
+        onEvict: callable = None,
+    ) -> None:
+        """
+        Account the arrays of a buffer of owner, replacing its previous
+        arrays. Buffers with onEvict may be dropped to stay in the budget,
+        by calling onEvict with the owner.
+        """
+        byteCount = ResidentBytes(arrays)
+        key = (id(owner), name)
+        with self.lock:
+            self.ReleaseCollected()
+            if byteCount == 0:
+                self.entries.pop(key, None)
+                return
+            entry = BudgetEntry(owner, category, byteCount, cost, onEvict)
+            entry.credit = self.inflation + cost / byteCount
+            self.entries[key] = entry
+            if id(owner) not in self.finalizers:
+                self.finalizers[id(owner)] = weakref.finalize(
+                    owner, self.collectedOwners.append, id(owner))
+
+        self.Enforce(key)
+
+    def Touch(self, owner, name: str) -> None:
+        """
+        Mark a buffer as used, restoring its credit.
+        """
+        with self.lock:
+            entry = self.entries.get((id(owner), name))
+            if entry is not None:
+                entry.credit = self.inflation + entry.cost / entry.byteCount
+
+    def Release(self, owner, name: str) -> None:
+        """
+        Stop accounting a buffer.
+        """
+        with self.lock:
+            self.entries.pop((id(owner), name), None)
+
+    def ReleaseCollected(self) -> None:
+        """
+        Stop accounting the buffers of the collected owners, the lock must
+        be held.
+        """
+        while len(self.collectedOwners) > 0:
+            ownerId = self.collectedOwners.popleft()
+            for key in [key for key in self.entries if key[0] == ownerId]:
+                del self.entries[key]
+            self.finalizers.pop(ownerId, None)
+
+    def UsedBytes(self) -> int:
+        """
+        Get the bytes of all accounted buffers.
+        """
+        with self.lock:
+            self.ReleaseCollected()
+            return sum(entry.byteCount for entry in self.entries.values())
+
+    def Fits(self, byteCount: int) -> bool:
+        """
+        Check if byteCount more bytes fit the budget once every evictable
+        buffer is dropped.
+        """
+        with self.lock:
+            self.ReleaseCollected()
+            pinnedBytes = sum(
+                entry.byteCount for entry in self.entries.values() if entry.onEvict is None)
+        return pinnedBytes + byteCount <= self.budgetBytes
+
+    def Enforce(self, keepKey: tuple[int, str] = None) -> None:
+        """
+        Evict buffers until the used bytes are within the budget, never the
+        buffer of keepKey.
+        """
+        while True:
+            with self.lock:
+                self.ReleaseCollected()
+                usedBytes = sum(entry.byteCount for entry in self.entries.values())
+                if usedBytes <= self.budgetBytes:
+                    return
+                candidates = [
+                    (entry.credit, key) for key, entry in self.entries.items()
+                    if entry.onEvict is not None and key != keepKey
+                ]
+                # Nothing left to evict, the pinned buffers are over the budget
+                if len(candidates) == 0:
+                    return
+                credit, key = min(candidates)
+                entry = self.entries.pop(key)
+                self.inflation = credit
+                self.evictions[entry.category] = self.evictions.get(entry.category, 0) + 1
+
+            # Drop the buffer outside the lock, it may register other buffers
+            owner = entry.ownerRef()
+            if owner is not None:
+                entry.onEvict(owner)
+
+    def Usage(self) -> dict[str, dict]:
+        """
+        Get the bytes and the number of buffers of every category, largest
+        category first.
+        """
+        with self.lock:
+            self.ReleaseCollected()
+            usage = {}
+            for entry in self.entries.values():
+                category = usage.setdefault(entry.category, dict(
+                    bytes=0, evictableBytes=0, count=0, evictions=0))
+                category["bytes"] += entry.byteCount
+                category["count"] += 1
+                if entry.onEvict is not None:
+                    category["evictableBytes"] += entry.byteCount
+            for categoryName, evictions in self.evictions.items():
+                usage.setdefault(categoryName, dict(
+                    bytes=0, evictableBytes=0, count=0, evictions=0))["evictions"] = evictions
+        return dict(sorted(usage.items(), key=lambda item: -item[1]["bytes"]))
+
+
+# Memory budget of the whole program
+memoryBudget = MemoryBudget()
@@ -0,0 +1,64 @@
+import numpy as np
+
+from Utils import AudioCache
+from Utils.AudioProcess import Audio
+from Utils.CandidateDetector import CellEnergies
+from Config import ANALYSIS_SAMPLE_RATE, OVERVIEW_BANDS, OVERVIEW_CELL_SECONDS, OVERVIEW_DB_RANGE
+
+
+def ComputeOverview(
+    audio: Audio,
+    bands: int = OVERVIEW_BANDS,
+    cellSeconds: float = OVERVIEW_CELL_SECONDS,
+) -> tuple[np.ndarray, float]:
+    """
+    Summarize the whole audio as the energy of every band and cell of
+    cellSeconds, in one pass over the spectrum. Energies are mapped to
+    bytes over the OVERVIEW_DB_RANGE dB below the loudest cell.
+    Returns an uint8 array of shape (bands, cells) and the seconds of a cell.
+    """
+    freqHeight = audio.nFft // 2 + 1
+    bandEdges = np.unique(np.linspace(0, freqHeight, bands + 1).astype(int))
+    cellFrames = max(int(round(cellSeconds * audio.sampleRate / audio.hopLength)), 1)
+
+    cellDb = CellEnergies(audio, bandEdges, cellFrames)
+    if cellDb.size == 0:
+        return np.zeros((len(bandEdges) - 1, 0), dtype=np.uint8), cellSeconds
+
+    # Map the top OVERVIEW_DB_RANGE dB to bytes
+    floorDb = np.amax(cellDb) - OVERVIEW_DB_RANGE
+    overview = np.clip((cellDb - floorDb) / OVERVIEW_DB_RANGE * 255, 0, 255)
+    return overview.astype(np.uint8), cellFrames * audio.hopLength / audio.sampleRate
+
+
+def LoadOverview(
+    audioFilePath: str,
+    audio: Audio = None,
+    targetSampleRate: int = ANALYSIS_SAMPLE_RATE,
+    cacheDir: str = None,
+) -> tuple[np.ndarray, float]:
+    """
+    Load the overview of an audio file from the cache, or compute and cache
+    it. The file is opened unless its audio is given.
+    Returns the overview and the seconds of a cell.
+    """
+    overviewPath = AudioCache.GetOverviewPath(audioFilePath, targetSampleRate, cacheDir)
+    if AudioCache.IsCached(overviewPath):
+        metadata, arrays = AudioCache.ReadCache(overviewPath)
+        return np.array(arrays["overview"]), metadata["cellSeconds"]
+
+    if audio is None:
+        overviewAudio = Audio()
+        overviewAudio.LoadAudio(
+            audioFilePath, downmix=True, targetSampleRate=targetSampleRate, lazy=True)
+        overview, cellSeconds = ComputeOverview(overviewAudio)
+        overviewAudio.CloseAudio()
+    else:
+        overview, cellSeconds = ComputeOverview(audio)
+
+    try:
+        AudioCache.WriteCache(
+            overviewPath, {"overview": overview}, {"cellSeconds": cellSeconds})
+    except OSError as e:
+        print(f"Failed to cache the overview of {audioFilePath}: {e}")
+    return overview, cellSeconds
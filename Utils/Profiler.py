@@ -0,0 +1,197 @@
+import collections
+import functools
+import json
+import os
+import threading
+import time
+import numpy as np
+
+from Config import PROFILER_HISTORY, PROFILER_MAX_EVENTS, PROFILING_ENABLED
+
+
+class NullSpan:
+    """
+    Span doing nothing, returned while profiling is disabled.
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback) -> None:
+        return None
+
+
+class ProfilerSpan:
+    """
+    Span timing the code it wraps and recording it when it exits.
+    """
+
+    def __init__(self, profiler, name: str) -> None:
+        self.profiler = profiler
+        self.name: str = name
+        self.startTime: float = None
+
+    def __enter__(self):
+        self.startTime = time.perf_counter()
+        return self
+
+    def __exit__(self, excType, excValue, traceback) -> None:
+        self.profiler.Record(self.name, self.startTime, time.perf_counter())
+        return None
+
+
+# Shared by all spans while profiling is disabled
+NULL_SPAN = NullSpan()
+
+
+class Profiler:
+    """
+    Timings of named stages, kept as trace events and as the last durations
+    of every stage.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = PROFILING_ENABLED,
+        history: int = PROFILER_HISTORY,
+        maxEvents: int = PROFILER_MAX_EVENTS,
+    ) -> None:
+        self.enabled: bool = enabled
+        self.history: int = history
+        self.lock = threading.Lock()
+        # Time all event timestamps are relative to
+        self.originTime: float = time.perf_counter()
+        # Latest events as (name, start, end, thread id)
+        self.events: collections.deque = collections.deque(maxlen=maxEvents)
+        # Latest durations in seconds of every stage
+        self.durations: dict[str, collections.deque] = {}
+        # Names of the threads that recorded events
+        self.threadNames: dict[int, str] = {}
+
+    def Span(self, name: str):
+        """
+        Get a context manager timing a stage, which does nothing while
+        profiling is disabled.
+        """
+        if not self.enabled:
+            return NULL_SPAN
+        return ProfilerSpan(self, name)
+
+    def SetEnabled(self, enabled: bool) -> None:
+        self.enabled = enabled
+
+    def Record(self, name: str, startTime: float, endTime: float) -> None:
+        """
+        Record a stage that ran from startTime to endTime.
+        """
+        thread = threading.current_thread()
+        with self.lock:
+            self.events.append((name, startTime, endTime, thread.ident))
+            self.threadNames[thread.ident] = thread.name
+            if name not in self.durations:
+                self.durations[name] = collections.deque(maxlen=self.history)
+            self.durations[name].append(endTime - startTime)
+
+    def Reset(self) -> None:
+        """
+        Drop all recorded events.
+        """
+        with self.lock:
+            self.events.clear()
+            self.durations.clear()
+            self.threadNames.clear()
+            self.originTime = time.perf_counter()
+
+    def Summary(self) -> dict[str, dict]:
+        """
+        Get the count and the percentiles in milliseconds of the latest
+        durations of every stage, slowest median first.
+        """
+        with self.lock:
+            durations = {name: np.array(stage) * 1000 for name, stage in self.durations.items()}
+
+        summary = {}
+        for name, stage in durations.items():
+            p50, p90, p99 = np.percentile(stage, [50, 90, 99])
+            summary[name] = {
+                "count": len(stage),
+                "p50": float(p50),
+                "p90": float(p90),
+                "p99": float(p99),
+                "max": float(np.amax(stage)),
+            }
+        return dict(sorted(summary.items(), key=lambda item: -item[1]["p50"]))
+
+    def StatusText(self, stageCount: int = 4) -> str:
+        """
+        Get the last duration of the slowest stages as a short text.
+        """
+        with self.lock:
+            lastDurations = {name: stage[-1] for name, stage in self.durations.items()}
+        slowest = sorted(lastDurations.items(), key=lambda item: -item[1])[:stageCount]
+        return " | ".join(f"{name} {duration * 1000:.1f}ms" for name, duration in slowest)
+
+    def ExportTrace(self, fileName: str) -> None:
+        """
+        Write the recorded events as a Chrome trace event file, to open in
+        chrome://tracing or Perfetto.
+        """
+        with self.lock:
+            events = list(self.events)
+            threadNames = dict(self.threadNames)
+            originTime = self.originTime
+
+        pid = os.getpid()
+        traceEvents = [
+            {
+                "name": "thread_name",
+                "ph": "M",
+                "pid": pid,
+                "tid": threadId,
+                "args": {"name": threadName},
+            }
+            for threadId, threadName in threadNames.items()
+        ]
+        for name, startTime, endTime, threadId in events:
+            traceEvents.append({
+                "name": name,
+                "cat": name.split(".")[0],
+                "ph": "X",
+                "ts": (startTime - originTime) * 1e6,
+                "dur": (endTime - startTime) * 1e6,
+                "pid": pid,
+                "tid": threadId,
+            })
+
+        with open(fileName, "w") as file:
+            json.dump({
+                "traceEvents": traceEvents,
+                "displayTimeUnit": "ms",
+                "otherData": {"summary": self.Summary()},
+            }, file)
+
+
+# Profiler of the whole program
+profiler = Profiler()
+
+
+def Span(name: str):
+    """
+    Time a stage with the profiler of the whole program.
+    """
+    return profiler.Span(name)
+
+
+def Timed(name: str):
+    """
+    Decorator timing every call of a function as a stage.
+    """
+    def Decorator(function: callable) -> callable:
+        @functools.wraps(function)
+        def Wrapper(*args, **kwargs):
+            if not profiler.enabled:
+                return function(*args, **kwargs)
+            with ProfilerSpan(profiler, name):
+                return function(*args, **kwargs)
+        return Wrapper
+    return Decorator
@@ -0,0 +1,102 @@
+import numpy as np
+from multiprocessing import shared_memory
+
+
+class SharedArray:
+    """
+    NumPy array in a named shared memory block, which other processes
+    attach to by name without copying. Every process releases its own
+    attachment, the process that created the block unlinks it as well.
+    """
+
+    def __init__(
+        self,
+        block: shared_memory.SharedMemory,
+        shape: tuple[int, ...],
+        dtype: np.dtype,
+        isOwner: bool,
+    ) -> None:
+        self.block: shared_memory.SharedMemory = block
+        self.isOwner: bool = isOwner
+        self.array: np.ndarray = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+
+    def GetDescriptor(self) -> tuple:
+        """
+        Get the picklable descriptor other processes attach with.
+        """
+        return ("shm", self.block.name, self.array.shape, self.array.dtype.str)
+
+    def Release(self) -> None:
+        """
+        Unlink the block if this process created it, then close it.
+        """
+        if self.array is None:
+            return
+        self.array = None
+        if self.isOwner:
+            self.block.unlink()
+        try:
+            self.block.close()
+        except BufferError:
+            # Views of the array are still alive, the mapping goes with them
+            pass
+
+
+def CreateSharedArray(shape: tuple[int, ...], dtype: np.dtype) -> SharedArray:
+    """
+    Allocate an uninitialized array in a new shared memory block.
+    """
+    dtype = np.dtype(dtype)
+    byteCount = max(int(np.prod(shape)) * dtype.itemsize, 1)
+    block = shared_memory.SharedMemory(create=True, size=byteCount)
+    return SharedArray(block, shape, dtype, True)
+
+
+def ShareArray(array: np.ndarray) -> SharedArray:
+    """
+    Copy an array into a new shared memory block.
+    """
+    sharedArray = CreateSharedArray(array.shape, array.dtype)
+    sharedArray.array[...] = array
+    return sharedArray
+
+
+def AttachSharedArray(descriptor: tuple) -> SharedArray:
+    """
+    Attach to the shared memory block of a descriptor from GetDescriptor.
+    """
+    _, name, shape, dtype = descriptor
+    # Worker processes share the resource tracker of the process that
+    # started them, which unlinks the block once, when its creator does
+    block = shared_memory.SharedMemory(name=name)
+    return SharedArray(block, tuple(shape), np.dtype(dtype), False)
+
+
+def GetArrayDescriptor(array: np.ndarray, sharedArray: SharedArray = None) -> tuple:
+    """
+    Get a picklable descriptor of an array other processes can open without
+    copying: its shared memory block, or the file it is mapped from.
+    Returns None if the array is neither.
+    """
+    if sharedArray is not None:
+        return sharedArray.GetDescriptor()
+    if isinstance(array, np.memmap) and array.filename is not None:
+        return ("file", array.filename, array.offset, array.shape, array.dtype.str,
+                "F" if array.flags.f_contiguous and not array.flags.c_contiguous else "C")
+    return None
+
+
+def OpenArrayDescriptor(descriptor: tuple) -> tuple[np.ndarray, SharedArray]:
+    """
+    Open the array of a descriptor from GetArrayDescriptor. Returns the
+    array and its shared block, None for arrays mapped from a file.
+    """
+    if descriptor[0] == "shm":
+        sharedArray = AttachSharedArray(descriptor)
+        return sharedArray.array, sharedArray
+
+    _, fileName, offset, shape, dtype, order = descriptor
+    array = np.memmap(
+        fileName, dtype=np.dtype(dtype), mode="r", offset=offset,
+        shape=tuple(shape), order=order)
+    return array, None
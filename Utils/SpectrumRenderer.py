@@ -0,0 +1,196 @@
+import functools
+import math
+import os
+import librosa
+import matplotlib
+import numpy as np
+from matplotlib import image as mpimg
+
+from Utils.AudioPlot import LabelBox, ToneMapSpectrum
+from Utils.AudioProcess import Audio
+from Utils.DataSetLabel import DataSetLabel
+from Config import ANALYSIS_SAMPLE_RATE, MAX_AUDIO_LENGTH, REVIEW_COLORMAP, REVIEW_PNG_COMPRESSION, REVIEW_SHEET_COLUMNS
+
+# Color and pixel width of the label boxes, as drawn by the spectrum plot
+LABEL_COLOR = (255, 0, 0, 255)
+LABEL_LINE_WIDTH = 2
+# Pixels between the windows of a sheet and their color
+SHEET_GAP = 4
+SHEET_BACKGROUND = (255, 255, 255, 255)
+
+
+@functools.lru_cache(maxsize=8)
+def ColormapLut(name: str = REVIEW_COLORMAP) -> np.ndarray:
+    """
+    Get the 256 RGBA colors of a colormap as bytes.
+    """
+    colormap = matplotlib.colormaps[name].resampled(256)
+    return (colormap(np.arange(256)) * 255 + 0.5).astype(np.uint8)
+
+
+def ColorizeImage(image: np.ndarray, lut: np.ndarray) -> np.ndarray:
+    """
+    Map a tone mapped image to RGBA through a colormap lookup table, with
+    the lowest bin at the bottom like the spectrum plot. Values are
+    clipped to [0, 1] as by its color limits.
+    """
+    indices = np.minimum((np.clip(image, 0, 1) * len(lut)).astype(np.intp), len(lut) - 1)
+    return lut[indices[::-1]]
+
+
+def DrawRectangle(
+    rgba: np.ndarray,
+    box: tuple[float, float, float, float],
+    color: tuple[int, int, int, int] = LABEL_COLOR,
+    lineWidth: int = LABEL_LINE_WIDTH,
+) -> None:
+    """
+    Draw the outline of a box from LabelBox into an RGBA image in place,
+    clipped to the image.
+    """
+    height, width = rgba.shape[:2]
+    xStart, xEnd, yStart, yEnd = box
+    # Pixel columns and rows, the lowest bin is the last row
+    left = int(np.clip(round(xStart), 0, width))
+    right = int(np.clip(round(xEnd), 0, width))
+    top = int(np.clip(height - round(yEnd), 0, height))
+    bottom = int(np.clip(height - round(yStart), 0, height))
+    if left >= right or top >= bottom:
+        return
+
+    rgba[top:min(top + lineWidth, bottom), left:right] = color
+    rgba[max(bottom - lineWidth, top):bottom, left:right] = color
+    rgba[top:bottom, left:min(left + lineWidth, right)] = color
+    rgba[top:bottom, max(right - lineWidth, left):right] = color
+
+
+def RenderWindow(
+    magnitude: np.ndarray,
+    labels: list[DataSetLabel],
+    windowLength: float,
+    freqArr: np.ndarray,
+    contrastEnhancement: float = 1.0,
+    brightnessEnhancement: float = 0,
+    lut: np.ndarray = None,
+) -> np.ndarray:
+    """
+    Render the magnitude spectrum of a window of windowLength seconds with
+    the boxes of labels, whose times are relative to the window, into an
+    RGBA image the way the spectrum plot shows it.
+    """
+    maxVal = np.amax(magnitude) if magnitude.size > 0 else 0
+    image = ToneMapSpectrum(
+        magnitude, maxVal if maxVal > 0 else 1, contrastEnhancement, brightnessEnhancement)
+    rgba = ColorizeImage(image, ColormapLut() if lut is None else lut)
+
+    for label in labels:
+        DrawRectangle(rgba, LabelBox(label, windowLength, magnitude.shape[1], freqArr))
+    return rgba
+
+
+def TileSheet(images: list[np.ndarray], columns: int) -> np.ndarray:
+    """
+    Tile RGBA images row by row into a sheet of columns cells the size of
+    the largest image, SHEET_GAP pixels apart. Smaller images, like the
+    last window of a file, are aligned to the top left of their cell.
+    """
+    cellHeight = max(image.shape[0] for image in images)
+    cellWidth = max(image.shape[1] for image in images)
+    rows = math.ceil(len(images) / columns)
+    columns = min(columns, len(images))
+    sheet = np.empty(
+        (rows * (cellHeight + SHEET_GAP) - SHEET_GAP, columns * (cellWidth + SHEET_GAP) - SHEET_GAP, 4),
+        dtype=np.uint8)
+    sheet[:] = SHEET_BACKGROUND
+
+    for i, image in enumerate(images):
+        top = (i // columns) * (cellHeight + SHEET_GAP)
+        left = (i % columns) * (cellWidth + SHEET_GAP)
+        sheet[top:top + image.shape[0], left:left + image.shape[1]] = image
+    return sheet
+
+
+def RenderFileWindows(
+    sourceFile: str,
+    firstWindow: int,
+    windowCount: int,
+    labels: list[DataSetLabel],
+    outputPrefix: str,
+    sheetColumns: int = REVIEW_SHEET_COLUMNS,
+    windowSeconds: float = MAX_AUDIO_LENGTH,
+    nFft: int = 512,
+    sampleRate: int = ANALYSIS_SAMPLE_RATE,
+    contrastEnhancement: float = 1.0,
+    brightnessEnhancement: float = 0,
+) -> tuple[str, int]:
+    """
+    Render windows firstWindow to firstWindow + windowCount of windowSeconds
+    of an audio file with the labels they overlap, tiled in time order into
+    a PNG sheet of sheetColumns columns named outputPrefix followed by the
+    first window and its start. The spectrum is taken from the cache of the
+    file if it was preprocessed, otherwise computed for the windows only.
+    Returns the path of the sheet, None past the end of the file, and the
+    number of windows in it.
+    """
+    audio = Audio(nFft=nFft)
+    audio.LoadAudio(sourceFile, downmix=True, targetSampleRate=sampleRate, lazy=True)
+    freqArr = librosa.fft_frequencies(sr=audio.sampleRate, n_fft=nFft)
+    lut = ColormapLut()
+    # Whole frames per window, so windows start on a frame
+    windowFrames = max(int(windowSeconds * audio.sampleRate) // audio.hopLength, 1)
+    frameSeconds = audio.hopLength / audio.sampleRate
+    spectrumFrames = audio.GetSpectrumFrameCount()
+
+    images = []
+    for window in range(firstWindow, firstWindow + windowCount):
+        firstFrame = window * windowFrames
+        if firstFrame >= spectrumFrames:
+            break
+        magnitude = audio.GetMagnitudeFrames(firstFrame, min(firstFrame + windowFrames, spectrumFrames))
+
+        # Labels overlapping the window, relative to its start
+        windowStart = firstFrame * frameSeconds
+        windowLength = magnitude.shape[1] * frameSeconds
+        windowLabels = [
+            label.OffsetCopy(-windowStart) for label in labels
+            if label.endTime > windowStart and label.startTime < windowStart + windowLength
+        ]
+
+        images.append(RenderWindow(
+            magnitude, windowLabels, windowLength, freqArr,
+            contrastEnhancement, brightnessEnhancement, lut))
+
+    audio.CloseAudio()
+    if len(images) == 0:
+        return None, 0
+
+    sheet = TileSheet(images, sheetColumns)
+    sheetPath = f"{outputPrefix}_{firstWindow:05d}_{firstWindow * windowFrames * frameSeconds:.1f}s.png"
+    os.makedirs(os.path.dirname(outputPrefix) or ".", exist_ok=True)
+    mpimg.imsave(sheetPath, sheet, pil_kwargs={"compress_level": REVIEW_PNG_COMPRESSION})
+    return sheetPath, len(images)
+
+
+def GetWindowCount(
+    sourceFile: str,
+    windowSeconds: float = MAX_AUDIO_LENGTH,
+    nFft: int = 512,
+    sampleRate: int = ANALYSIS_SAMPLE_RATE,
+) -> tuple[int, float]:
+    """
+    Get the number of windows RenderFileWindows splits an audio file into
+    and their exact length in seconds, without decoding it.
+    """
+    audio = Audio(nFft=nFft)
+    audio.OpenAudio(sourceFile, downmix=True)
+    frameCount = audio.GetFrameCount()
+    # Frames once resampled like LoadAudio does
+    if sampleRate is not None and sampleRate < audio.sampleRate:
+        frameCount = math.ceil(frameCount * sampleRate / audio.sampleRate)
+    else:
+        sampleRate = audio.sampleRate
+    audio.CloseAudio()
+
+    spectrumFrames = 1 + frameCount // audio.hopLength
+    windowFrames = max(int(windowSeconds * sampleRate) // audio.hopLength, 1)
+    return math.ceil(spectrumFrames / windowFrames), windowFrames * audio.hopLength / sampleRate
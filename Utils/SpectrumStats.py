@@ -0,0 +1,222 @@
+import numpy as np
+
+from Config import REGION_STATS_REBUILD_OFFSET, REGION_STATS_SURROUND
+
+
+def ShiftColumns(
+    array: np.ndarray,
+    width: int,
+    shift: int,
+    span: tuple[int, int],
+) -> np.ndarray:
+    """
+    Move columns span[0] + shift to span[1] + shift of array to span[0] to
+    span[1] of an array with width columns. The array is reused in place
+    when its width does not change. Columns outside span are left undefined.
+    """
+    if array.shape[-1] == width:
+        result = array
+    else:
+        result = np.empty(array.shape[:-1] + (width,), dtype=array.dtype)
+    result[..., span[0]:span[1]] = array[..., span[0] + shift:span[1] + shift]
+    return result
+
+
+class SummedAreaTable:
+    """
+    Summed-area table of a 2D array for constant time rectangle sums.
+    """
+
+    def __init__(self, array: np.ndarray) -> None:
+        self.table: np.ndarray = None
+        self.Build(array)
+
+    def Build(self, array: np.ndarray) -> None:
+        """
+        Build the table of array from scratch.
+        """
+        # Table with a leading row and column of zeros
+        self.table = np.zeros(
+            (array.shape[0] + 1, array.shape[1] + 1), dtype=np.float64)
+        np.cumsum(
+            np.cumsum(array, axis=0, dtype=np.float64),
+            axis=1,
+            out=self.table[1:, 1:]
+        )
+
+    def Shift(
+        self,
+        width: int,
+        shift: int,
+        span: tuple[int, int],
+        GetColumns: callable,
+        maxOffset: float = REGION_STATS_REBUILD_OFFSET,
+    ) -> None:
+        """
+        Update the table for an array of width columns whose columns span
+        are the columns span + shift of the previous array. Shared columns
+        are moved, only the new columns GetColumns(start, end) are summed.
+        Moved sums keep a per row offset, which cancels out in Sum. The
+        offset grows with every shift, so the table is built again from
+        GetColumns(0, width) once it exceeds maxOffset times the sums of
+        the array.
+        """
+        self.table = ShiftColumns(
+            self.table, width + 1, shift, (span[0], span[1] + 1))
+
+        # Extend the table to the left of the shared columns
+        if span[0] > 0:
+            columnSums = np.cumsum(
+                GetColumns(0, span[0]), axis=0, dtype=np.float64)
+            # Sums from each column up to the first shared column
+            suffixSums = np.cumsum(columnSums[:, ::-1], axis=1)[:, ::-1]
+            self.table[1:, :span[0]] = self.table[1:, span[0]:span[0] + 1] - suffixSums
+            self.table[0, :span[0]] = self.table[0, span[0]]
+
+        # Extend the table to the right of the shared columns
+        if span[1] < width:
+            columnSums = np.cumsum(
+                GetColumns(span[1], width), axis=0, dtype=np.float64)
+            self.table[1:, span[1] + 1:] = self.table[1:, span[1]:span[1] + 1] + \
+                np.cumsum(columnSums, axis=1)
+            self.table[0, span[1] + 1:] = self.table[0, span[1]]
+
+        # Rebuild before the offset costs the sums their precision
+        offset = np.abs(self.table[:, 0]).max()
+        arraySum = np.abs(self.table[:, -1] - self.table[:, 0]).max()
+        if offset > maxOffset * arraySum:
+            self.Build(GetColumns(0, width))
+
+    def Sum(self, rowSpan: tuple[int, int], colSpan: tuple[int, int]) -> float:
+        """
+        Sum of the array over rows [rowSpan[0], rowSpan[1]) and
+        columns [colSpan[0], colSpan[1]).
+        """
+        return (
+            self.table[rowSpan[1], colSpan[1]]
+            - self.table[rowSpan[0], colSpan[1]]
+            - self.table[rowSpan[1], colSpan[0]]
+            + self.table[rowSpan[0], colSpan[0]]
+        )
+
+
+class SpectrumStatistics:
+    """
+    Region statistics of a magnitude spectrum backed by summed-area tables.
+    All statistics but the peak take constant time.
+    """
+
+    def __init__(self, fftSpectrum: np.ndarray, freqArr: np.ndarray) -> None:
+        self.fftSpectrum: np.ndarray = fftSpectrum
+        self.freqArr: np.ndarray = freqArr[:fftSpectrum.shape[0]]
+
+        # Summed-area tables
+        self.magnitudeTable = SummedAreaTable(fftSpectrum)
+        self.powerTable = SummedAreaTable(self.PowerColumns(0, fftSpectrum.shape[1]))
+        # Frequency weighted magnitude for the spectral centroid
+        self.freqMagnitudeTable = SummedAreaTable(
+            self.FreqMagnitudeColumns(0, fftSpectrum.shape[1]))
+        # Power in dB for the mean level
+        self.powerDbTable = SummedAreaTable(
+            self.PowerDbColumns(0, fftSpectrum.shape[1]))
+
+    def GetTables(self) -> list[np.ndarray]:
+        """
+        Get the arrays of the summed-area tables.
+        """
+        return [
+            self.magnitudeTable.table,
+            self.powerTable.table,
+            self.freqMagnitudeTable.table,
+            self.powerDbTable.table,
+        ]
+
+    def PowerColumns(self, start: int, end: int) -> np.ndarray:
+        return np.square(self.fftSpectrum[:, start:end], dtype=np.float64)
+
+    def FreqMagnitudeColumns(self, start: int, end: int) -> np.ndarray:
+        return self.fftSpectrum[:, start:end] * self.freqArr[:, np.newaxis]
+
+    def PowerDbColumns(self, start: int, end: int) -> np.ndarray:
+        return 10 * np.log10(self.PowerColumns(start, end) + 1e-12)
+
+    def Shift(
+        self,
+        fftSpectrum: np.ndarray,
+        shift: int,
+        span: tuple[int, int]
+    ) -> None:
+        """
+        Update the tables for a spectrum whose frames span are the frames
+        span + shift of the previous spectrum.
+        """
+        self.fftSpectrum = fftSpectrum
+        width = fftSpectrum.shape[1]
+
+        self.magnitudeTable.Shift(
+            width, shift, span, lambda start, end: fftSpectrum[:, start:end])
+        self.powerTable.Shift(width, shift, span, self.PowerColumns)
+        self.freqMagnitudeTable.Shift(
+            width, shift, span, self.FreqMagnitudeColumns)
+        self.powerDbTable.Shift(width, shift, span, self.PowerDbColumns)
+
+    def RegionStatistics(
+        self,
+        timeSpan: tuple[int, int],
+        freqSpan: tuple[int, int]
+    ) -> dict:
+        """
+        Statistics of the region spanning frames timeSpan and bins freqSpan.
+        The sums come from the tables in constant time, the peak is a
+        reduction over the region, linear in its area.
+        Returns None if the region is empty.
+        """
+        freqHeight, timeWidth = self.fftSpectrum.shape
+        # Clamp the region into the spectrum
+        timeSpan = (max(timeSpan[0], 0), min(timeSpan[1], timeWidth))
+        freqSpan = (max(freqSpan[0], 0), min(freqSpan[1], freqHeight))
+        area = (timeSpan[1] - timeSpan[0]) * (freqSpan[1] - freqSpan[0])
+        if area <= 0:
+            return None
+
+        energy = self.powerTable.Sum(freqSpan, timeSpan)
+        magnitude = self.magnitudeTable.Sum(freqSpan, timeSpan)
+        freqMagnitude = self.freqMagnitudeTable.Sum(freqSpan, timeSpan)
+        powerDb = self.powerDbTable.Sum(freqSpan, timeSpan)
+        # The peak is a plain reduction over the region, a max table of
+        # every region size would cost far more memory than the spectrum
+        peak = np.max(
+            self.fftSpectrum[freqSpan[0]:freqSpan[1], timeSpan[0]:timeSpan[1]])
+
+        # Surrounding area, the region grown on every side
+        timeMargin = max(
+            int((timeSpan[1] - timeSpan[0]) * REGION_STATS_SURROUND), 1)
+        freqMargin = max(
+            int((freqSpan[1] - freqSpan[0]) * REGION_STATS_SURROUND), 1)
+        outerTimeSpan = (
+            max(timeSpan[0] - timeMargin, 0),
+            min(timeSpan[1] + timeMargin, timeWidth)
+        )
+        outerFreqSpan = (
+            max(freqSpan[0] - freqMargin, 0),
+            min(freqSpan[1] + freqMargin, freqHeight)
+        )
+        outerArea = (outerTimeSpan[1] - outerTimeSpan[0]) * \
+            (outerFreqSpan[1] - outerFreqSpan[0])
+        surroundEnergy = self.powerTable.Sum(
+            outerFreqSpan, outerTimeSpan) - energy
+        surroundArea = outerArea - area
+
+        # Signal to noise ratio of the mean power against the surrounding
+        snr = None
+        if surroundArea > 0 and surroundEnergy > 0:
+            snr = 10 * np.log10(
+                (energy / area) / (surroundEnergy / surroundArea) + 1e-12)
+
+        return {
+            "energy": 10 * np.log10(energy + 1e-12),
+            "peak": 20 * np.log10(peak + 1e-12),
+            "meanDb": powerDb / area,
+            "centroid": freqMagnitude / magnitude if magnitude > 0 else 0.0,
+            "snr": snr,
+        }
@@ -0,0 +1,287 @@
+from __future__ import annotations
+
+import queue
+import threading
+
+from Config import TASK_POLL_INTERVAL, TASK_WORKERS
+
+# Priorities of the tasks, lower runs first
+INTERACTIVE_PRIORITY = 0
+ANALYSIS_PRIORITY = 1
+PREFETCH_PRIORITY = 2
+
+# Events sent by the workers to the thread delivering the results
+PROGRESS_EVENT = "progress"
+DONE_EVENT = "done"
+FAILED_EVENT = "failed"
+
+
+class TaskToken:
+    """
+    Token of a submitted task, handed to the running job to check whether
+    it has been superseded and to report its progress.
+    """
+
+    def __init__(
+        self,
+        scheduler: TaskScheduler,
+        key: str,
+        sequence: int,
+        priority: int,
+        exclusive: bool,
+        job: callable,
+        args: tuple,
+        onDone: callable,
+        onError: callable,
+    ) -> None:
+        self.scheduler: TaskScheduler = scheduler
+        self.key: str = key
+        self.sequence: int = sequence
+        self.priority: int = priority
+        self.exclusive: bool = exclusive
+        self.job: callable = job
+        self.args: tuple = args
+        self.onDone: callable = onDone
+        self.onError: callable = onError
+        # Value returned by the job
+        self.result = None
+        self.cancelled: bool = False
+        self.finished = threading.Event()
+
+    def IsCancelled(self) -> bool:
+        """
+        Check if the task has been cancelled or superseded by a newer task
+        of the same key.
+        """
+        return self.cancelled
+
+    def Wait(self, timeout: float = None) -> bool:
+        """
+        Wait for the task to finish or to be dropped from the queue.
+        """
+        return self.finished.wait(timeout)
+
+    def ReportProgress(self, text: str) -> None:
+        """
+        Report the progress of the running job, shown once delivered.
+        """
+        self.scheduler.results.put((self, PROGRESS_EVENT, text))
+
+
+class TaskScheduler:
+    """
+    Pool of background workers running keyed tasks by priority. Submitting
+    a task cancels the task of the same key submitted before it, tasks of a
+    key run one at a time and the results of cancelled tasks are dropped.
+    One worker is kept for the interactive tasks. Results and progress are
+    delivered on the thread calling Deliver, the Tk thread once attached.
+    """
+
+    def __init__(
+        self,
+        workerCount: int = TASK_WORKERS,
+        onProgress: callable = None,
+        onIdle: callable = None,
+    ) -> None:
+        self.workerCount: int = workerCount
+        self.onProgress: callable = onProgress
+        self.onIdle: callable = onIdle
+
+        self.condition = threading.Condition()
+        # Tasks waiting for a worker
+        self.pending: list[TaskToken] = []
+        # Tasks running on a worker
+        self.running: list[TaskToken] = []
+        # Latest submitted task of every key
+        self.latest: dict[str, TaskToken] = {}
+        self.sequence: int = 0
+
+        # Events waiting to be delivered
+        self.results: queue.Queue = queue.Queue()
+        # Whether progress was shown since the scheduler was last idle
+        self.busy: bool = False
+
+        self.workerThreads = [
+            threading.Thread(target=self.WorkerThread, name=f"TaskWorker-{i}", daemon=True)
+            for i in range(workerCount)
+        ]
+        for workerThread in self.workerThreads:
+            workerThread.start()
+
+    def Submit(
+        self,
+        key: str,
+        job: callable,
+        *args,
+        priority: int = INTERACTIVE_PRIORITY,
+        exclusive: bool = False,
+        onDone: callable = None,
+        onError: callable = None,
+    ) -> TaskToken:
+        """
+        Submit a task cancelling the previous task of key. The job is called
+        with its token followed by args and onDone with its result. An
+        exclusive task runs alone, while no other task runs.
+        """
+        with self.condition:
+            self.CancelKey(key)
+            self.sequence += 1
+            token = TaskToken(
+                self, key, self.sequence, priority, exclusive, job, args, onDone, onError)
+            self.latest[key] = token
+            self.pending.append(token)
+            self.condition.notify_all()
+        return token
+
+    def Cancel(self, key: str) -> None:
+        """
+        Cancel the latest task of key.
+        """
+        with self.condition:
+            self.CancelKey(key)
+
+    def CancelAll(self) -> None:
+        """
+        Cancel the latest task of every key.
+        """
+        with self.condition:
+            for key in list(self.latest):
+                self.CancelKey(key)
+
+    def Withdraw(self, token: TaskToken) -> bool:
+        """
+        Cancel a task if it has not started yet. Returns whether it was
+        withdrawn, otherwise the task is running or done.
+        """
+        with self.condition:
+            if token not in self.pending:
+                return False
+            self.CancelKey(token.key)
+            return True
+
+    def CancelKey(self, key: str) -> None:
+        """
+        Cancel the latest task of key, the condition must be held.
+        """
+        token = self.latest.pop(key, None)
+        if token is None:
+            return
+        token.cancelled = True
+        # Drop it from the queue unless a worker already runs it
+        if token in self.pending:
+            self.pending.remove(token)
+            token.finished.set()
+
+    def IsPending(self, key: str) -> bool:
+        """
+        Check if the latest task of key is waiting, running or not yet
+        delivered.
+        """
+        with self.condition:
+            return key in self.latest
+
+    def IsIdle(self) -> bool:
+        """
+        Check if no task is waiting or running.
+        """
+        with self.condition:
+            return len(self.pending) == 0 and len(self.running) == 0
+
+    def NextTask(self) -> TaskToken:
+        """
+        Get the task a free worker should run next, None if no task can
+        start. The condition must be held.
+        """
+        # Nothing starts next to an exclusive task
+        if any(task.exclusive for task in self.running):
+            return None
+
+        runningKeys = {task.key for task in self.running}
+        backgroundCount = sum(task.priority > INTERACTIVE_PRIORITY for task in self.running)
+        for task in sorted(self.pending, key=lambda task: (task.priority, task.sequence)):
+            # Exclusive tasks hold back the tasks after them until they ran
+            if task.exclusive:
+                return task if len(self.running) == 0 else None
+            if task.key in runningKeys:
+                continue
+            # Keep a worker for the interactive tasks
+            if task.priority > INTERACTIVE_PRIORITY and backgroundCount >= self.workerCount - 1:
+                continue
+            return task
+        return None
+
+    def WorkerThread(self) -> None:
+        """
+        Thread target running the submitted tasks.
+        """
+        while True:
+            with self.condition:
+                task = self.NextTask()
+                while task is None:
+                    self.condition.wait()
+                    task = self.NextTask()
+                self.pending.remove(task)
+                self.running.append(task)
+
+            try:
+                task.result = task.job(task, *task.args)
+                self.results.put((task, DONE_EVENT, task.result))
+            except Exception as e:
+                self.results.put((task, FAILED_EVENT, e))
+            finally:
+                # The task stays the latest of its key until delivered, so
+                # a newer task of the key still drops its result
+                with self.condition:
+                    self.running.remove(task)
+                    self.condition.notify_all()
+                task.finished.set()
+
+    def Deliver(self) -> None:
+        """
+        Deliver the progress and results of the tasks that have not been
+        cancelled, on the calling thread.
+        """
+        while True:
+            try:
+                task, event, value = self.results.get_nowait()
+            except queue.Empty:
+                break
+
+            # Results of superseded tasks are stale
+            if task.IsCancelled():
+                continue
+
+            if event == PROGRESS_EVENT:
+                self.busy = True
+                if self.onProgress is not None:
+                    self.onProgress(value)
+                continue
+
+            try:
+                if event == DONE_EVENT:
+                    if task.onDone is not None:
+                        task.onDone(value)
+                elif task.onError is not None:
+                    task.onError(value)
+                else:
+                    print(f"Task {task.key} failed: {value}")
+            finally:
+                # Delivered, the task no longer is the latest of its key
+                with self.condition:
+                    if self.latest.get(task.key) is task:
+                        del self.latest[task.key]
+
+        if self.busy and self.IsIdle() and self.results.empty():
+            self.busy = False
+            if self.onIdle is not None:
+                self.onIdle()
+
+    def Attach(self, widget, interval: int = TASK_POLL_INTERVAL) -> None:
+        """
+        Deliver the results on the Tk thread of widget every interval
+        milliseconds.
+        """
+        try:
+            self.Deliver()
+        finally:
+            widget.after(interval, self.Attach, widget, interval)
@@ -0,0 +1,162 @@
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import numpy as np
+import scipy.signal
+
+from Utils.AudioProcess import Audio
+from Utils.CandidateDetector import PROPOSALS_GROUP_NAME
+from Utils.DataSetLabel import DataSetLabel
+from Utils.SpectrumStats import SummedAreaTable
+from Config import MATCH_FREQ_TOLERANCE, MATCH_MAX_RESULTS, MATCH_PROCESSES, MATCH_THRESHOLD, MATCH_WORKERS, SPECTRUM_CHUNK_FRAMES
+
+# Audio a worker process attached to, by the buffers of its handle
+attachedAudio: dict[str, Audio] = {}
+
+
+def IsVaried(template: np.ndarray) -> bool:
+    """
+    Check whether a template varies enough for its normalized correlation
+    to be defined, with the tolerance flat placements are skipped with.
+    """
+    return np.sum(np.square(template - template.mean())) > 1e-6 * template.size
+
+
+def CorrelateChunk(
+    audio: Audio,
+    template: np.ndarray,
+    rowSpan: tuple[int, int],
+    firstFrame: int,
+    lastFrame: int,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Normalized cross-correlation of a magnitude spectrum template with the
+    rows rowSpan of the magnitude spectrum of audio, for the template
+    starting at every frame firstFrame to lastFrame (exclusive).
+    Returns the best score of every frame and the row it was found at.
+    """
+    height, width = template.shape
+    image = np.asarray(audio.GetMagnitudeFrames(
+        firstFrame, lastFrame + width - 1)[rowSpan[0]:rowSpan[1]], dtype=np.float32)
+
+    # Zero mean template
+    template = template - template.mean()
+    templateNorm = np.sqrt(np.sum(np.square(template)))
+
+    # A flat template matches nothing, like flat placements
+    if not IsVaried(template):
+        placements = lastFrame - firstFrame
+        return np.zeros(placements, dtype=np.float32), np.full(placements, rowSpan[0])
+
+    # Correlation of every placement, the template mean being zero
+    numerator = scipy.signal.fftconvolve(image, template[::-1, ::-1], mode="valid")
+
+    # Sums of the image and its square under every placement
+    def BoxSums(array: np.ndarray) -> np.ndarray:
+        table = SummedAreaTable(array).table
+        return table[height:, width:] - table[:-height, width:] - \
+            table[height:, :-width] + table[:-height, :-width]
+    area = height * width
+    variance = BoxSums(np.square(image)) - np.square(BoxSums(image)) / area
+
+    # Flat placements match nothing
+    scores = np.zeros_like(numerator)
+    valid = variance > 1e-6 * area
+    scores[valid] = numerator[valid] / (np.sqrt(variance[valid]) * templateNorm)
+
+    return scores.max(axis=0), scores.argmax(axis=0) + rowSpan[0]
+
+
+def CorrelateSharedChunk(
+    handle: dict,
+    template: np.ndarray,
+    rowSpan: tuple[int, int],
+    firstFrame: int,
+    lastFrame: int,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    CorrelateChunk in a worker process, on the audio of a handle from
+    Audio.ShareBuffers. The worker attaches to the audio once.
+    """
+    key = repr((handle["arrays"], handle["audioFilePath"]))
+    audio = attachedAudio.get(key)
+    if audio is None:
+        attachedAudio.clear()
+        audio = Audio(nFft=handle["nFft"])
+        audio.LoadShared(handle)
+        attachedAudio[key] = audio
+    return CorrelateChunk(audio, template, rowSpan, firstFrame, lastFrame)
+
+
+def MatchTemplate(
+    audio: Audio,
+    template: np.ndarray,
+    freqSpan: tuple[int, int],
+    excludeFrame: int = None,
+    groupName: str = PROPOSALS_GROUP_NAME,
+    freqTolerance: int = MATCH_FREQ_TOLERANCE,
+    threshold: float = MATCH_THRESHOLD,
+    maxResults: int = MATCH_MAX_RESULTS,
+    chunkFrames: int = SPECTRUM_CHUNK_FRAMES,
+    workers: int = MATCH_WORKERS,
+    useProcesses: bool = MATCH_PROCESSES,
+) -> list[DataSetLabel]:
+    """
+    Find the repeats of a magnitude spectrum template taken from the bins
+    freqSpan of audio, allowing freqTolerance bins of frequency shift.
+    Chunks of the spectrum are correlated on a thread pool, or on a process
+    pool attached to the shared buffers of audio if useProcesses. Matches within
+    a template width of excludeFrame, where the template was taken, are
+    skipped. Returns labels ranked by decreasing correlation.
+    """
+    height, width = template.shape
+    freqHeight = audio.nFft // 2 + 1
+    placements = audio.GetSpectrumFrameCount() - width + 1
+    if placements <= 0:
+        return []
+    rowSpan = (
+        max(freqSpan[0] - freqTolerance, 0),
+        min(freqSpan[0] + height + freqTolerance, freqHeight)
+    )
+    template = np.asarray(template, dtype=np.float32)
+    # A flat template has no defined correlation
+    if template.size == 0 or not IsVaried(template):
+        return []
+
+    # Correlate the chunks in parallel, the FFTs release the GIL, and the
+    # worker processes read the audio from its shared buffers
+    if useProcesses:
+        executor = ProcessPoolExecutor(max_workers=workers)
+        Correlate = CorrelateSharedChunk
+        source = audio.ShareBuffers()
+    else:
+        executor = ThreadPoolExecutor(max_workers=workers)
+        Correlate = CorrelateChunk
+        source = audio
+    with executor:
+        futures = [
+            executor.submit(
+                Correlate, source, template, rowSpan,
+                firstFrame, min(firstFrame + chunkFrames, placements))
+            for firstFrame in range(0, placements, chunkFrames)
+        ]
+        results = [future.result() for future in futures]
+    scores = np.concatenate([result[0] for result in results])
+    rows = np.concatenate([result[1] for result in results])
+
+    # Best placements at least a template width apart
+    peaks, _ = scipy.signal.find_peaks(scores, height=threshold, distance=width)
+    if excludeFrame is not None:
+        peaks = peaks[np.abs(peaks - excludeFrame) >= width]
+    peaks = peaks[np.argsort(scores[peaks])[::-1][:maxResults]]
+
+    frameSeconds = audio.hopLength / audio.sampleRate
+    binFreq = audio.sampleRate / audio.nFft
+    return [
+        DataSetLabel(
+            groupName,
+            peak * frameSeconds,
+            (peak + width) * frameSeconds,
+            rows[peak] * binFreq,
+            (rows[peak] + height) * binFreq,
+        )
+        for peak in peaks
+    ]
@@ -0,0 +1,293 @@
+import hashlib
+import os
+import shutil
+import numpy as np
+
+from Utils import AudioCache
+from Utils.AudioProcess import Audio
+from Utils.DataSetLabel import DataSetLabel
+from Config import ANALYSIS_SAMPLE_RATE, TRAINING_PATCH_SHAPE, TRAINING_SHARD_LABELS
+
+# Subdirectory of the shards and entry of the index of a training set
+SHARDS_DIR_NAME = "shards"
+INDEX_DIR_NAME = "index"
+# Columns describing every label, in the shards and in the index
+LABEL_COLUMNS = {
+    "labelId": np.int64,
+    "groupId": np.int32,
+    "sourceId": np.int32,
+    "startTime": np.float64,
+    "endTime": np.float64,
+    "startFreq": np.float64,
+    "endFreq": np.float64,
+}
+
+
+def FlattenLabels(
+    labelGroups: dict[str, list[DataSetLabel]],
+    defaultSourceFile: str = None,
+) -> tuple[dict[str, np.ndarray], list[str], list[str]]:
+    """
+    Gather labels by group name into columns. The id of a label is its
+    position in the label file. Labels without a source file are taken from
+    defaultSourceFile, or left out if it is None.
+    Returns the columns, the group names and the source files their ids
+    refer to.
+    """
+    groupNames = list(labelGroups)
+    sourceFiles = []
+    sourceIds = {}
+    columns = {name: [] for name in LABEL_COLUMNS}
+
+    labelId = 0
+    for groupId, labels in enumerate(labelGroups.values()):
+        for label in labels:
+            sourceFile = label.sourceFile or defaultSourceFile
+            if sourceFile is not None:
+                sourceFile = os.path.abspath(sourceFile)
+                if sourceFile not in sourceIds:
+                    sourceIds[sourceFile] = len(sourceFiles)
+                    sourceFiles.append(sourceFile)
+                columns["labelId"].append(labelId)
+                columns["groupId"].append(groupId)
+                columns["sourceId"].append(sourceIds[sourceFile])
+                columns["startTime"].append(label.startTime)
+                columns["endTime"].append(label.endTime)
+                columns["startFreq"].append(label.startFreq)
+                columns["endFreq"].append(label.endFreq)
+            labelId += 1
+
+    columns = {
+        name: np.array(values, dtype=LABEL_COLUMNS[name])
+        for name, values in columns.items()
+    }
+    return columns, groupNames, sourceFiles
+
+
+def SelectLabels(columns: dict[str, np.ndarray], rows: np.ndarray) -> dict[str, np.ndarray]:
+    """
+    Get the rows of the label columns.
+    """
+    return {name: column[rows] for name, column in columns.items()}
+
+
+def LabelSpans(
+    labels: dict[str, np.ndarray],
+    sampleRate: int,
+    nFft: int,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Convert the boxes of the labels to spans of samples, spectrum frames
+    and frequency bins, all of at least one element.
+    Returns arrays of shape (labels, 2) of the first and last (exclusive)
+    sample, frame and bin of every label.
+    """
+    hopLength = nFft // 4
+    binCount = nFft // 2 + 1
+
+    # Samples covered by the labels
+    startSamples = np.floor(labels["startTime"] * sampleRate).astype(np.int64)
+    endSamples = np.maximum(
+        np.ceil(labels["endTime"] * sampleRate).astype(np.int64), startSamples + 1)
+
+    # Centered frames of the samples
+    firstFrames = np.floor(startSamples / hopLength).astype(np.int64)
+    lastFrames = np.maximum(np.ceil(endSamples / hopLength).astype(np.int64), firstFrames + 1)
+
+    # Bins of the frequencies, within the spectrum
+    binFreq = sampleRate / nFft
+    firstBins = np.clip(np.floor(labels["startFreq"] / binFreq), 0, binCount - 1).astype(np.int64)
+    lastBins = np.clip(np.ceil(labels["endFreq"] / binFreq) + 1, firstBins + 1, binCount).astype(np.int64)
+
+    return (
+        np.stack((startSamples, endSamples), axis=1),
+        np.stack((firstFrames, lastFrames), axis=1),
+        np.stack((firstBins, lastBins), axis=1),
+    )
+
+
+def ResizePatch(patch: np.ndarray, shape: tuple[int, int]) -> np.ndarray:
+    """
+    Resize a spectrogram patch to shape by bilinear interpolation.
+    """
+    resized = patch.astype(np.float32, copy=False)
+    for axis, size in enumerate(shape):
+        length = resized.shape[axis]
+        # Positions of the output samples in the input
+        positions = np.linspace(0, length - 1, size)
+        lower = np.floor(positions).astype(np.int64)
+        upper = np.minimum(lower + 1, length - 1)
+        weights = (positions - lower).astype(np.float32)
+        if axis == 0:
+            weights = weights[:, np.newaxis]
+        resized = (
+            np.take(resized, lower, axis=axis) * (1 - weights)
+            + np.take(resized, upper, axis=axis) * weights
+        )
+    return resized
+
+
+def CutShard(
+    audio: Audio,
+    labels: dict[str, np.ndarray],
+    patchShape: tuple[int, int] = TRAINING_PATCH_SHAPE,
+    withClips: bool = True,
+) -> dict[str, np.ndarray]:
+    """
+    Cut the magnitude spectrogram patches and the audio clips of labels out
+    of an audio. Patches are resized to patchShape, or kept at their size
+    if it is None and stored flat with their offsets and shapes. Clips are
+    stored flat with their offsets.
+    Returns the arrays of the shard, including the label columns.
+    """
+    sampleSpans, frameSpans, binSpans = LabelSpans(labels, audio.sampleRate, audio.nFft)
+    labelCount = len(sampleSpans)
+
+    arrays = dict(labels)
+    if patchShape is not None:
+        patches = np.zeros((labelCount, *patchShape), dtype=np.float32)
+    else:
+        patches = []
+    for i in range(labelCount):
+        patch = audio.GetMagnitudeFrames(frameSpans[i, 0], frameSpans[i, 1])
+        patch = patch[binSpans[i, 0]:binSpans[i, 1]]
+        # Frames past the end of the audio are zero
+        if patch.shape[1] < frameSpans[i, 1] - frameSpans[i, 0]:
+            patch = np.pad(patch, ((0, 0), (0, frameSpans[i, 1] - frameSpans[i, 0] - patch.shape[1])))
+        if patchShape is not None:
+            patches[i] = ResizePatch(patch, patchShape)
+        else:
+            patches.append(np.asarray(patch, dtype=np.float32))
+
+    if patchShape is not None:
+        arrays["patches"] = patches
+    else:
+        arrays["patchShapes"] = np.array(
+            [patch.shape for patch in patches], dtype=np.int64).reshape(labelCount, 2)
+        arrays["patchOffsets"] = np.concatenate((
+            [0], np.cumsum(np.prod(arrays["patchShapes"], axis=1)))).astype(np.int64)
+        arrays["patches"] = np.concatenate(
+            [patch.ravel() for patch in patches] + [np.zeros(0, dtype=np.float32)])
+
+    if withClips:
+        clips = [
+            audio.ReadFrames(sampleSpans[i, 0], sampleSpans[i, 1] - sampleSpans[i, 0])
+            for i in range(labelCount)
+        ]
+        arrays["clipOffsets"] = np.concatenate((
+            [0], np.cumsum([len(clip) for clip in clips]))).astype(np.int64)
+        arrays["clips"] = np.concatenate(
+            [np.asarray(clip, dtype=np.float32) for clip in clips] + [np.zeros(0, dtype=np.float32)])
+
+    return arrays
+
+
+def ExportFile(
+    sourceFile: str,
+    labels: dict[str, np.ndarray],
+    outputDir: str,
+    nFft: int = 512,
+    sampleRate: int = ANALYSIS_SAMPLE_RATE,
+    patchShape: tuple[int, int] = TRAINING_PATCH_SHAPE,
+    withClips: bool = True,
+    shardLabels: int = TRAINING_SHARD_LABELS,
+) -> list[dict]:
+    """
+    Cut the labels of a source file into shards of at most shardLabels
+    labels, in time order so the file is read front to back. Shards are
+    named after the file, its labels and the settings, so shards written
+    by an earlier export are kept. Returns the metadata of the shards.
+    """
+    # Stream through the file in time order
+    order = np.lexsort((labels["labelId"], labels["startTime"]))
+    labels = SelectLabels(labels, order)
+
+    labelsHash = hashlib.sha1()
+    for name in LABEL_COLUMNS:
+        labelsHash.update(np.ascontiguousarray(labels[name]).tobytes())
+    fileKey = AudioCache.GetCacheKey(
+        sourceFile, "training", nFft, sampleRate, patchShape, withClips, shardLabels,
+        labelsHash.hexdigest())
+
+    audio = None
+    shards = []
+    for shardIndex, firstRow in enumerate(range(0, len(order), shardLabels)):
+        shardName = f"{fileKey}-{shardIndex:05d}"
+        shardPath = os.path.join(outputDir, SHARDS_DIR_NAME, shardName)
+        if AudioCache.IsCached(shardPath):
+            shards.append(AudioCache.ReadMetadata(shardPath))
+            continue
+
+        # Open the file once the first shard is missing
+        if audio is None:
+            audio = Audio(nFft=nFft)
+            audio.LoadAudio(sourceFile, downmix=True, targetSampleRate=sampleRate, lazy=True)
+
+        shardLabelColumns = SelectLabels(labels, slice(firstRow, firstRow + shardLabels))
+        shards.append(AudioCache.WriteCache(
+            shardPath,
+            CutShard(audio, shardLabelColumns, patchShape, withClips),
+            {
+                "name": shardName,
+                "sourceFile": sourceFile,
+                "labels": len(shardLabelColumns["labelId"]),
+                "sampleRate": audio.sampleRate,
+                "nFft": nFft,
+                "patchShape": patchShape,
+            }
+        ))
+
+    if audio is not None:
+        audio.CloseAudio()
+    return shards
+
+
+def WriteIndex(
+    shards: list[dict],
+    columns: dict[str, np.ndarray],
+    groupNames: list[str],
+    sourceFiles: list[str],
+    outputDir: str,
+    settings: dict,
+) -> dict:
+    """
+    Write the index of a training set: the label columns in label id order
+    with the shard and row of every label. Shards not in the index are left
+    from earlier exports and are removed. Returns the metadata of the index.
+    """
+    shardIds = np.full(len(columns["labelId"]), -1, dtype=np.int32)
+    shardRows = np.full(len(columns["labelId"]), -1, dtype=np.int32)
+    for shardId, shard in enumerate(shards):
+        _, shardArrays = AudioCache.ReadCache(
+            os.path.join(outputDir, SHARDS_DIR_NAME, shard["name"]))
+        # Label ids are sorted, as labels are numbered in file order
+        positions = np.searchsorted(columns["labelId"], shardArrays["labelId"])
+        shardIds[positions] = shardId
+        shardRows[positions] = np.arange(len(positions))
+
+    # Only keep the labels of the shards that were written
+    exported = shardIds >= 0
+    arrays = SelectLabels(columns, exported)
+    arrays["shard"] = shardIds[exported]
+    arrays["row"] = shardRows[exported]
+
+    metadata = AudioCache.WriteCache(
+        os.path.join(outputDir, INDEX_DIR_NAME),
+        arrays,
+        {
+            "labels": int(np.sum(exported)),
+            "groupNames": groupNames,
+            "sourceFiles": sourceFiles,
+            "shards": [shard["name"] for shard in shards],
+            "settings": settings,
+        }
+    )
+
+    # Remove the shards of earlier exports
+    shardNames = set(metadata["shards"])
+    shardsDir = os.path.join(outputDir, SHARDS_DIR_NAME)
+    for shardName in os.listdir(shardsDir) if os.path.isdir(shardsDir) else []:
+        if shardName not in shardNames:
+            shutil.rmtree(os.path.join(shardsDir, shardName), ignore_errors=True)
+
+    return metadata
@@ -1,22 +1,134 @@
+# This script split multichannel audio files into one file per channel.
+import argparse
 import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import soundfile as sf
 
+from Utils.AudioReader import AUDIO_EXTENSIONS, FindAudioFiles
+
 # Target file path
 TARGET_FILE_NAME = "sample.wav"
 targetFilePath = os.path.join(os.getcwd(), "data", TARGET_FILE_NAME)
 
-# Read audio file
-data, sampleRate = sf.read(targetFilePath)
-print(f"data shape: {data.shape}")
-
-# Check if the audio has multiple channels
-if data.shape[1] > 1:
-    # Split the audio into multiple channels
-    for i in range(data.shape[1]):
-        # Create a new file name
-        newFileName = f"{TARGET_FILE_NAME}_chan{i}.wav"
-        # Create a new file path
-        newFilePath = os.path.join(os.getcwd(), "data", newFileName)
-        # Write the audio to the new file path
-        sf.write(newFilePath, data[:, i], sampleRate)
-        print(f"{newFileName} is created")
+# Frames read per block
+BLOCK_SIZE = 65536
+# Extensions of the audio files found in directories, without MP3 as the
+# channels are written in the format of the file
+SPLIT_EXTENSIONS = tuple(extension for extension in AUDIO_EXTENSIONS if extension != ".mp3")
+
+
+def GetBlockDtype(subtype: str) -> str:
+    """
+    Get the sample type to read blocks in without converting the subtype.
+    """
+    if subtype == "DOUBLE":
+        return "float64"
+    if subtype == "FLOAT":
+        return "float32"
+    # PCM up to 32 bits fits in int32 without loss
+    if subtype.startswith("PCM"):
+        return "int32"
+    return "float32"
+
+
+def ExpandPaths(paths: list[str]) -> list[str]:
+    """
+    Expand directories into the audio files they contain.
+    """
+    audioFiles = []
+    for path in paths:
+        if not os.path.isdir(path):
+            audioFiles.append(path)
+            continue
+        audioFiles.extend(FindAudioFiles(path, SPLIT_EXTENSIONS))
+    return audioFiles
+
+
+def SplitChannels(filePath: str, outputDir: str = None) -> list[str]:
+    """
+    Split an audio file into one file per channel, reading it block by block.
+    Returns the paths of the created files.
+    """
+    if outputDir is None:
+        outputDir = os.path.dirname(filePath)
+    os.makedirs(outputDir or ".", exist_ok=True)
+    fileName = os.path.basename(filePath)
+    extension = os.path.splitext(fileName)[1]
+
+    with sf.SoundFile(filePath) as inputFile:
+        # Check if the audio has multiple channels
+        if inputFile.channels < 2:
+            return []
+
+        # Open one output per channel with the same format and subtype
+        newFilePaths = [
+            os.path.join(outputDir, f"{fileName}_chan{i}{extension}")
+            for i in range(inputFile.channels)
+        ]
+        outputFiles = []
+        try:
+            for newFilePath in newFilePaths:
+                outputFiles.append(sf.SoundFile(
+                    newFilePath, "w",
+                    samplerate=inputFile.samplerate,
+                    channels=1,
+                    subtype=inputFile.subtype,
+                    format=inputFile.format,
+                    endian=inputFile.endian
+                ))
+
+            # Write every block to all channel outputs in a single pass
+            for block in inputFile.blocks(
+                blocksize=BLOCK_SIZE,
+                dtype=GetBlockDtype(inputFile.subtype),
+                always_2d=True
+            ):
+                for i, outputFile in enumerate(outputFiles):
+                    outputFile.write(block[:, i])
+        except BaseException:
+            # Remove incomplete outputs
+            for outputFile in outputFiles:
+                outputFile.close()
+            for newFilePath in newFilePaths:
+                if os.path.exists(newFilePath):
+                    os.remove(newFilePath)
+            raise
+        finally:
+            for outputFile in outputFiles:
+                outputFile.close()
+
+    return newFilePaths
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Split multichannel audio files into one file per channel.")
+    parser.add_argument("paths", nargs="*", default=[targetFilePath],
+                        help="Audio files or directories to split")
+    parser.add_argument("--output-dir", default=None,
+                        help="Directory of the channel files, defaults to the input directory")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="Number of files split in parallel")
+    args = parser.parse_args()
+
+    audioFiles = ExpandPaths(args.paths)
+    print(f"Found {len(audioFiles)} audio files")
+
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = {
+            executor.submit(SplitChannels, file, args.output_dir): file
+            for file in audioFiles
+        }
+        for future in as_completed(futures):
+            file = futures[future]
+            try:
+                newFilePaths = future.result()
+            except Exception as e:
+                print(f"Failed to split {file}: {e}")
+                continue
+            for newFilePath in newFilePaths:
+                print(f"{os.path.basename(newFilePath)} is created")
+
+
+if __name__ == "__main__":
+    main()
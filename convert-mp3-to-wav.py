@@ -1,25 +1,196 @@
-# This script convert all mp3 files in a directory to wav files.
+# This script convert all mp3 files in a directory tree to wav files.
+import argparse
+import json
 import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pydub import AudioSegment
 
 # Target directory
 TARGET_DIR = "data"
+# Manifest of converted files, used to resume interrupted runs
+MANIFEST_FILE_NAME = ".mp3-to-wav-manifest.json"
+# Seconds between two progress reports
+PROGRESS_INTERVAL = 2.0
 
-# Get all files in target directory
-fileList = os.listdir(TARGET_DIR)
-# Find all mp3 files
-mp3Files = [file for file in fileList if file.endswith(".mp3")]
-# Construct full path for each mp3 file
-mp3Files = [os.path.join(TARGET_DIR, file) for file in mp3Files]
-
-print(f"Found {len(mp3Files)} mp3 files")
-
-# Convert all mp3 files to wav files
-for file in mp3Files:
-    print(f"Converting {file} to wav...")
-    # Read mp3 file
-    audio = AudioSegment.from_mp3(os.path.join(os.getcwd(), file))
-    # Write wav file
-    audio.export(file.replace(".mp3", ".wav"), format="wav")
-    # Remove mp3 file
-    os.remove(file)
+
+def FindMp3Files(targetDir: str) -> list[str]:
+    """
+    Find all mp3 files under the target directory.
+    """
+    mp3Files = []
+    for dirPath, dirNames, fileNames in os.walk(targetDir):
+        dirNames.sort()
+        for fileName in sorted(fileNames):
+            if fileName.lower().endswith(".mp3"):
+                mp3Files.append(os.path.join(dirPath, fileName))
+    return mp3Files
+
+
+def GetWavPath(mp3Path: str) -> str:
+    """
+    Get the output wav path of a mp3 file.
+    """
+    return os.path.splitext(mp3Path)[0] + ".wav"
+
+
+def GetSignature(path: str) -> dict:
+    """
+    Get the size and modification time of a file.
+    """
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime": stat.st_mtime}
+
+
+def IsUpToDate(mp3Path: str, manifest: dict) -> bool:
+    """
+    Check if the wav file of a mp3 file is newer than the mp3 file.
+    """
+    wavPath = GetWavPath(mp3Path)
+    if not os.path.exists(wavPath):
+        return False
+
+    mp3Signature = GetSignature(mp3Path)
+    wavSignature = GetSignature(wavPath)
+
+    # Converted by a previous run
+    entry = manifest.get(mp3Path)
+    if entry is not None:
+        return entry["mp3"] == mp3Signature and entry["wav"] == wavSignature
+
+    # Converted by other means
+    return wavSignature["size"] > 0 and wavSignature["mtime"] >= mp3Signature["mtime"]
+
+
+def ConvertFile(mp3Path: str) -> tuple[str, float, int]:
+    """
+    Convert a mp3 file to a wav file next to it.
+    Returns the mp3 path, the audio length in seconds and the wav size.
+    """
+    wavPath = GetWavPath(mp3Path)
+    # Write to a temporary file and rename it once complete
+    tempPath = wavPath + ".tmp"
+    try:
+        audio = AudioSegment.from_mp3(mp3Path)
+        audio.export(tempPath, format="wav")
+        os.replace(tempPath, wavPath)
+    except BaseException:
+        if os.path.exists(tempPath):
+            os.remove(tempPath)
+        raise
+
+    return mp3Path, audio.duration_seconds, os.path.getsize(wavPath)
+
+
+def LoadManifest(manifestPath: str) -> dict:
+    """
+    Load the manifest of converted files.
+    """
+    if not os.path.exists(manifestPath):
+        return {}
+    with open(manifestPath, "r") as file:
+        return json.load(file)
+
+
+def SaveManifest(manifestPath: str, manifest: dict) -> None:
+    """
+    Save the manifest of converted files atomically.
+    """
+    tempPath = manifestPath + ".tmp"
+    with open(tempPath, "w") as file:
+        json.dump(manifest, file, indent=4)
+    os.replace(tempPath, manifestPath)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Convert all mp3 files in a directory tree to wav files.")
+    parser.add_argument("targetDir", nargs="?", default=TARGET_DIR,
+                        help="Directory searched recursively for mp3 files")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="Number of conversion processes")
+    parser.add_argument("--keep-source", action="store_true",
+                        help="Keep the mp3 files after conversion")
+    parser.add_argument("--manifest", default=None,
+                        help="Manifest path, defaults to the target directory")
+    args = parser.parse_args()
+
+    manifestPath = args.manifest
+    if manifestPath is None:
+        manifestPath = os.path.join(args.targetDir, MANIFEST_FILE_NAME)
+    manifest = LoadManifest(manifestPath)
+
+    # Find all mp3 files
+    mp3Files = FindMp3Files(args.targetDir)
+    print(f"Found {len(mp3Files)} mp3 files")
+
+    # Skip files already converted
+    upToDateFiles = {file for file in mp3Files if IsUpToDate(file, manifest)}
+    pendingFiles = [file for file in mp3Files if file not in upToDateFiles]
+    print(f"{len(upToDateFiles)} files are up to date")
+
+    # Remove the sources left by a run interrupted between writing a wav
+    # file and removing its mp3 file
+    if not args.keep_source and len(upToDateFiles) > 0:
+        for file in sorted(upToDateFiles):
+            os.remove(file)
+            manifest.pop(file, None)
+        SaveManifest(manifestPath, manifest)
+        print(f"Removed {len(upToDateFiles)} converted mp3 files")
+
+    if len(pendingFiles) == 0:
+        return
+
+    startTime = time.time()
+    lastReportTime = startTime
+    convertedCount = 0
+    failedCount = 0
+    audioSeconds = 0.0
+    writtenBytes = 0
+
+    # Convert all mp3 files to wav files
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = {executor.submit(ConvertFile, file): file for file in pendingFiles}
+        for future in as_completed(futures):
+            file = futures[future]
+            try:
+                _, duration, wavSize = future.result()
+            except Exception as e:
+                failedCount += 1
+                print(f"Failed to convert {file}: {e}")
+                continue
+
+            # Record the conversion before touching the source
+            manifest[file] = {
+                "mp3": GetSignature(file),
+                "wav": GetSignature(GetWavPath(file)),
+            }
+            convertedCount += 1
+            audioSeconds += duration
+            writtenBytes += wavSize
+
+            # Remove mp3 file
+            if not args.keep_source:
+                os.remove(file)
+                del manifest[file]
+
+            # Report the progress and checkpoint the manifest
+            currTime = time.time()
+            if currTime - lastReportTime >= PROGRESS_INTERVAL:
+                lastReportTime = currTime
+                SaveManifest(manifestPath, manifest)
+                elapsed = currTime - startTime
+                print(
+                    f"{convertedCount + failedCount}/{len(pendingFiles)} files, "
+                    f"{convertedCount / elapsed:.1f} files/s, "
+                    f"{audioSeconds / elapsed:.1f}x realtime, "
+                    f"{writtenBytes / elapsed / 1e6:.1f} MB/s"
+                )
+
+    SaveManifest(manifestPath, manifest)
+    elapsed = time.time() - startTime
+    print(f"Converted {convertedCount} files in {elapsed:.1f}s, {failedCount} failed")
+
+
+if __name__ == "__main__":
+    main()
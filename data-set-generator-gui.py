@@ -4,7 +4,6 @@ import os
 import platform
 from tkinter import messagebox
 import librosa
-import threading
 from time import sleep, time
 from timeit import timeit
 from matplotlib import pyplot as plt
@@ -17,13 +16,32 @@ from tkinter import ttk
 from tkinter import filedialog
 
 import numpy as np
-from Config import FIG_DPI, MAX_AUDIO_LENGTH, MIN_AUDIO_LENGTH
-
-from Utils.AudioPlot import AudioMagnitudePlot, AudioSpectrumPlot
-from Utils.AudioProcess import Audio, AudioPlayer
+from Config import CACHE_DIR, FIG_DPI, FINGERPRINT_INDEX_DIR, MAX_AUDIO_LENGTH, MIN_AUDIO_LENGTH, PREFETCH_LEAD_TIME
+from Config import PROFILER_STATUS_INTERVAL
+
+from Utils import AudioCache
+from Utils.AudioPlot import AudioMagnitudePlot, AudioOverviewPlot, AudioSpectrumPlot, LabelBox
+from Utils.AudioPlayer import AudioStreamPlayer
+from Utils.AudioProcess import Audio
+from Utils.CandidateDetector import DetectCandidates
 from Utils.DataSetLabel import DataSetLabel
 from Utils.DataSetLabelInspector import DataSetLabelsInspector
 from Utils.FFTInspector import FFTDetailInspector
+from Utils.FingerprintIndex import CORPUS_DIR_NAME, FingerprintIndex
+from Utils.MemoryBudget import memoryBudget
+from Utils.OverviewSummary import LoadOverview
+from Utils.Profiler import Timed, profiler
+from Utils.TaskScheduler import ANALYSIS_PRIORITY, PREFETCH_PRIORITY, TaskScheduler, TaskToken
+from Utils.TemplateMatcher import MatchTemplate
+
+# Keys of the background tasks, a task supersedes the previous task of its key
+OPEN_TASK = "open"
+WINDOW_TASK = "window"
+PREFETCH_TASK = "prefetch"
+OVERVIEW_TASK = "overview"
+DETECT_TASK = "detect"
+MATCH_TASK = "match"
+SEARCH_TASK = "search"
 
 
 class App(ttk.Frame):
@@ -40,14 +58,30 @@ class App(ttk.Frame):
         self.currOffset = 0
         # Main audio and player.
         self.mainAudio: Audio = Audio()
-        self.mainAudioPlayer: AudioPlayer = None
+        self.mainAudioPlayer: AudioStreamPlayer = None
+        # Next window loaded in the background while streaming.
+        self.prefetchOffsetFrame: int = None
+        self.prefetchToken: TaskToken = None
+        # Prefetch the main audio is being advanced to
+        self.advanceToken: TaskToken = None
+        # Frame and bin spans of the selected spectrum region
+        self.selectedSpans: tuple[tuple[int, int], tuple[int, int]] = None
 
         # Status text
         self.status = tk.StringVar()
         self.status.set("Status: Ready")
-        # Loading status
-        self.loadingStatus = False
+        # Last timings of the slowest stages while profiling
+        self.profileStatus = tk.StringVar()
+        # Background tasks, their progress and results are delivered on the Tk thread
+        self.scheduler: TaskScheduler = TaskScheduler(
+            onProgress=self.ShowProgress, onIdle=self.ShowReady)
+        self.scheduler.Attach(self)
         # Matplotlib figure
+        self.overviewFig, self.overviewAx = plt.subplots()
+        self.overviewFig.set_figheight(0.6)
+        self.overviewFig.set_dpi(FIG_DPI)
+        self.overviewFig.subplots_adjust(left=0.01, right=0.99, top=1, bottom=0)
+        self.overviewCanvas = FigureCanvasTkAgg(self.overviewFig, self)
         self.magFig, self.magAx = plt.subplots()
         self.magFig.set_figheight(2)
         self.magFig.set_dpi(FIG_DPI)
@@ -58,10 +92,13 @@ class App(ttk.Frame):
         self.fftFig.tight_layout()
         self.fftCanvas = FigureCanvasTkAgg(self.fftFig, self)
         # Audio plot
+        self.audioOverviewPlot = AudioOverviewPlot(
+            self.rootAudio, self.overviewAx, self.overviewCanvas, self.OverviewSeek)
         self.audioMagnitudePlot = AudioMagnitudePlot(
             self.mainAudio, self.magAx, self.magCanvas)
         self.audioSpectrumPlot = AudioSpectrumPlot(
-            self.mainAudio, self.fftAx, self.fftCanvas, self.SpectrumSelected)
+            self.mainAudio, self.fftAx, self.fftCanvas, self.SpectrumSelected,
+            self.SpectrumDragged)
 
         # FFT contrast control
         self.fftContrastCurveFig, self.fftContrastCurveAx = plt.subplots()
@@ -148,6 +185,8 @@ class App(ttk.Frame):
         self.fftToolbar = NavigationToolbar2Tk(self.fftCanvas, toolBarFrame)
         self.fftToolbar.update()
 
+        self.overviewCanvas.draw()
+        self.overviewCanvas.get_tk_widget().pack(side=tk.TOP, fill=tk.X, expand=False)
         self.magCanvas.draw()
         self.magCanvas.get_tk_widget().pack(side=tk.TOP, fill=tk.BOTH, expand=False)
         self.fftCanvas.draw()
@@ -209,6 +248,7 @@ class App(ttk.Frame):
 
         self.fftInspector = FFTDetailInspector(
             onAddToCurrLabelGroup=self.AddToCurrLabelGroup,
+            onFindSimilar=self.FindSimilar,
             master=self.rightFrame
         )
         self.fftInspector.pack(side=tk.TOP, fill=tk.BOTH, expand=True)
@@ -231,6 +271,9 @@ class App(ttk.Frame):
         # Status bar
         statusBar = ttk.Label(self.bottomFrame, textvariable=self.status)
         statusBar.pack(side=BOTTOM, anchor=W)
+        profileStatusBar = ttk.Label(self.bottomFrame, textvariable=self.profileStatus)
+        profileStatusBar.pack(side=BOTTOM, anchor=W)
+        self.UpdateProfileStatus()
 
     def MenuBar(self):
         """
@@ -240,6 +283,7 @@ class App(ttk.Frame):
         fileMenu = tk.Menu(self.menuBar, tearoff=0)
         playMenu = tk.Menu(self.menuBar, tearoff=0)
         spectrogramMenu = tk.Menu(self.menuBar, tearoff=0)
+        profileMenu = tk.Menu(self.menuBar, tearoff=0)
 
         # File menu
         if platform.system() == "Darwin":
@@ -250,6 +294,8 @@ class App(ttk.Frame):
             fileMenu.add_command(label="Open (Ctrl + O)",
                                  command=self.SelectFile)
             self.master.bind("<Control-o>", self.SelectFile)
+        fileMenu.add_command(label="Open Preprocessed...",
+                             command=self.SelectPreprocessedFile)
 
         if platform.system() == "Darwin":
             fileMenu.add_checkbutton(
@@ -288,109 +334,276 @@ class App(ttk.Frame):
             spectrogramMenu.add_command(
                 label="Label Spectrogram (Ctrl + L)", command=self.AddToCurrLabelGroup)
             self.master.bind("<Control-l>", self.AddToCurrLabelGroup)
+        spectrogramMenu.add_command(
+            label="Detect Candidates", command=self.DetectCandidates)
+        spectrogramMenu.add_command(
+            label="Search Corpus...", command=self.SearchCorpus)
 
         self.menuBar.add_cascade(label="File", menu=fileMenu)
         self.menuBar.add_cascade(label="Play", menu=playMenu)
         self.menuBar.add_cascade(label="Spectrogram", menu=spectrogramMenu)
 
+        # Profile menu
+        self.profilingEnabled = tk.BooleanVar(value=profiler.enabled)
+        profileMenu.add_checkbutton(
+            label="Enable Profiling", variable=self.profilingEnabled,
+            command=lambda: profiler.SetEnabled(self.profilingEnabled.get()))
+        profileMenu.add_command(
+            label="Show Summary", command=self.ShowProfileSummary)
+        profileMenu.add_command(
+            label="Export Trace...", command=self.ExportProfileTrace)
+        profileMenu.add_command(label="Reset", command=profiler.Reset)
+        profileMenu.add_separator()
+        profileMenu.add_command(
+            label="Show Memory Usage", command=self.ShowMemoryUsage)
+        self.menuBar.add_cascade(label="Profile", menu=profileMenu)
+
     def SelectFile(self, event=None):
         # Get current working directory
         currDir = os.getcwd()
         # Open a file dialog and set the file name in the label
         selectedFileName = filedialog.askopenfilename(initialdir=currDir, title="Select a file",
                                                       filetypes=(
-                                                          ("wav files", "*.wav"),
+                                                          ("audio files", "*.wav *.flac *.ogg *.mp3"),
                                                           ("all files", "*.*")
                                                       ))
         self.openFileName.set(selectedFileName)
 
-        # Run the helper method to load the file
-        loadFileThread = threading.Thread(
-            target=self.SelectFileThread, args=(selectedFileName,))
-        loadFileThread.start()
+        # Load the file in the background
+        self.OpenFile(selectedFileName)
 
-    def SelectFileThread(self, selectedFileName):
+    def SelectPreprocessedFile(self, event=None):
+        """
+        Method to pick a file from the manifest of a preprocessing cache
         """
-        Helper method to select a file
+        # Open a file dialog for the manifest
+        manifestPath = filedialog.askopenfilename(initialdir=os.path.join(os.getcwd(), CACHE_DIR),
+                                                  title="Select a manifest",
+                                                  filetypes=(
+                                                      ("manifest", AudioCache.MANIFEST_FILE_NAME),
+                                                      ("all files", "*.*")
+                                                  ))
+        if manifestPath == "":
+            return
+        entries = AudioCache.ReadManifest(os.path.dirname(manifestPath))
+
+        # List the preprocessed files
+        dialog = tk.Toplevel(self.master)
+        dialog.title("Preprocessed Files")
+        entryList = tk.Listbox(dialog, width=100, height=20)
+        entryList.pack(side=tk.TOP, fill=tk.BOTH, expand=True)
+        for entry in entries:
+            entryList.insert(tk.END, "{0}  {1:.2f}s  {2}Hz  {3}ch".format(
+                entry["audioFilePath"],
+                entry["audioLength"],
+                entry["sampleRate"],
+                entry["channels"]
+            ))
+
+        def OpenEntry(event=None):
+            selection = entryList.curselection()
+            if len(selection) == 0:
+                return
+            entry = entries[selection[0]]
+            dialog.destroy()
+            self.openFileName.set(entry["audioFilePath"])
+
+            # Load the cache in the background
+            self.OpenFile(entry["audioFilePath"], entry["cachePath"])
+
+        entryList.bind("<Double-Button-1>", OpenEntry)
+        openButton = ttk.Button(dialog, text="Open", command=OpenEntry)
+        openButton.pack(side=tk.BOTTOM, fill=tk.X)
+
+    def OpenFile(self, selectedFileName, cachePath=None):
+        """
+        Method to open a file in the background, cancelling every task of
+        the previous file
         """
         # Check selected file name is not empty
         if selectedFileName == "":
             print("No file selected")
             return
 
+        # Stop streaming the previous file
+        self.Pause()
+
+        self.scheduler.CancelAll()
+        self.CancelPrefetch()
+        # The root audio is replaced, no other task may read it meanwhile.
+        # Its own key keeps the window tasks from superseding it
+        self.scheduler.Submit(
+            OPEN_TASK, self.OpenFileJob, selectedFileName, cachePath,
+            exclusive=True, onDone=self.SeekWindow, onError=self.ShowTaskError)
+
+    @Timed("App.OpenFile")
+    def OpenFileJob(self, token: TaskToken, selectedFileName, cachePath=None):
+        """
+        Job target to open a file and load its first window
+        """
         # Set the status to loading
-        self.status.set("Status: Loading...")
+        token.ReportProgress("Loading...")
 
         # Load audio file
-        self.rootAudio.LoadAudio(selectedFileName)
+        if cachePath is not None:
+            self.rootAudio.LoadCache(cachePath)
+        else:
+            # Windows are decoded from the file when they are shown
+            self.rootAudio.LoadAudio(selectedFileName, lazy=True)
         print("Loaded audio file")
         print("Audio length (s): " + str(self.rootAudio.audioLength))
-        print("Audio length (frame): " + str(len(self.rootAudio.audioArray)))
+        print("Audio length (frame): " + str(self.rootAudio.GetFrameCount()))
         print("Audio sample rate: " + str(self.rootAudio.sampleRate))
 
-        # TODO: Get current offset.
-        self.currOffset = 0
-        self.LoadAudioOffsetThread()
+        # Set up the player streaming from the root audio
+        self.mainAudioPlayer = AudioStreamPlayer(
+            self.rootAudio,
+            0.2,
+            self.PostAudioCursor
+        )
 
-        # Set the status to ready
-        self.status.set("Status: Ready")
+        # Summarize the whole file for the overview, once per file
+        self.scheduler.Submit(
+            OVERVIEW_TASK, self.OverviewJob, selectedFileName,
+            priority=PREFETCH_PRIORITY, onDone=self.ShowOverview)
 
-    def LoadAudioOffset(self):
-        # Pause the audio
-        self.Pause()
+        # TODO: Get current offset.
+        return self.LoadOffsetJob(token, 0)
 
-        # Start a thread to load the audio offset
-        loadAudioOffsetThread = threading.Thread(
-            target=self.LoadAudioOffsetThread)
-        loadAudioOffsetThread.start()
+    def OverviewJob(self, token: TaskToken, selectedFileName):
+        """
+        Job target to summarize the whole file
+        """
+        token.ReportProgress("Summarizing...")
+        return LoadOverview(selectedFileName)
 
-    def LoadAudioOffsetThread(self):
+    def ShowOverview(self, overview: tuple[np.ndarray, float]):
+        """
+        Method to show the summary of the whole file
+        """
+        self.audioOverviewPlot.SetOverview(*overview)
+
+    def LoadAudioOffset(self):
         # If root audio is not loaded, return
-        if self.rootAudio.audioArray is None:
+        if self.rootAudio.GetFrameCount() == 0:
             messagebox.showerror("Error", "No audio file loaded")
             return
 
-        # Set the status to loading
-        self.status.set("Status: Slicing audio...")
-
         # Get offsetValue
         try:
-            self.currOffset = float(self.offsetValue.get())
+            offset = float(self.offsetValue.get())
         except ValueError:
             messagebox.showerror("Error", "Offset value is not a number")
-            # Set the status to ready
-            self.status.set("Status: Ready")
             return
+
+        # The window of the file being opened is shown once it is loaded
+        if self.scheduler.IsPending(OPEN_TASK):
+            return
+
+        # Pause the audio
+        self.Pause()
+
+        # Drop the window prefetched for the previous offset
+        self.CancelPrefetch()
+        # Load the window in the background, superseding any pending window
+        self.scheduler.Submit(
+            WINDOW_TASK, self.LoadOffsetJob, offset, onDone=self.SeekWindow)
+
+    @Timed("App.LoadOffset")
+    def LoadOffsetJob(self, token: TaskToken, offset: float):
+        """
+        Job target to load the window starting at offset seconds
+        """
+        # Set the status to loading
+        token.ReportProgress("Slicing audio...")
+
         # Get current audio frame
-        offsetFrame = int(self.currOffset * self.rootAudio.sampleRate)
+        offsetFrame = self.ClampOffsetFrame(int(offset * self.rootAudio.sampleRate))
+
+        return self.LoadWindowJob(token, offsetFrame)
+
+    def ClampOffsetFrame(self, offsetFrame: int) -> int:
+        """
+        Clamp a window offset so the window holds at least MIN_AUDIO_LENGTH
+        seconds, aligned to the STFT hop.
+        """
+        # Max offsetFrame is the length of the audio file
+        if offsetFrame > self.rootAudio.GetFrameCount() - MIN_AUDIO_LENGTH * self.rootAudio.sampleRate:
+            offsetFrame = int(self.rootAudio.GetFrameCount() -
+                              MIN_AUDIO_LENGTH * self.rootAudio.sampleRate)
         # Min offsetFrame is 0
         if offsetFrame < 0:
             offsetFrame = 0
-        # Max offsetFrame is the length of the audio file
-        if offsetFrame > len(self.rootAudio.audioArray) - MIN_AUDIO_LENGTH * self.rootAudio.sampleRate:
-            offsetFrame = int(len(self.rootAudio.audioArray) -
-                              MIN_AUDIO_LENGTH * self.rootAudio.sampleRate)
+        # Align the offset to the STFT hop so overlapping windows share frames
+        offsetFrame -= offsetFrame % self.mainAudio.hopLength
+        return offsetFrame
+
+    @Timed("App.LoadWindow")
+    def LoadWindowJob(self, token: TaskToken, offsetFrame: int):
+        """
+        Job target to load the window of the root audio starting at
+        offsetFrame. Returns the window audio and offsetFrame, None if the
+        task was superseded.
+        """
+        # frames in the window
+        windowFrame = MAX_AUDIO_LENGTH * self.rootAudio.sampleRate
+        # Read only the window frames, the end of the file gives less
+        audioArray = self.rootAudio.ReadFrames(offsetFrame, windowFrame)
+
+        # Skip the spectrum of a window nobody will see
+        if token.IsCancelled():
+            return None
+
+        # Slice the window from the cached spectrum of the whole file
+        if self.rootAudio.fftSpectrum is not None and self.rootAudio.nFft == self.mainAudio.nFft \
+                and offsetFrame % self.rootAudio.hopLength == 0:
+            audio = Audio(nFft=self.rootAudio.nFft)
+            audio.LoadWindow(self.rootAudio, audioArray, offsetFrame)
+            return audio, offsetFrame
+
+        # Start from a copy of the shown window when they overlap, so the
+        # frames they share are moved rather than computed again
+        shownAudio = self.mainAudio
+        if shownAudio.audioArray is not None and shownAudio.startFrame is not None \
+                and abs(offsetFrame - shownAudio.startFrame) < len(shownAudio.audioArray):
+            audio = copy.deepcopy(shownAudio)
+        else:
+            audio = Audio(nFft=shownAudio.nFft)
+        audio.LoadAudioArray(audioArray, self.rootAudio.sampleRate, offsetFrame)
+        return audio, offsetFrame
+
+    def ShowWindow(self, window: tuple[Audio, int]):
+        """
+        Method to show a window loaded in the background as the main audio
+        """
+        if window is None:
+            return
+        self.mainAudio, offsetFrame = window
         self.currOffset = offsetFrame / self.rootAudio.sampleRate
         # Set the offset value in the label
         self.offsetValue.set(self.currOffset)
-        # frames in the window
-        windowFrame = MAX_AUDIO_LENGTH * self.rootAudio.sampleRate
-        # Get current window frames
-        if offsetFrame + windowFrame > len(self.rootAudio.audioArray):
-            windowFrame = len(self.rootAudio.audioArray) - offsetFrame
-        # Load main audio with offset
-        self.mainAudio.LoadAudioArray(
-            self.rootAudio.audioArray[offsetFrame:offsetFrame+windowFrame],
-            self.rootAudio.sampleRate
-        )
 
-        # Set up audio player
-        self.mainAudioPlayer = AudioPlayer(
-            self.mainAudio,
-            0.2,
-            self.UpdateAudioCursor
-        )
+        # Point the plots to the new window
+        self.audioMagnitudePlot.audio = self.mainAudio
+        self.audioSpectrumPlot.audio = self.mainAudio
+        self.PlotWindow()
+
+    def SeekWindow(self, window: tuple[Audio, int]):
+        """
+        Method to show a window loaded in the background and play from its
+        beginning
+        """
+        self.ShowWindow(window)
 
+        # Start playing from the beginning of the window
+        if window is not None and self.mainAudioPlayer is not None:
+            self.mainAudioPlayer.SetPosition(self.currOffset)
+
+    @Timed("App.PlotWindow")
+    def PlotWindow(self) -> None:
+        """
+        Plot the main audio window.
+        """
         # Update plot start time offset
         self.audioMagnitudePlot.startTimeOffset = self.currOffset
         self.audioSpectrumPlot.startTimeOffset = self.currOffset
@@ -398,9 +611,77 @@ class App(ttk.Frame):
         # Plot audio file
         self.audioMagnitudePlot.Plot()
         self.audioSpectrumPlot.Plot(keepLim=False)
+        self.audioOverviewPlot.SetWindow(self.currOffset, self.mainAudio.audioLength)
 
-        # Set the status to ready
-        self.status.set("Status: Ready")
+    def PrefetchNextWindow(self) -> None:
+        """
+        Start loading the window following the main audio in the background.
+        """
+        # The main audio belongs to the previous file while one is opened
+        if self.scheduler.IsPending(OPEN_TASK):
+            return
+
+        # Nothing left to prefetch once the main audio ends with the file
+        windowEndFrame = self.mainAudio.startFrame + len(self.mainAudio.audioArray)
+        if windowEndFrame >= self.rootAudio.GetFrameCount():
+            return
+
+        # A short remainder is shown in a window ending with the file rather
+        # than in a tail, the player position does not depend on it
+        nextOffsetFrame = self.ClampOffsetFrame(windowEndFrame)
+        if nextOffsetFrame <= self.mainAudio.startFrame:
+            return
+        # Already prefetching this window
+        if self.prefetchOffsetFrame == nextOffsetFrame:
+            return
+
+        self.prefetchOffsetFrame = nextOffsetFrame
+        self.prefetchToken = self.scheduler.Submit(
+            PREFETCH_TASK, self.LoadWindowJob, nextOffsetFrame,
+            priority=PREFETCH_PRIORITY)
+
+    def CancelPrefetch(self) -> None:
+        """
+        Drop the window prefetched for the current offset.
+        """
+        self.scheduler.Cancel(PREFETCH_TASK)
+        self.prefetchToken = None
+        self.prefetchOffsetFrame = None
+
+    def AdvanceWindow(self) -> None:
+        """
+        Swap the prefetched window in as the main audio.
+        """
+        self.PrefetchNextWindow()
+        prefetchToken = self.prefetchToken
+        # Nothing to advance to, or already advancing to it
+        if prefetchToken is None or prefetchToken is self.advanceToken:
+            return
+
+        self.advanceToken = prefetchToken
+        self.scheduler.Submit(
+            WINDOW_TASK, self.AdvanceWindowJob, prefetchToken, self.prefetchOffsetFrame,
+            onDone=self.ShowWindow)
+
+    @Timed("App.AdvanceWindow")
+    def AdvanceWindowJob(self, token: TaskToken, prefetchToken: TaskToken, offsetFrame: int):
+        """
+        Job target to get the prefetched window.
+        """
+        # Load the window now rather than wait for a prefetch still queued
+        if self.scheduler.Withdraw(prefetchToken):
+            return self.LoadWindowJob(token, offsetFrame)
+
+        # Wait for the prefetch to finish
+        prefetchToken.Wait()
+        return prefetchToken.result
+
+    def OverviewSeek(self, position: float):
+        """
+        Method to center the window on a time picked in the overview
+        """
+        self.offsetValue.set(max(position - self.mainAudio.audioLength / 2, 0))
+        self.LoadAudioOffset()
 
     def BrightnessSlider(self, value):
         """
@@ -430,6 +711,10 @@ class App(ttk.Frame):
         if self.mainAudioPlayer is None:
             return
 
+        # Rewind to the window start once the end of the file is reached
+        if self.mainAudioPlayer.positionFrame >= self.rootAudio.GetFrameCount():
+            self.mainAudioPlayer.SetPosition(self.currOffset)
+
         # Play the audio file
         self.mainAudioPlayer.Play()
 
@@ -453,32 +738,51 @@ class App(ttk.Frame):
         # Set the audio position only if not playing
         if not self.mainAudioPlayer.isPlaying:
             # Set the audio position
-            self.mainAudioPlayer.SetAudioPosition(float(value))
+            self.mainAudioPlayer.SetPosition(
+                self.currOffset + float(value) * self.mainAudio.audioLength)
             # Update the audio cursor
             self.audioMagnitudePlot.SetCursorPosition(
                 float(value) * self.mainAudio.audioLength)
 
-    def UpdateAudioCursor(self, value):
+    def PostAudioCursor(self, value):
         """
-        Method to update the audio cursor
+        Player callback handing the play position over to the Tk thread,
+        where the windows are advanced and the cursor drawn
         """
-        self.audioMagnitudePlot.SetCursorPosition(value)
-        self.audioProgressBar.set(value/self.mainAudio.audioLength)
+        self.after(0, self.UpdateAudioCursor, value)
 
-    def SpectrumSelected(self, startCoord: tuple[float, float], endCoord: tuple[float, float]):
+    def UpdateAudioCursor(self, value):
         """
-        Method to handle the spectrum selected
+        Method to update the audio cursor, on the Tk thread
+        """
+        # Position of the player inside the main audio window
+        windowPosition = value - self.currOffset
+
+        if self.mainAudioPlayer.isPlaying:
+            # Move on to the next window when the player crosses the edge
+            if windowPosition >= self.mainAudio.audioLength:
+                self.AdvanceWindow()
+                windowPosition = value - self.currOffset
+            # Load the next window before the player reaches the edge
+            elif windowPosition >= self.mainAudio.audioLength - PREFETCH_LEAD_TIME:
+                self.PrefetchNextWindow()
+
+        self.audioMagnitudePlot.SetCursorPosition(windowPosition)
+        self.audioProgressBar.set(windowPosition/self.mainAudio.audioLength)
+
+    def SelectionSpans(self, startCoord: tuple[float, float], endCoord: tuple[float, float]):
+        """
+        Method to convert a spectrum selection into frame and bin spans.
+        Returns None if the selection is invalid.
         """
         # Check if the start and end coordinates are valid
         if startCoord is None or endCoord is None:
-            print("Invalid coordinates")
-            return
+            return None
         if startCoord[0] is None or startCoord[1] is None or endCoord[0] is None or endCoord[1] is None:
-            print("Invalid coordinates")
-            return
+            return None
 
         if self.mainAudio is None or self.mainAudio.audioArray is None:
-            return
+            return None
 
         # Construct x coord span
         xSpan = (int(startCoord[0]), int(endCoord[0]))
@@ -487,13 +791,38 @@ class App(ttk.Frame):
 
         # Check if xSpan is out of bounds
         if xSpan[0] < 0 or xSpan[1] > self.mainAudio.fftSpectrum.shape[1]:
-            print("Invalid coordinates")
-            return
+            return None
 
         # Construct y coord span
         ySpan = (int(startCoord[1]), int(endCoord[1]))
         ySpan = sorted(ySpan)
 
+        return xSpan, ySpan
+
+    def SpectrumDragged(self, startCoord: tuple[float, float], endCoord: tuple[float, float]):
+        """
+        Method to update the region statistics while dragging a selection
+        """
+        spans = self.SelectionSpans(startCoord, endCoord)
+        if spans is None:
+            return
+        xSpan, ySpan = spans
+
+        self.fftInspector.SetRegionStatistics(
+            self.mainAudio.GetSpectrumStats().RegionStatistics(xSpan, ySpan))
+
+    @Timed("App.SpectrumSelected")
+    def SpectrumSelected(self, startCoord: tuple[float, float], endCoord: tuple[float, float]):
+        """
+        Method to handle the spectrum selected
+        """
+        spans = self.SelectionSpans(startCoord, endCoord)
+        if spans is None:
+            print("Invalid coordinates")
+            return
+        xSpan, ySpan = spans
+        self.selectedSpans = spans
+
         # Slice the spectrum array
         slicedSpectrum = self.mainAudio.fftSpectrum[ySpan[0]:ySpan[1], xSpan[0]:xSpan[1]]
 
@@ -515,15 +844,10 @@ class App(ttk.Frame):
             freqArr[int(ySpan[0])],
             freqArr[int(ySpan[1])]
         )
+        self.fftInspector.SetRegionStatistics(
+            self.mainAudio.GetSpectrumStats().RegionStatistics(xSpan, ySpan))
 
-        self.fftInspector.fftDetailAudio.ReconstructAudio(
-            self.mainAudio.sampleRate,
-            slicedSpectrum,
-            self.mainAudio.fftSpectrum.shape[0],
-            ySpan
-        )
-
-        self.fftInspector.fftDetailAudioPlayer.Play()
+        self.fftInspector.ReconstructDetail(self.mainAudio, xSpan, ySpan)
 
     def AddToCurrLabelGroup(self, event=None):
         # Check current selected group is not None
@@ -538,13 +862,172 @@ class App(ttk.Frame):
                 self.fftInspector.startTime + self.currOffset,
                 self.fftInspector.endTime + self.currOffset,
                 self.fftInspector.startFreq,
-                self.fftInspector.endFreq
+                self.fftInspector.endFreq,
+                os.path.abspath(self.openFileName.get())
             )
         )
 
         # Update the label inspector
         self.dataSetLabelInspector.UpdateGroupLabels()
 
+    def DetectCandidates(self, event=None):
+        """
+        Method to propose labels for the whole root audio
+        """
+        # If root audio is not loaded, return
+        if self.rootAudio.GetFrameCount() == 0:
+            messagebox.showerror("Error", "No audio file loaded")
+            return
+
+        # Detect the candidates in the background and show them for review
+        self.scheduler.Submit(
+            DETECT_TASK, self.DetectCandidatesJob, priority=ANALYSIS_PRIORITY,
+            onDone=self.ShowProposals)
+
+    def DetectCandidatesJob(self, token: TaskToken):
+        """
+        Job target to detect candidates
+        """
+        # Set the status to detecting
+        token.ReportProgress("Detecting candidates...")
+
+        startTime = time()
+        proposals = DetectCandidates(self.rootAudio)
+        print(f"{len(proposals)} candidates detected in {time() - startTime:.2f}s")
+        return proposals
+
+    def ShowProposals(self, proposals: list[DataSetLabel]):
+        """
+        Method to show proposals for the open file for review
+        """
+        sourceFile = os.path.abspath(self.openFileName.get())
+        for proposal in proposals:
+            proposal.sourceFile = sourceFile
+        self.dataSetLabelInspector.SetProposals(proposals)
+
+    def FindSimilar(self, event=None):
+        """
+        Method to propose labels for the repeats of the selected region
+        """
+        # Check a region is selected
+        if self.selectedSpans is None:
+            messagebox.showerror("Error", "No region selected")
+            return
+        xSpan, ySpan = self.selectedSpans
+        if xSpan[1] - xSpan[0] < 2 or ySpan[1] - ySpan[0] < 2:
+            messagebox.showerror("Error", "Selected region is too small")
+            return
+
+        # Template from the main audio and where it is in the root audio
+        template = np.array(
+            self.mainAudio.fftSpectrum[ySpan[0]:ySpan[1], xSpan[0]:xSpan[1]])
+        templateFrame = self.mainAudio.startFrame // self.mainAudio.hopLength + xSpan[0]
+
+        # Match the template in the background and show the matches for review
+        self.scheduler.Submit(
+            MATCH_TASK, self.FindSimilarJob, template, ySpan, templateFrame,
+            priority=ANALYSIS_PRIORITY, onDone=self.ShowProposals)
+
+    def FindSimilarJob(
+        self,
+        token: TaskToken,
+        template: np.ndarray,
+        freqSpan: tuple[int, int],
+        templateFrame: int
+    ):
+        """
+        Job target to find similar regions
+        """
+        # Set the status to matching
+        token.ReportProgress("Finding similar regions...")
+
+        startTime = time()
+        matches = MatchTemplate(
+            self.rootAudio, template, freqSpan, excludeFrame=templateFrame)
+        print(f"{len(matches)} similar regions found in {time() - startTime:.2f}s")
+        return matches
+
+    def SearchCorpus(self, event=None):
+        """
+        Method to search the fingerprint index for regions similar to the
+        selected region
+        """
+        # Check a region is selected
+        if self.selectedSpans is None:
+            messagebox.showerror("Error", "No region selected")
+            return
+        if not AudioCache.IsCached(os.path.join(FINGERPRINT_INDEX_DIR, CORPUS_DIR_NAME)):
+            messagebox.showerror(
+                "Error", "No fingerprint index, build it with fingerprint-index.py")
+            return
+
+        # Selected region in the root audio
+        region = (
+            self.openFileName.get(),
+            self.fftInspector.startTime + self.currOffset,
+            self.fftInspector.endTime + self.currOffset
+        )
+        freqSpan = (self.fftInspector.startFreq, self.fftInspector.endFreq)
+
+        # Search the index in the background and list the hits
+        self.scheduler.Submit(
+            SEARCH_TASK, self.SearchCorpusJob, region, freqSpan,
+            priority=ANALYSIS_PRIORITY, onDone=self.ShowCorpusHits,
+            onError=self.ShowTaskError)
+
+    def SearchCorpusJob(
+        self,
+        token: TaskToken,
+        region: tuple[str, float, float],
+        freqSpan: tuple[float, float]
+    ):
+        """
+        Job target to search the corpus
+        """
+        # Set the status to searching
+        token.ReportProgress("Searching corpus...")
+
+        index = FingerprintIndex(FINGERPRINT_INDEX_DIR)
+        vector, _ = index.QueryVector(*region)
+        startTime = time()
+        hits = index.Query(vector, freqSpan, exclude=region)
+        print(f"{len(hits)} similar regions found in {time() - startTime:.2f}s")
+        return hits
+
+    def ShowCorpusHits(self, hits: list[dict]):
+        """
+        Method to list the hits of a corpus search and open them
+        """
+        dialog = tk.Toplevel(self.master)
+        dialog.title("Similar Regions")
+        hitList = tk.Listbox(dialog, width=100, height=20)
+        hitList.pack(side=tk.TOP, fill=tk.BOTH, expand=True)
+        for hit in hits:
+            hitList.insert(tk.END, "{0:.3f}  {1:.2f}s - {2:.2f}s  {3}".format(
+                hit["score"],
+                hit["startTime"],
+                hit["endTime"],
+                hit["audioFilePath"]
+            ))
+
+        def OpenHit(event=None):
+            selection = hitList.curselection()
+            if len(selection) == 0:
+                return
+            hit = hits[selection[0]]
+            self.offsetValue.set(hit["startTime"])
+
+            # Load the file of the hit unless it is already open
+            if os.path.abspath(self.openFileName.get()) == hit["audioFilePath"]:
+                self.LoadAudioOffset()
+                return
+            self.openFileName.set(hit["audioFilePath"])
+            self.OpenFile(hit["audioFilePath"])
+
+        hitList.bind("<Double-Button-1>", OpenHit)
+        openButton = ttk.Button(dialog, text="Open", command=OpenHit)
+        openButton.pack(side=tk.BOTTOM, fill=tk.X)
+
     def UpdateLabelHighlight(self, selectedLabels: list[DataSetLabel]):
         """
         Method to update the label highlight
@@ -570,18 +1053,88 @@ class App(ttk.Frame):
         freqArr = librosa.fft_frequencies(
             sr=self.mainAudio.sampleRate, n_fft=self.mainAudio.nFft)
 
-        # Get the start and end of x
-        xStart = currLabel.startTime / self.mainAudio.audioLength * \
-            self.mainAudio.fftSpectrum.shape[1]
-        xEnd = currLabel.endTime / self.mainAudio.audioLength * \
-            self.mainAudio.fftSpectrum.shape[1]
-        # Get the first frequency index in freqArr >= label.startFreq
-        yStart = np.argmax(freqArr >= currLabel.startFreq)
-        yEnd = np.argmax(freqArr >= currLabel.endFreq)
+        xStart, xEnd, yStart, yEnd = LabelBox(
+            currLabel, self.mainAudio.audioLength, self.mainAudio.fftSpectrum.shape[1], freqArr)
 
         # Update the fft detail inspector
         self.SpectrumSelected((xStart, yStart), (xEnd, yEnd))
 
+    def ShowProgress(self, text: str):
+        """
+        Method to show the progress of a background task
+        """
+        self.status.set("Status: " + text)
+
+    def ShowReady(self):
+        """
+        Method to show that all background tasks are done
+        """
+        self.status.set("Status: Ready")
+
+    def ShowTaskError(self, error: Exception):
+        """
+        Method to show the error of a background task
+        """
+        messagebox.showerror("Error", str(error))
+
+    def UpdateProfileStatus(self):
+        """
+        Method to show the last timings of the slowest stages while profiling
+        """
+        if profiler.enabled:
+            self.profileStatus.set("Profile: " + profiler.StatusText())
+        else:
+            self.profileStatus.set("")
+        self.after(PROFILER_STATUS_INTERVAL, self.UpdateProfileStatus)
+
+    def ShowProfileSummary(self):
+        """
+        Method to show the percentiles of the timings of every stage
+        """
+        dialog = tk.Toplevel(self.master)
+        dialog.title("Profile Summary")
+        summaryText = tk.Text(dialog, width=90, height=30, font="TkFixedFont")
+        summaryText.pack(side=tk.TOP, fill=tk.BOTH, expand=True)
+        summaryText.insert(tk.END, "{0:<28}{1:>8}{2:>12}{3:>12}{4:>12}{5:>12}\n".format(
+            "Stage", "Count", "p50 (ms)", "p90 (ms)", "p99 (ms)", "Max (ms)"))
+        for name, stage in profiler.Summary().items():
+            summaryText.insert(tk.END, "{0:<28}{1:>8}{2:>12.2f}{3:>12.2f}{4:>12.2f}{5:>12.2f}\n".format(
+                name, stage["count"], stage["p50"], stage["p90"], stage["p99"], stage["max"]))
+        summaryText.configure(state=tk.DISABLED)
+
+    def ShowMemoryUsage(self):
+        """
+        Method to show the buffers accounted in the memory budget by category
+        """
+        dialog = tk.Toplevel(self.master)
+        dialog.title("Memory Usage")
+        usageText = tk.Text(dialog, width=72, height=16, font="TkFixedFont")
+        usageText.pack(side=tk.TOP, fill=tk.BOTH, expand=True)
+        usageText.insert(tk.END, "{0:<16}{1:>8}{2:>12}{3:>16}{4:>12}\n".format(
+            "Category", "Count", "Size (MB)", "Evictable (MB)", "Evictions"))
+        for name, category in memoryBudget.Usage().items():
+            usageText.insert(tk.END, "{0:<16}{1:>8}{2:>12.1f}{3:>16.1f}{4:>12}\n".format(
+                name, category["count"], category["bytes"] / (1024 * 1024),
+                category["evictableBytes"] / (1024 * 1024), category["evictions"]))
+        usageText.insert(tk.END, "\nUsed {0:.1f} MB of {1:.1f} MB\n".format(
+            memoryBudget.UsedBytes() / (1024 * 1024), memoryBudget.budgetBytes / (1024 * 1024)))
+        usageText.configure(state=tk.DISABLED)
+
+    def ExportProfileTrace(self):
+        """
+        Method to save the recorded timings as a Chrome trace file
+        """
+        fileName = filedialog.asksaveasfilename(
+            title="Export Trace",
+            initialdir=os.getcwd(),
+            initialfile="trace.json",
+            filetypes=(("json files", "*.json"), ("all files", "*.*"))
+        )
+        if fileName == "":
+            return
+        profiler.ExportTrace(fileName)
+        print(f"Trace exported to {fileName}")
+
     def OnClose(self):
         """
         Method to exit the program
@@ -589,6 +1142,8 @@ class App(ttk.Frame):
         print("Exiting")
         # Pause the audio player
         self.Pause()
+        # Drop the background tasks
+        self.scheduler.CancelAll()
 
         # Close the window
         self.quit()
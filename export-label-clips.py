@@ -0,0 +1,66 @@
+# This script exports every label of label files as its own WAV clip,
+# optionally padded and band-passed to the frequency span of the label.
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from Config import CLIP_EXPORT_DIR, CLIP_WRITE_WORKERS
+from Utils.ClipExporter import ExportFileClips
+from Utils.DataSetLabel import ReadLabelFiles
+from Utils.TrainingSetExporter import FlattenLabels, SelectLabels
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Export every label of label files as its own WAV clip.")
+    parser.add_argument("labelFiles", nargs="+", help="Label files to export")
+    parser.add_argument("--output", default=CLIP_EXPORT_DIR,
+                        help="Directory of the clips, with a subdirectory per group")
+    parser.add_argument("--audio", default=None,
+                        help="Audio file of the labels that do not record theirs")
+    parser.add_argument("--padding", type=float, default=0,
+                        help="Seconds of audio kept around every label")
+    parser.add_argument("--band-pass", action="store_true",
+                        help="Keep only the frequency span of every label")
+    parser.add_argument("--workers", type=int, default=CLIP_WRITE_WORKERS,
+                        help="Threads filtering and writing the clips")
+    args = parser.parse_args()
+
+    columns, groupNames, sourceFiles = FlattenLabels(ReadLabelFiles(args.labelFiles), args.audio)
+    print(f"Found {len(columns['labelId'])} labels of {len(sourceFiles)} audio files")
+
+    startTime = time.time()
+    writtenCount = 0
+    failedCount = 0
+    # Files are read one after the other, the writers work meanwhile
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        for sourceId, sourceFile in enumerate(sourceFiles):
+            try:
+                fileWritten, fileFailed = ExportFileClips(
+                    sourceFile,
+                    SelectLabels(columns, columns["sourceId"] == sourceId),
+                    groupNames,
+                    args.output,
+                    executor,
+                    args.padding,
+                    args.band_pass,
+                    args.workers * 4
+                )
+            except Exception as e:
+                print(f"Failed to export {sourceFile}: {e}")
+                continue
+            writtenCount += fileWritten
+            failedCount += fileFailed
+            print(
+                f"[{sourceId + 1}/{len(sourceFiles)}] {sourceFile} "
+                f"({time.time() - startTime:.1f}s elapsed)"
+            )
+
+    print(
+        f"Wrote {writtenCount} clips ({failedCount} failed) "
+        f"in {time.time() - startTime:.1f}s"
+    )
+
+
+if __name__ == "__main__":
+    main()
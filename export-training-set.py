@@ -0,0 +1,87 @@
+# This script exports the labels of label files into a training set: the
+# spectrogram patches and audio clips of the labels, in shards of arrays
+# with an index of all labels. Interrupted exports resume where they stopped.
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from Config import ANALYSIS_SAMPLE_RATE, TRAINING_PATCH_SHAPE, TRAINING_SET_DIR, TRAINING_SHARD_LABELS
+from Utils.DataSetLabel import ReadLabelFiles
+from Utils.TrainingSetExporter import ExportFile, FlattenLabels, SelectLabels, WriteIndex
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Export the spectrogram patches and audio clips of labels into a training set.")
+    parser.add_argument("labelFiles", nargs="+", help="Label files to export")
+    parser.add_argument("--output", default=TRAINING_SET_DIR,
+                        help="Directory of the training set")
+    parser.add_argument("--audio", default=None,
+                        help="Audio file of the labels that do not record theirs")
+    parser.add_argument("--patch-shape", type=int, nargs=2, default=TRAINING_PATCH_SHAPE,
+                        metavar=("BINS", "FRAMES"), help="Shape the patches are resized to")
+    parser.add_argument("--ragged", action="store_true",
+                        help="Keep the patches at their size instead of resizing them")
+    parser.add_argument("--no-clips", action="store_true",
+                        help="Do not export the audio clips of the labels")
+    parser.add_argument("--shard-size", type=int, default=TRAINING_SHARD_LABELS,
+                        help="Most labels in a shard")
+    parser.add_argument("--n-fft", type=int, default=512,
+                        help="FFT size of the spectrogram")
+    parser.add_argument("--sample-rate", type=int, default=ANALYSIS_SAMPLE_RATE,
+                        help="Sample rate audio above it is resampled to")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="Maximum number of files processed at once")
+    args = parser.parse_args()
+
+    columns, groupNames, sourceFiles = FlattenLabels(ReadLabelFiles(args.labelFiles), args.audio)
+    print(f"Found {len(columns['labelId'])} labels of {len(sourceFiles)} audio files")
+
+    settings = {
+        "nFft": args.n_fft,
+        "sampleRate": args.sample_rate,
+        "patchShape": None if args.ragged else list(args.patch_shape),
+        "withClips": not args.no_clips,
+        "shardLabels": args.shard_size,
+    }
+
+    startTime = time.time()
+    fileShards = {}
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = {
+            executor.submit(
+                ExportFile,
+                sourceFile,
+                SelectLabels(columns, columns["sourceId"] == sourceId),
+                args.output,
+                **settings
+            ): sourceFile
+            for sourceId, sourceFile in enumerate(sourceFiles)
+        }
+        for future in as_completed(futures):
+            sourceFile = futures[future]
+            try:
+                fileShards[sourceFile] = future.result()
+            except Exception as e:
+                print(f"Failed to export {sourceFile}: {e}")
+                continue
+            print(
+                f"[{len(fileShards)}/{len(sourceFiles)}] {sourceFile} "
+                f"({time.time() - startTime:.1f}s elapsed)"
+            )
+
+    # Keep the shards in the order of the files
+    shards = [
+        shard for sourceFile in sourceFiles if sourceFile in fileShards
+        for shard in fileShards[sourceFile]
+    ]
+    metadata = WriteIndex(shards, columns, groupNames, sourceFiles, args.output, settings)
+    print(
+        f"Exported {metadata['labels']} labels into {len(shards)} shards "
+        f"in {time.time() - startTime:.1f}s"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+# This script computes the descriptors of every label of label files
+# (duration, bandwidth, peak frequency, energy, centroid and flatness) into
+# a single feature matrix.
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+
+from Config import ANALYSIS_SAMPLE_RATE, FEATURES_FILE
+from Utils.DataSetLabel import ReadLabelFiles
+from Utils.FeatureExtractor import FEATURE_NAMES, ExtractFileFeatures
+from Utils.TrainingSetExporter import FlattenLabels, SelectLabels
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compute the features of every label of label files into a matrix.")
+    parser.add_argument("labelFiles", nargs="+", help="Label files to process")
+    parser.add_argument("--output", default=FEATURES_FILE,
+                        help="NumPy .npz file of the feature matrix")
+    parser.add_argument("--audio", default=None,
+                        help="Audio file of the labels that do not record theirs")
+    parser.add_argument("--n-fft", type=int, default=512,
+                        help="FFT size of the spectrogram")
+    parser.add_argument("--sample-rate", type=int, default=ANALYSIS_SAMPLE_RATE,
+                        help="Sample rate audio above it is resampled to")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="Maximum number of files processed at once")
+    args = parser.parse_args()
+
+    columns, groupNames, sourceFiles = FlattenLabels(ReadLabelFiles(args.labelFiles), args.audio)
+    print(f"Found {len(columns['labelId'])} labels of {len(sourceFiles)} audio files")
+
+    startTime = time.time()
+    fileFeatures = []
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = {
+            executor.submit(
+                ExtractFileFeatures,
+                sourceFile,
+                SelectLabels(columns, columns["sourceId"] == sourceId),
+                args.n_fft,
+                args.sample_rate
+            ): sourceFile
+            for sourceId, sourceFile in enumerate(sourceFiles)
+        }
+        for future in as_completed(futures):
+            sourceFile = futures[future]
+            try:
+                fileFeatures.append(future.result())
+            except Exception as e:
+                print(f"Failed to process {sourceFile}: {e}")
+                continue
+            print(
+                f"[{len(fileFeatures)}/{len(sourceFiles)}] {sourceFile} "
+                f"({time.time() - startTime:.1f}s elapsed)"
+            )
+
+    # Rows in label id order
+    labelIds = np.concatenate([np.zeros(0, dtype=np.int64)] + [ids for ids, _ in fileFeatures])
+    features = np.concatenate(
+        [np.zeros((0, len(FEATURE_NAMES)), dtype=np.float32)] + [rows for _, rows in fileFeatures])
+    order = np.argsort(labelIds, kind="stable")
+    labelIds = labelIds[order]
+    positions = np.searchsorted(columns["labelId"], labelIds)
+
+    np.savez(
+        args.output,
+        features=features[order],
+        labelIds=labelIds,
+        groupIds=columns["groupId"][positions],
+        featureNames=np.array(FEATURE_NAMES),
+        groupNames=np.array(groupNames),
+    )
+    print(f"Wrote {len(labelIds)} labels to {args.output} in {time.time() - startTime:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+# This script fingerprints all audio files in a directory tree into an index
+# and searches the index for the regions similar to a region of a file.
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from Config import FINGERPRINT_INDEX_DIR, FINGERPRINT_MAX_HITS
+from Utils.AudioReader import FindAudioFiles
+from Utils.FingerprintIndex import FingerprintIndex, IndexFile, WriteCorpus
+
+# Target directory
+TARGET_DIR = "data"
+
+
+def Build(args: argparse.Namespace) -> None:
+    """
+    Fingerprint the audio files and gather them into the corpus.
+    """
+    audioFiles = FindAudioFiles(args.targetDir)
+    print(f"Found {len(audioFiles)} audio files")
+
+    startTime = time.time()
+    entries = {}
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = {
+            executor.submit(IndexFile, file, args.index_dir): file
+            for file in audioFiles
+        }
+        for future in as_completed(futures):
+            file = futures[future]
+            try:
+                entries[file] = future.result()
+            except Exception as e:
+                print(f"Failed to fingerprint {file}: {e}")
+                continue
+            print(
+                f"[{len(entries)}/{len(audioFiles)}] {file} "
+                f"({time.time() - startTime:.1f}s elapsed)"
+            )
+
+    # Keep the corpus in the order of the files
+    metadata = WriteCorpus(
+        [entries[file] for file in audioFiles if file in entries], args.index_dir)
+    windowCount = sum(entry["windows"] for entry in metadata["entries"])
+    print(
+        f"Indexed {windowCount} windows of {len(metadata['entries'])} files "
+        f"in {time.time() - startTime:.1f}s"
+    )
+
+
+def Query(args: argparse.Namespace) -> None:
+    """
+    Print the regions of the corpus most similar to a region of a file.
+    """
+    index = FingerprintIndex(args.index_dir)
+    vector, _ = index.QueryVector(args.audioFile, args.startTime, args.endTime)
+
+    startTime = time.time()
+    hits = index.Query(
+        vector,
+        (args.min_freq, args.max_freq),
+        args.max_hits,
+        (args.audioFile, args.startTime, args.endTime)
+    )
+    queryTime = time.time() - startTime
+
+    for rank, hit in enumerate(hits):
+        print(
+            f"{rank + 1:4d} {hit['score']:.3f} "
+            f"{hit['startTime']:10.2f}s {hit['endTime']:10.2f}s {hit['audioFilePath']}"
+        )
+    print(f"Searched {len(index.vectors)} windows in {queryTime * 1000:.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Fingerprint audio files and search them for similar regions.")
+    parser.add_argument("--index-dir", default=FINGERPRINT_INDEX_DIR,
+                        help="Directory of the fingerprint index")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    buildParser = subparsers.add_parser(
+        "build", help="Fingerprint a directory tree into the index")
+    buildParser.add_argument("targetDir", nargs="?", default=TARGET_DIR,
+                             help="Directory searched recursively for audio files")
+    buildParser.add_argument("--workers", type=int, default=os.cpu_count(),
+                             help="Maximum number of files processed at once")
+    buildParser.set_defaults(function=Build)
+
+    queryParser = subparsers.add_parser(
+        "query", help="Search the index for regions similar to a region of a file")
+    queryParser.add_argument("audioFile", help="Audio file of the region")
+    queryParser.add_argument("startTime", type=float, help="Start of the region in seconds")
+    queryParser.add_argument("endTime", type=float, help="End of the region in seconds")
+    queryParser.add_argument("--min-freq", type=float, default=0,
+                             help="Lowest frequency of the region in Hz")
+    queryParser.add_argument("--max-freq", type=float, default=float("inf"),
+                             help="Highest frequency of the region in Hz")
+    queryParser.add_argument("--max-hits", type=int, default=FINGERPRINT_MAX_HITS,
+                             help="Most regions printed")
+    queryParser.set_defaults(function=Query)
+
+    args = parser.parse_args()
+    args.function(args)
+
+
+if __name__ == "__main__":
+    main()
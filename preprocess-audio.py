@@ -0,0 +1,173 @@
+# This script preprocess all audio files in a directory tree into caches
+# that the labeling GUI opens without decoding or computing anything.
+import argparse
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+import soundfile as sf
+
+from Config import ANALYSIS_SAMPLE_RATE, CACHE_DIR, PIPELINE_MEMORY_BUDGET_MB
+from Utils import AudioCache
+from Utils.AudioProcess import Audio
+from Utils.AudioReader import FindAudioFiles
+from Utils.OverviewSummary import LoadOverview
+
+# Target directory
+TARGET_DIR = "data"
+# Seconds between two manifest checkpoints
+CHECKPOINT_INTERVAL = 5.0
+
+
+def EstimateMemory(audioFilePath: str, nFft: int, sampleRate: int = None) -> int:
+    """
+    Estimate the peak memory in bytes used to preprocess an audio file.
+    """
+    info = sf.info(audioFilePath)
+    frames = info.frames
+    # Decoded float32 samples of all channels plus the mono copy
+    memory = frames * info.channels * 4 + frames * 4
+    if sampleRate is not None and sampleRate < info.samplerate:
+        # Only the resampled audio is kept
+        frames = int(frames * sampleRate / info.samplerate)
+        memory = frames * 4
+    # Magnitude spectrum
+    spectrumSize = (nFft // 2 + 1) * (frames // (nFft // 4) + 1) * 4
+    return memory + spectrumSize
+
+
+def PreprocessFile(
+    audioFilePath: str,
+    cacheDir: str,
+    nFft: int,
+    sampleRate: int = None,
+    force: bool = False
+) -> dict:
+    """
+    Preprocess an audio file into its cache entry.
+    Returns the manifest entry of the file.
+    """
+    cachePath = AudioCache.GetCachePath(
+        audioFilePath, nFft, sampleRate, cacheDir)
+
+    if force or not AudioCache.IsCached(cachePath):
+        # Load, downmix, resample and generate the spectrum
+        audio = Audio(nFft=nFft)
+        audio.LoadAudio(
+            audioFilePath,
+            downmix=True,
+            targetSampleRate=sampleRate,
+            useCache=False
+        )
+        audio.GenerateEnvelope()
+        metadata = audio.SaveCache(
+            cachePath, {"audioFilePath": os.path.abspath(audioFilePath)})
+        # Overview shown by the GUI when the file is opened
+        LoadOverview(audioFilePath, audio, sampleRate, cacheDir)
+    else:
+        metadata = AudioCache.ReadMetadata(cachePath)
+
+    return {
+        "audioFilePath": os.path.abspath(audioFilePath),
+        "cachePath": os.path.abspath(cachePath),
+        "audioLength": metadata["audioLength"],
+        "sampleRate": metadata["sampleRate"],
+        "originalSampleRate": metadata["originalSampleRate"],
+        "channels": metadata["channels"],
+        "nFft": metadata["nFft"],
+        "files": metadata["files"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Preprocess audio files into ready to label caches.")
+    parser.add_argument("targetDir", nargs="?", default=TARGET_DIR,
+                        help="Directory searched recursively for audio files")
+    parser.add_argument("--cache-dir", default=None,
+                        help=f"Directory of the caches and the manifest, defaults to {CACHE_DIR} in the target directory")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="Maximum number of files processed at once")
+    parser.add_argument("--memory-budget", type=int, default=PIPELINE_MEMORY_BUDGET_MB,
+                        help="Memory in MB the workers may use together")
+    parser.add_argument("--sample-rate", type=int, default=ANALYSIS_SAMPLE_RATE,
+                        help="Resample audio above this rate to it")
+    parser.add_argument("--n-fft", type=int, default=512,
+                        help="FFT size of the spectrum")
+    parser.add_argument("--force", action="store_true",
+                        help="Rebuild caches that already exist")
+    args = parser.parse_args()
+    # The GUI looks the caches up next to the files
+    if args.cache_dir is None:
+        args.cache_dir = os.path.join(args.targetDir, CACHE_DIR)
+
+    audioFiles = FindAudioFiles(args.targetDir)
+    print(f"Found {len(audioFiles)} audio files")
+
+    # Largest files first so they do not end up running alone at the end
+    memoryBudget = args.memory_budget * 1024 * 1024
+    estimates = {}
+    for file in audioFiles:
+        try:
+            estimates[file] = EstimateMemory(file, args.n_fft, args.sample_rate)
+        except Exception as e:
+            print(f"Skipping {file}: {e}")
+    pendingFiles = sorted(estimates, key=estimates.get, reverse=True)
+
+    # Keep the entries of files not processed in this run
+    entries = {
+        entry["audioFilePath"]: entry
+        for entry in AudioCache.ReadManifest(args.cache_dir)
+    }
+
+    startTime = time.time()
+    lastCheckpointTime = startTime
+    doneCount = 0
+    running = {}
+    usedMemory = 0
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        while len(pendingFiles) > 0 or len(running) > 0:
+            # Start files while they fit in the memory budget, a file larger
+            # than the budget runs alone
+            while len(pendingFiles) > 0 and len(running) < args.workers:
+                file = next((
+                    file for file in pendingFiles
+                    if usedMemory + estimates[file] <= memoryBudget
+                ), None)
+                if file is None and len(running) > 0:
+                    break
+                if file is None:
+                    file = pendingFiles[0]
+                pendingFiles.remove(file)
+                future = executor.submit(
+                    PreprocessFile, file, args.cache_dir,
+                    args.n_fft, args.sample_rate, args.force)
+                running[future] = file
+                usedMemory += estimates[file]
+
+            doneFutures, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in doneFutures:
+                file = running.pop(future)
+                usedMemory -= estimates[file]
+                doneCount += 1
+                try:
+                    entry = future.result()
+                except Exception as e:
+                    print(f"Failed to preprocess {file}: {e}")
+                    continue
+                entries[entry["audioFilePath"]] = entry
+                print(
+                    f"[{doneCount}/{len(estimates)}] {file} "
+                    f"({entry['audioLength']:.1f}s, {time.time() - startTime:.1f}s elapsed)"
+                )
+
+            # Checkpoint the manifest
+            if time.time() - lastCheckpointTime >= CHECKPOINT_INTERVAL:
+                lastCheckpointTime = time.time()
+                AudioCache.WriteManifest(list(entries.values()), args.cache_dir)
+
+    AudioCache.WriteManifest(list(entries.values()), args.cache_dir)
+    print(f"Preprocessed {doneCount} files in {time.time() - startTime:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+# This script renders the spectrogram of every window of all audio files in
+# a directory tree with the boxes of their labels, tiled into PNG contact
+# sheets, for reviewing a corpus without opening the labeling GUI.
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from Config import ANALYSIS_SAMPLE_RATE, MAX_AUDIO_LENGTH, REVIEW_SHEET_COLUMNS, REVIEW_SHEET_ROWS, REVIEW_SHEETS_DIR
+from Utils.AudioReader import FindAudioFiles
+from Utils.DataSetLabel import ReadLabelFiles
+from Utils.SpectrumRenderer import GetWindowCount, RenderFileWindows
+
+# Target directory
+TARGET_DIR = "data"
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Render the spectrogram windows of audio files with their labels into PNG contact sheets.")
+    parser.add_argument("targetDir", nargs="?", default=TARGET_DIR,
+                        help="Directory searched recursively for audio files")
+    parser.add_argument("--labels", nargs="*", default=[],
+                        help="Label files whose labels are drawn on the windows of their audio files")
+    parser.add_argument("--audio", default=None,
+                        help="Audio file of the labels that do not record theirs")
+    parser.add_argument("--output", default=REVIEW_SHEETS_DIR,
+                        help="Directory of the sheets, mirroring the target directory")
+    parser.add_argument("--window-seconds", type=float, default=MAX_AUDIO_LENGTH,
+                        help="Seconds of audio in a window")
+    parser.add_argument("--sheet-columns", type=int, default=REVIEW_SHEET_COLUMNS,
+                        help="Windows side by side in a sheet")
+    parser.add_argument("--sheet-rows", type=int, default=REVIEW_SHEET_ROWS,
+                        help="Rows of windows in a sheet, 1 with one column renders an image per window")
+    parser.add_argument("--contrast", type=float, default=1.0,
+                        help="Contrast enhancement of the spectrogram")
+    parser.add_argument("--brightness", type=float, default=0,
+                        help="Brightness enhancement of the spectrogram")
+    parser.add_argument("--n-fft", type=int, default=512,
+                        help="FFT size of the spectrogram")
+    parser.add_argument("--sample-rate", type=int, default=ANALYSIS_SAMPLE_RATE,
+                        help="Sample rate audio above it is resampled to")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="Maximum number of sheets rendered at once")
+    args = parser.parse_args()
+    sheetWindows = max(args.sheet_columns, 1) * max(args.sheet_rows, 1)
+
+    audioFiles = FindAudioFiles(args.targetDir)
+    print(f"Found {len(audioFiles)} audio files")
+
+    # Labels by the audio file they were made on
+    fileLabels = {}
+    for labels in ReadLabelFiles(args.labels).values():
+        for label in labels:
+            sourceFile = label.sourceFile or args.audio
+            if sourceFile is not None:
+                fileLabels.setdefault(os.path.abspath(sourceFile), []).append(label)
+
+    startTime = time.time()
+    sheetCount = 0
+    windowTotal = 0
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = {}
+        for audioFile in audioFiles:
+            try:
+                windowCount, windowLength = GetWindowCount(
+                    audioFile, args.window_seconds, args.n_fft, args.sample_rate)
+            except Exception as e:
+                print(f"Failed to open {audioFile}: {e}")
+                continue
+            outputPrefix = os.path.join(
+                args.output, os.path.splitext(os.path.relpath(audioFile, args.targetDir))[0])
+            labels = fileLabels.get(os.path.abspath(audioFile), [])
+
+            # Spread the sheets of long files over several workers
+            for firstWindow in range(0, windowCount, sheetWindows):
+                # Only send the labels overlapping the windows of the sheet
+                taskStart = firstWindow * windowLength
+                taskEnd = (firstWindow + sheetWindows) * windowLength
+                taskLabels = [
+                    label for label in labels
+                    if label.endTime > taskStart and label.startTime < taskEnd
+                ]
+                future = executor.submit(
+                    RenderFileWindows,
+                    audioFile,
+                    firstWindow,
+                    sheetWindows,
+                    taskLabels,
+                    outputPrefix,
+                    max(args.sheet_columns, 1),
+                    args.window_seconds,
+                    args.n_fft,
+                    args.sample_rate,
+                    args.contrast,
+                    args.brightness
+                )
+                futures[future] = (audioFile, firstWindow)
+
+        for completedCount, future in enumerate(as_completed(futures)):
+            audioFile, firstWindow = futures[future]
+            try:
+                sheetPath, sheetWindowCount = future.result()
+            except Exception as e:
+                print(f"Failed to render {audioFile} from window {firstWindow}: {e}")
+                continue
+            if sheetPath is None:
+                continue
+            sheetCount += 1
+            windowTotal += sheetWindowCount
+            print(
+                f"[{completedCount + 1}/{len(futures)}] {audioFile} window {firstWindow} "
+                f"({time.time() - startTime:.1f}s elapsed)"
+            )
+
+    elapsedTime = time.time() - startTime
+    print(
+        f"Rendered {windowTotal} windows into {sheetCount} sheets in {elapsedTime:.1f}s "
+        f"({windowTotal / max(elapsedTime, 1e-9) * 60:.0f} windows per minute)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,305 @@
+# This script benchmarks loading, the STFT, plotting, reconstruction and
+# label saving on synthetic data, headless, and compares runs with a baseline.
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import matplotlib
+matplotlib.use("Agg")
+
+from Config import GRIFFIN_LIM_ITERATIONS, MAX_AUDIO_LENGTH
+from Utils.Benchmark import CompareResults, PeakRssMb, SyntheticLabels, TimeRepeats, WriteSyntheticAudio
+
+# Directory of the synthetic audio files, reused between runs
+DATA_DIR = os.path.join(tempfile.gettempdir(), "audio-spectrum-benchmarks")
+# File the results are written to
+RESULTS_FILE = "benchmark-results.json"
+# Seconds, sample rates and channels of the synthetic audio files
+AUDIO_SECONDS = (1, 60, 600)
+LONG_AUDIO_SECONDS = (3600, 4 * 3600)
+SAMPLE_RATES = (16000, 48000)
+CHANNELS = (1, 2)
+# Seconds of the reconstructed regions
+RECONSTRUCT_SECONDS = (1, MAX_AUDIO_LENGTH)
+# Number of labels saved
+LABEL_COUNTS = (10, 1000, 100000, 1000000)
+# Slowdown relative to the baseline reported as a regression
+REGRESSION_TOLERANCE = 0.1
+
+
+def AudioFilePath(seconds: float, sampleRate: int, channels: int) -> str:
+    """
+    Get the path of a synthetic audio file, writing it if needed.
+    """
+    return WriteSyntheticAudio(
+        os.path.join(DATA_DIR, f"{seconds}s-{sampleRate}Hz-{channels}ch.wav"),
+        seconds, sampleRate, channels)
+
+
+def LoadCase(params: dict, repeats: int) -> dict:
+    """
+    Load, downmix and transform a whole file.
+    """
+    from Utils.AudioProcess import Audio
+
+    audioFilePath = AudioFilePath(params["seconds"], params["sampleRate"], params["channels"])
+
+    def Load():
+        audio = Audio()
+        audio.LoadAudio(audioFilePath, downmix=True, useCache=False)
+    return dict(
+        wallTimes=TimeRepeats(Load, repeats),
+        work=params["seconds"], workUnit="audio s"
+    )
+
+
+def StftCase(params: dict, repeats: int) -> dict:
+    """
+    Generate the magnitude spectrum of loaded audio.
+    """
+    from Utils.AudioProcess import Audio
+
+    audio = Audio()
+    audio.LoadAudio(
+        AudioFilePath(params["seconds"], params["sampleRate"], 1),
+        targetSampleRate=None, useCache=False, lazy=True)
+    audio.audioArray = audio.ReadFrames(0, audio.GetFrameCount())
+    audio.CloseAudio()
+    return dict(
+        wallTimes=TimeRepeats(audio.GenerateMagnitudeSpectrum, repeats),
+        work=params["seconds"], workUnit="audio s"
+    )
+
+
+def LoadWindow(sampleRate: int):
+    """
+    Load a window of the synthetic audio as the GUI shows it.
+    """
+    from Utils.AudioProcess import Audio
+
+    audio = Audio()
+    audio.LoadAudio(
+        AudioFilePath(MAX_AUDIO_LENGTH, sampleRate, 1),
+        targetSampleRate=None, useCache=False)
+    return audio
+
+
+def RenderSpectrumCase(params: dict, repeats: int) -> dict:
+    """
+    Plot the spectrum of a window, tone mapping it again every time.
+    """
+    from matplotlib import pyplot as plt
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from Utils.AudioPlot import AudioSpectrumPlot
+
+    audio = LoadWindow(params["sampleRate"])
+    fig, ax = plt.subplots()
+    plot = AudioSpectrumPlot(audio, ax, FigureCanvasAgg(fig))
+
+    def Render():
+        # A new brightness defeats the reuse of the tone mapped image
+        plot.brightnessEnhancement = 0.1 - plot.brightnessEnhancement
+        plot.Plot(keepLim=False)
+    return dict(wallTimes=TimeRepeats(Render, repeats), work=1, workUnit="plot")
+
+
+def RenderMagnitudeCase(params: dict, repeats: int) -> dict:
+    """
+    Plot the magnitude envelope of a window.
+    """
+    from matplotlib import pyplot as plt
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from Utils.AudioPlot import AudioMagnitudePlot
+
+    audio = LoadWindow(params["sampleRate"])
+    audio.GenerateEnvelope()
+    fig, ax = plt.subplots()
+    plot = AudioMagnitudePlot(audio, ax, FigureCanvasAgg(fig))
+    return dict(wallTimes=TimeRepeats(plot.Plot, repeats), work=1, workUnit="plot")
+
+
+def ReconstructCase(params: dict, repeats: int) -> dict:
+    """
+    Reconstruct a region of the spectrum with Griffin-Lim.
+    """
+    from Utils.AudioProcess import Audio
+
+    audio = LoadWindow(params["sampleRate"])
+    freqHeight = audio.fftSpectrum.shape[0]
+    frameCount = int(params["seconds"] * audio.sampleRate / audio.hopLength)
+    freqSpan = (freqHeight // 8, freqHeight // 2)
+    region = audio.fftSpectrum[freqSpan[0]:freqSpan[1], :frameCount]
+
+    def Reconstruct():
+        Audio().ReconstructAudio(audio.sampleRate, region, freqHeight, freqSpan)
+    return dict(
+        wallTimes=TimeRepeats(Reconstruct, repeats),
+        work=GRIFFIN_LIM_ITERATIONS, workUnit="iterations"
+    )
+
+
+def SaveLabelsCase(params: dict, repeats: int) -> dict:
+    """
+    Write a label file.
+    """
+    from Utils.DataSetLabel import WriteLabelFile
+
+    labelGroups = SyntheticLabels(params["labels"], 4 * 3600)
+    with tempfile.TemporaryDirectory() as tempDir:
+        fileName = os.path.join(tempDir, "labels.json")
+        wallTimes = TimeRepeats(lambda: WriteLabelFile(fileName, labelGroups), repeats)
+        fileSize = os.path.getsize(fileName)
+    return dict(
+        wallTimes=wallTimes, work=params["labels"], workUnit="labels",
+        fileSizeMb=fileSize / (1024 * 1024)
+    )
+
+
+# Benchmark cases by name
+CASES = {
+    "load": LoadCase,
+    "stft": StftCase,
+    "render-spectrum": RenderSpectrumCase,
+    "render-magnitude": RenderMagnitudeCase,
+    "reconstruct": ReconstructCase,
+    "save-labels": SaveLabelsCase,
+}
+
+
+def CaseParams(long: bool) -> list[tuple[str, dict]]:
+    """
+    List the cases to run with their parameters.
+    """
+    audioSeconds = AUDIO_SECONDS + (LONG_AUDIO_SECONDS if long else ())
+    runs = []
+    for seconds in audioSeconds:
+        for sampleRate in SAMPLE_RATES:
+            for channels in CHANNELS:
+                runs.append(("load", dict(seconds=seconds, sampleRate=sampleRate, channels=channels)))
+            runs.append(("stft", dict(seconds=seconds, sampleRate=sampleRate)))
+    for sampleRate in SAMPLE_RATES:
+        runs.append(("render-spectrum", dict(sampleRate=sampleRate)))
+        runs.append(("render-magnitude", dict(sampleRate=sampleRate)))
+        for seconds in RECONSTRUCT_SECONDS:
+            runs.append(("reconstruct", dict(seconds=seconds, sampleRate=sampleRate)))
+    for labelCount in LABEL_COUNTS:
+        runs.append(("save-labels", dict(labels=labelCount)))
+    return runs
+
+
+def RunName(case: str, params: dict) -> str:
+    """
+    Get the name identifying a case and its parameters across runs.
+    """
+    return case + "/" + "-".join(f"{key}={value}" for key, value in params.items())
+
+
+def RunCase(case: str, params: dict, repeats: int) -> dict:
+    """
+    Run a case in a new process so its peak memory is its own.
+    """
+    # Write the audio files before the measured process starts
+    if "channels" in params:
+        AudioFilePath(params["seconds"], params["sampleRate"], params["channels"])
+    elif case == "stft":
+        AudioFilePath(params["seconds"], params["sampleRate"], 1)
+    elif "sampleRate" in params:
+        AudioFilePath(MAX_AUDIO_LENGTH, params["sampleRate"], 1)
+
+    process = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--case", case,
+         "--params", json.dumps(params), "--repeats", str(repeats)],
+        capture_output=True, text=True
+    )
+    if process.returncode != 0:
+        return dict(error=process.stderr.strip().splitlines()[-1:])
+    return json.loads(process.stdout.strip().splitlines()[-1])
+
+
+def RunChild(case: str, params: dict, repeats: int) -> None:
+    """
+    Run a case in this process and print its measurements as json.
+    """
+    setupRssMb = PeakRssMb()
+    result = CASES[case](params, repeats)
+    wallTimes = sorted(result["wallTimes"])
+    result.update(
+        wallTime=wallTimes[len(wallTimes) // 2],
+        throughput=result["work"] / wallTimes[len(wallTimes) // 2],
+        setupRssMb=setupRssMb,
+        peakRssMb=PeakRssMb(),
+    )
+    print(json.dumps(result))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the toolset on synthetic data.")
+    parser.add_argument("--output", default=RESULTS_FILE,
+                        help="File the results are written to")
+    parser.add_argument("--baseline",
+                        help="Results of an earlier run to compare with")
+    parser.add_argument("--tolerance", type=float, default=REGRESSION_TOLERANCE,
+                        help="Slowdown relative to the baseline reported as a regression")
+    parser.add_argument("--repeats", type=int, default=3,
+                        help="Timed calls of every case, the median is reported")
+    parser.add_argument("--long", action="store_true",
+                        help="Also benchmark files of hours")
+    parser.add_argument("--filter", default="",
+                        help="Only run the cases whose name contains this")
+    parser.add_argument("--case", help=argparse.SUPPRESS)
+    parser.add_argument("--params", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    # Measured process
+    if args.case is not None:
+        RunChild(args.case, json.loads(args.params), args.repeats)
+        return
+
+    results = []
+    for case, params in CaseParams(args.long):
+        name = RunName(case, params)
+        if args.filter not in name:
+            continue
+        result = dict(name=name, case=case, params=params, **RunCase(case, params, args.repeats))
+        results.append(result)
+        if "error" in result:
+            print(f"{name}: failed {result['error']}")
+            continue
+        print(
+            f"{name}: {result['wallTime'] * 1000:.1f}ms "
+            f"{result['throughput']:.1f} {result['workUnit']}/s "
+            f"peak {result['peakRssMb']}MB"
+        )
+
+    with open(args.output, "w") as file:
+        json.dump({
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeats": args.repeats,
+            "results": results,
+        }, file, indent=4)
+    print(f"Results written to {args.output}")
+
+    if args.baseline is None:
+        return
+    with open(args.baseline) as file:
+        baseline = json.load(file)["results"]
+    rows = CompareResults(results, baseline, args.tolerance)
+    for row in rows:
+        if row["ratio"] is None:
+            print(f"{row['name']}: no baseline")
+            continue
+        print(f"{row['name']}: {row['ratio']:.2f}x{' REGRESSION' if row['regressed'] else ''}")
+    if any(row["regressed"] for row in rows):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()